@@ -14,7 +14,10 @@ import 'firestore_service.dart';
 // HOW IT WORKS:
 // 1. Load the TFLite model (trained in Python, converted to mobile format)
 // 2. Load course embeddings (64-number "fingerprints" for each course)
-// 3. When user views a course, find similar courses using cosine similarity
+// 3. When user views a course, read its related courses from the neighbour
+//    table precomputed in Python (course_similarity_neighbours.json), or -
+//    if the course is not in the table - find similar courses using cosine
+//    similarity
 // 4. Return top 5 most similar courses as recommendations
 // =============================================================================
 
@@ -70,6 +73,11 @@ class RecommendationService {
   Map<String, int>? _tagToIdx; // "JavaScript" -> 0, "Python" -> 1
   int? _featureDim; // Input size (number of features)
   int? _embeddingDim; // Output size (64 numbers)
+  Map<String, CourseSimilarityData>? _catalogById; // "react_complete" -> data
+  Map<String, List<MapEntry<String, double>>>?
+  _courseNeighbours; // catalog ID -> top-K (catalog ID, score), best first
+  final Map<String, CourseSimilarityData?> _catalogMatchCache =
+      {}; // app courseId -> matched catalog course (null = no match)
 
   final FirestoreService _firestoreService = FirestoreService();
 
@@ -127,12 +135,49 @@ class RecommendationService {
       _featureDim = data['feature_dim'] ?? 0;
       _embeddingDim = data['embedding_dim'] ?? 64;
 
+      _catalogById = {for (var c in _courseSimilarityData!) c.id: c};
+      _catalogMatchCache.clear();
+
       print(
         'Loaded ${_courseSimilarityData!.length} course embeddings for similarity',
       );
     } catch (e) {
       print('Error loading course similarity model: $e');
     }
+
+    await _loadCourseNeighbours();
+  }
+
+  /// Load the precomputed top-K related courses (optional - without it,
+  /// related courses are computed with cosine similarity on the device)
+  Future<void> _loadCourseNeighbours() async {
+    try {
+      final jsonString = await rootBundle.loadString(
+        'assets/model/course_similarity_neighbours.json',
+      );
+      final Map<String, dynamic> data = json.decode(jsonString);
+
+      // Rows hold indices into course_ids; turn them into ID -> neighbours
+      final courseIds = List<String>.from(data['course_ids']);
+      final neighbours = data['neighbours'] as List;
+      final scores = data['scores'] as List;
+      _courseNeighbours = {
+        for (int i = 0; i < courseIds.length; i++)
+          courseIds[i]: [
+            for (int j = 0; j < (neighbours[i] as List).length; j++)
+              MapEntry(
+                courseIds[neighbours[i][j] as int],
+                (scores[i][j] as num).toDouble(),
+              ),
+          ],
+      };
+      print(
+        'Loaded top-${data['k']} neighbours for ${courseIds.length} courses',
+      );
+    } catch (e) {
+      print('No precomputed course neighbours, using cosine similarity: $e');
+      _courseNeighbours = null;
+    }
   }
 
   /// Get user-based recommendations using MLP
@@ -220,6 +265,15 @@ class RecommendationService {
     try {
       final allCourses = await _firestoreService.getAllCourses();
 
+      // Precomputed neighbours: a table lookup, no similarity math
+      final tableBased = _getTableBasedRelatedCourses(
+        currentCourse,
+        allCourses,
+      );
+      if (tableBased != null) {
+        return tableBased;
+      }
+
       // If MLP model is available, use it
       if (isSimilarityModelLoaded && _courseSimilarityData != null) {
         return _getMLPBasedRelatedCourses(currentCourse, allCourses);
@@ -233,6 +287,49 @@ class RecommendationService {
     }
   }
 
+  /// Related courses from the precomputed neighbour table
+  ///
+  /// The table lists the top-K most similar catalog courses of every catalog
+  /// course (computed offline from the same embeddings). App courses are
+  /// matched to catalog courses once (_findCatalogMatch is cached), so this
+  /// is a few map reads per course page instead of a similarity loop.
+  /// Returns null if there is no table, no match, or no matching neighbour.
+  List<CourseModel>? _getTableBasedRelatedCourses(
+    CourseModel currentCourse,
+    List<CourseModel> allCourses,
+  ) {
+    final match = _findCatalogMatch(currentCourse);
+    final neighbours = match == null ? null : _courseNeighbours?[match.id];
+    if (neighbours == null) return null;
+
+    // App courses grouped by the catalog course they correspond to
+    final coursesByCatalogId = <String, List<CourseModel>>{};
+    for (var course in allCourses) {
+      if (course.courseId == currentCourse.courseId) continue;
+      final courseMatch = _findCatalogMatch(course);
+      if (courseMatch != null) {
+        coursesByCatalogId.putIfAbsent(courseMatch.id, () => []).add(course);
+      }
+    }
+
+    // Courses matching the same catalog course first, then its neighbours
+    final relatedCourses = <CourseModel>[...?coursesByCatalogId[match!.id]];
+    for (var neighbour in neighbours) {
+      if (relatedCourses.length >= 5) break;
+      final courses = coursesByCatalogId[neighbour.key] ?? <CourseModel>[];
+      for (var course in courses) {
+        relatedCourses.add(course);
+        print(
+          'Table Recommendation: ${course.title} (similarity: ${neighbour.value.toStringAsFixed(3)})',
+        );
+      }
+    }
+    if (relatedCourses.isEmpty) return null;
+
+    _fillWithCategoryBased(relatedCourses, currentCourse, allCourses);
+    return relatedCourses.take(5).toList();
+  }
+
   /// Embedding-Based MLP course similarity using learned embeddings
   ///
   /// This method works with ANY course by:
@@ -288,28 +385,55 @@ class RecommendationService {
       );
     }
 
-    // If we have fewer than 5, supplement with category-based
-    if (relatedCourses.length < 5) {
-      final categoryBased = _getCategoryBasedRelatedCourses(
-        currentCourse,
-        allCourses,
-      );
-      for (var course in categoryBased) {
-        if (!relatedCourses.contains(course) &&
-            course.courseId != currentCourse.courseId) {
-          relatedCourses.add(course);
-          if (relatedCourses.length >= 5) break;
-        }
+    _fillWithCategoryBased(relatedCourses, currentCourse, allCourses);
+    return relatedCourses.take(5).toList();
+  }
+
+  /// If we have fewer than 5, supplement with category-based
+  void _fillWithCategoryBased(
+    List<CourseModel> relatedCourses,
+    CourseModel currentCourse,
+    List<CourseModel> allCourses,
+  ) {
+    if (relatedCourses.length >= 5) return;
+
+    final categoryBased = _getCategoryBasedRelatedCourses(
+      currentCourse,
+      allCourses,
+    );
+    for (var course in categoryBased) {
+      if (!relatedCourses.contains(course) &&
+          course.courseId != currentCourse.courseId) {
+        relatedCourses.add(course);
+        if (relatedCourses.length >= 5) break;
       }
     }
-
-    return relatedCourses.take(5).toList();
   }
 
   /// Get embedding for any course - either from precomputed data or by running inference
   List<double>? _getEmbeddingForCourse(CourseModel course) {
-    // First, try to find a matching precomputed embedding by content similarity
-    if (_courseSimilarityData != null) {
+    // First, try to find a matching precomputed embedding
+    final match = _findCatalogMatch(course);
+    if (match != null) {
+      print('Using precomputed embedding from: ${match.title}');
+      return match.embedding;
+    }
+
+    // Otherwise, compute embedding using TFLite model
+    return _computeEmbeddingForCourse(course);
+  }
+
+  /// Find the catalog course (from the training data) that an app course
+  /// corresponds to: same ID, or else the best content match. Cached per
+  /// courseId, so each course is matched only once.
+  CourseSimilarityData? _findCatalogMatch(CourseModel course) {
+    if (_courseSimilarityData == null) return null;
+    if (_catalogMatchCache.containsKey(course.courseId)) {
+      return _catalogMatchCache[course.courseId];
+    }
+
+    CourseSimilarityData? match = _catalogById?[course.courseId];
+    if (match == null) {
       CourseSimilarityData? bestMatch;
       int bestScore = 0;
 
@@ -339,17 +463,14 @@ class RecommendationService {
         }
       }
 
-      // Use precomputed embedding if we found a good match
+      // Only a good enough content match counts
       if (bestMatch != null && bestScore >= 3) {
-        print(
-          'Using precomputed embedding from: ${bestMatch.title} (match score: $bestScore)',
-        );
-        return bestMatch.embedding;
+        match = bestMatch;
       }
     }
 
-    // Otherwise, compute embedding using TFLite model
-    return _computeEmbeddingForCourse(course);
+    _catalogMatchCache[course.courseId] = match;
+    return match;
   }
 
   /// Normalize category names to handle variations
@@ -0,0 +1,350 @@
+# =============================================================================
+# ANN_INDEX.PY - Approximate Nearest-Neighbour Index for Course Embeddings
+# =============================================================================
+# WHAT IS THIS FILE?
+# Finding similar courses by brute force compares the query with EVERY course:
+# fine for 100 courses, far too slow for a million. This file builds an IVF
+# ("inverted file") index in pure NumPy that only looks at a small part of
+# the catalog per query.
+#
+# HOW IVF WORKS:
+#   BUILD
+#   1. k-means splits the embeddings into num_lists clusters ("lists"),
+#      each with a centroid (trained on a sample, then every course assigned)
+#   2. courses are stored grouped by list, one contiguous block per list
+#
+#   SEARCH (top-k for a query)
+#   1. score the query against the num_lists centroids
+#   2. open only the nprobe best lists and score their courses exactly
+#   3. keep the k best of those candidates
+#
+#   With ~4·sqrt(N) lists, nprobe=8 on 1M courses scores ~2k candidates
+#   instead of 1M. Raising nprobe trades latency for recall; nprobe =
+#   num_lists is exact search.
+#
+# BATCH QUERIES:
+# search() takes many queries at once and loops over LISTS, not queries:
+# every list opened by the batch is scored against all the queries that
+# probe it in one matrix product, giving k candidates per (query, list).
+# The final top-k per query is one argpartition over those candidates.
+# A single query (the app's case) skips the grouping and scores the rows of
+# its nprobe lists in one product.
+#
+# SIMILARITY:
+# Cosine, like RecommendationService: vectors and queries are L2-normalised
+# and compared by dot product (the exported embeddings already have norm 1).
+#
+# ON DISK (save / load):
+#   <dir>/centroids.npy, vectors.npy, ids.npy, list_offsets.npy, meta.json
+# Plain .npy files, so load(mmap_mode='r') maps a 1M-course index instead of
+# reading it; meta.json is written last and marks a complete index.
+#
+# USAGE:
+#   python ann_index.py                            # shipped course embeddings
+#   python ann_index.py --synthetic 1000000 --nprobe 4 8 16 32 --save ann_1m
+#   python ann_index.py --load ann_1m --synthetic 1000000
+# =============================================================================
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from retrieval_eval import default_block_size
+
+ENCODERS_PATH = '../assets/model/course_similarity_encoders.json'
+INDEX_FILES = ('centroids', 'vectors', 'ids', 'list_offsets')
+QUERY_CHUNK = 8192        # queries per pass in search()
+SMALL_BATCH = 4           # up to this many queries are searched one by one
+ASSIGN_BLOCK = 8192       # vectors per block when assigning to centroids
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def default_num_lists(num_vectors):
+    return int(max(1, min(num_vectors, round(4 * np.sqrt(num_vectors)))))
+
+
+def assign_to_centroids(vectors, centroids, block_size=ASSIGN_BLOCK):
+    """Index of the most similar centroid for every vector, block by block."""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        labels[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, num_lists, iterations=10, sample_size=None, seed=0):
+    """
+    k-means on unit vectors (cosine assignment, re-normalised centroids).
+
+    Trains on sample_size random vectors (default 64 per list); empty
+    clusters are restarted from random sample vectors.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), sample_size or 64 * num_lists)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, num_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = assign_to_centroids(sample, centroids)
+        # Sum each cluster's vectors: sort by label, add up each run of rows
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=num_lists)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        centroids = normalize(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalised embeddings.
+
+    Usage:
+        index = IVFIndex.build(embeddings)                # or IVFIndex.load(path)
+        ids, scores = index.search(query_vectors, k=10, nprobe=8)
+        index.save(path)
+
+    ids are row numbers of the original embeddings (-1 where fewer than k
+    candidates were found), scores are cosine similarities, best first.
+    """
+    def __init__(self, centroids, vectors, ids, list_offsets):
+        self.centroids = centroids
+        self.vectors = vectors            # grouped by list
+        self.ids = ids                    # original row of each stored vector
+        self.list_offsets = list_offsets  # list l = vectors[offsets[l]:offsets[l + 1]]
+
+    @property
+    def num_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, embeddings, num_lists=None, iterations=10, sample_size=None, seed=0):
+        vectors = normalize(embeddings)
+        num_lists = min(num_lists or default_num_lists(len(vectors)), len(vectors))
+        centroids = spherical_kmeans(vectors, num_lists, iterations=iterations, sample_size=sample_size, seed=seed)
+        labels = assign_to_centroids(vectors, centroids)
+        order = np.argsort(labels, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=num_lists))])
+        return cls(centroids, vectors[order], order.astype(np.int64), list_offsets.astype(np.int64))
+
+    def search(self, queries, k=10, nprobe=8):
+        """Top-k (ids, scores) for a (num_queries, dim) array of query vectors."""
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe, self.num_lists)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if len(queries) <= SMALL_BATCH:
+            for q, query in enumerate(queries):
+                found_ids, found_scores = self._search_one(query, k, nprobe)
+                ids[q, :len(found_ids)], scores[q, :len(found_ids)] = found_ids, found_scores
+            return ids, scores
+        for start in range(0, len(queries), QUERY_CHUNK):
+            chunk = slice(start, start + QUERY_CHUNK)
+            ids[chunk], scores[chunk] = self._search_chunk(queries[chunk], k, nprobe)
+        return ids, scores
+
+    def _search_one(self, query, k, nprobe):
+        # A few queries: gather the probed lists' rows and score them in one product
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < self.num_lists \
+            else np.arange(self.num_lists)
+        rows = np.concatenate([np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in probes])
+        scores = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return self.ids[rows[order]], scores[order]
+
+    def _search_chunk(self, queries, k, nprobe):
+        # 1. The nprobe most similar lists per query
+        centroid_scores = queries @ self.centroids.T
+        if nprobe < self.num_lists:
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.num_lists), centroid_scores.shape)
+
+        # 2. Up to k candidates per (query, probed list), one list at a time
+        candidate_scores = np.full((len(queries), nprobe, k), -np.inf, dtype=np.float32)
+        candidate_rows = np.full((len(queries), nprobe, k), -1, dtype=np.int64)
+        pairs = np.argsort(probes, axis=None, kind='stable')  # (query, slot) pairs grouped by list
+        pair_lists = probes.ravel()[pairs]
+        group_starts = np.flatnonzero(np.r_[True, pair_lists[1:] != pair_lists[:-1]])
+        for begin, end in zip(group_starts, np.r_[group_starts[1:], len(pairs)]):
+            list_id = pair_lists[begin]
+            lo, hi = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+            if hi == lo:
+                continue
+            query_rows, slots = np.divmod(pairs[begin:end], nprobe)
+            scores = queries[query_rows] @ self.vectors[lo:hi].T
+            if hi - lo > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(hi - lo), scores.shape)
+            candidate_scores[query_rows, slots, :top.shape[1]] = scores
+            candidate_rows[query_rows, slots, :top.shape[1]] = top + lo
+
+        # 3. Best k of the nprobe * k candidates, sorted
+        candidate_scores = candidate_scores.reshape(len(queries), -1)
+        candidate_rows = candidate_rows.reshape(len(queries), -1)
+        if candidate_scores.shape[1] > k:
+            best = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+            candidate_scores = np.take_along_axis(candidate_scores, best, axis=1)
+            candidate_rows = np.take_along_axis(candidate_rows, best, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+        top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+        top_rows = np.take_along_axis(candidate_rows, order, axis=1)
+        top_ids = np.where(top_rows >= 0, self.ids[np.maximum(top_rows, 0)], -1)
+        return top_ids, top_scores
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in INDEX_FILES:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        # meta.json last: its presence means the index is complete
+        with open(meta_path, 'w') as f:
+            json.dump({'num_vectors': len(self), 'num_lists': self.num_lists,
+                       'dim': int(self.vectors.shape[1]), 'metric': 'cosine'}, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            raise FileNotFoundError(f'No complete index in {path} (meta.json missing)')
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in INDEX_FILES}
+        return cls(**arrays)
+
+
+# =============================================================================
+# RECALL REPORT - ANN vs EXACT SEARCH
+# =============================================================================
+def exact_search(embeddings, queries, k=10, block_size=None):
+    """Brute-force cosine top-k (ids, scores): the ground truth for recall."""
+    vectors, queries = normalize(embeddings), normalize(np.atleast_2d(queries))
+    block_size = block_size or default_block_size(len(vectors))
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size] @ vectors.T
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        ids[start:start + block_size] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + block_size] = np.take_along_axis(top_scores, order, axis=1)
+    return ids, scores
+
+
+def recall_report(index, embeddings, k=10, nprobes=(1, 2, 4, 8, 16, 32), num_queries=1000, seed=0):
+    """
+    recall@k of index.search against exact_search for each nprobe, with the
+    per-query latency of both (batch search over num_queries catalog courses).
+    """
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), min(num_queries, len(embeddings)),
+                                                       replace=False))], dtype=np.float32)
+    start = time.perf_counter()
+    exact_ids, _ = exact_search(embeddings, queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    rows = []
+    sizes = np.diff(index.list_offsets)
+    for nprobe in nprobes:
+        nprobe = min(nprobe, index.num_lists)
+        start = time.perf_counter()
+        ids, _ = index.search(queries, k, nprobe)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        found = (ids[:, :, None] == exact_ids[:, None, :]).any(axis=2).sum(axis=1)
+        rows.append({
+            'nprobe': nprobe,
+            f'recall@{k}': round(float(found.mean() / k), 4),
+            'ms_per_query': round(ms, 4),
+            'exact_ms_per_query': round(exact_ms, 4),
+            'speedup': round(exact_ms / ms, 1),
+            # expected candidates scored per query if probes were uniform over lists
+            'avg_candidates': int(round(nprobe * sizes.mean())),
+        })
+    return rows
+
+
+def print_recall_report(rows, k=10):
+    print(f"   {'nprobe':>6} {f'recall@{k}':>10} {'ms/query':>10} {'exact ms':>10} {'speedup':>8} {'~candidates':>12}")
+    for r in rows:
+        print(f"   {r['nprobe']:>6} {r[f'recall@{k}']:>10.4f} {r['ms_per_query']:>10.4f} "
+              f"{r['exact_ms_per_query']:>10.4f} {r['speedup']:>7.1f}x {r['avg_candidates']:>12,}")
+
+
+def synthetic_embeddings(num_vectors, dim=64, num_topics=2000, spread=1.0, seed=0):
+    """Clustered unit vectors (topics + noise), shaped like trained course embeddings."""
+    rng = np.random.default_rng(seed)
+    topics = normalize(rng.standard_normal((num_topics, dim)))
+    embeddings = np.empty((num_vectors, dim), dtype=np.float32)
+    for start in range(0, num_vectors, 65536):
+        stop = min(start + 65536, num_vectors)
+        noise = rng.standard_normal((stop - start, dim)).astype(np.float32) * spread / np.sqrt(dim)
+        embeddings[start:stop] = normalize(topics[rng.integers(0, num_topics, stop - start)] + noise)
+    return embeddings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build an IVF index over course embeddings and report recall.')
+    parser.add_argument('--encoders', default=ENCODERS_PATH,
+                        help='course_similarity_encoders.json whose course embeddings are indexed')
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help='index this many synthetic clustered 64-d embeddings instead')
+    parser.add_argument('--num-lists', type=int, default=None, help='k-means lists (default: 4 * sqrt(N))')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--save', default=None, help='save the built index to this directory')
+    parser.add_argument('--load', default=None, help='load an index from this directory instead of building')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.synthetic:
+        embeddings = synthetic_embeddings(args.synthetic)
+    else:
+        with open(args.encoders) as f:
+            embeddings = np.array([c['embedding'] for c in json.load(f)['courses']], dtype=np.float32)
+    print(f"   {len(embeddings):,} embeddings of dim {embeddings.shape[1]}")
+
+    start = time.perf_counter()
+    if args.load:
+        index = IVFIndex.load(args.load, mmap_mode='r')
+        print(f"   Loaded index from {args.load} in {time.perf_counter() - start:.2f}s")
+    else:
+        index = IVFIndex.build(embeddings, num_lists=args.num_lists, iterations=args.iterations)
+        print(f"   Built index in {time.perf_counter() - start:.2f}s")
+    sizes = np.diff(index.list_offsets)
+    print(f"   {index.num_lists:,} lists, {sizes.min()}-{sizes.max()} courses per list (mean {sizes.mean():.0f})")
+    if len(index) != len(embeddings):
+        raise SystemExit(f'Index has {len(index):,} vectors but {len(embeddings):,} embeddings were given')
+
+    print()
+    print_recall_report(recall_report(index, embeddings, k=args.k, nprobes=args.nprobe,
+                                      num_queries=args.queries), k=args.k)
+    if args.save:
+        index.save(args.save)
+        print(f"\n   Saved index to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
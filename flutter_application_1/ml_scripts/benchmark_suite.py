@@ -0,0 +1,465 @@
+# =============================================================================
+# BENCHMARK_SUITE.PY - Speed Benchmarks for the ML Pipeline
+# =============================================================================
+# WHAT IS THIS FILE?
+# Hard numbers for every pipeline stage, so each performance change can be
+# measured before and after:
+#
+#   data generation   generate_data.generate_interactions (loop) and
+#                     generate_interactions_vectorized
+#   training data     train_course_similarity.create_training_data,
+#                     train_deep_learning_model.generate_augmented_training_data
+#   training step     train_model (mlp, two_tower), course similarity MLP,
+#                     deep similarity model
+#   export            TFLite conversion of each model
+#   serving           top-K similarity lookup over the catalog embeddings,
+#                     exact and through the IVF index (ann_index.py)
+#   evaluation        retrieval_eval.py recall / NDCG / MAP over the catalog
+#
+# SIZES:
+# Every benchmark runs for each catalog size (--catalog-sizes, default
+# 50 / 1k / 100k courses) and, where it matters, each interaction count
+# (--interactions, default 10k / 10M). Larger catalogs are built by
+# replicating the real course lists (see replicate_catalog).
+# Cases that cannot run on this machine are recorded as SKIPPED with the
+# reason - e.g. the C x (C - 1) pair set of a 100k catalog, or the old
+# Python loop at 10M rows (--max-seconds-estimate, --max-memory-gb).
+#
+# RESULTS & REGRESSIONS:
+#   python benchmark_suite.py --save-baseline        # before a change
+#   python benchmark_suite.py --fail-on-regression   # after it
+# Results go to benchmarks/benchmark_results.json (median, min and every
+# repeat per case). With a baseline file, each case is compared by median
+# time and flagged REGRESSION / improved beyond --threshold (default 15%).
+# =============================================================================
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+BENCHMARK_DIR = 'benchmarks'
+RESULTS_NAME = 'benchmark_results.json'
+BASELINE_NAME = 'benchmark_baseline.json'
+DEFAULT_CATALOG_SIZES = (50, 1000, 100000)
+DEFAULT_INTERACTIONS = (10000, 10000000)
+
+BENCHMARKS = {}  # name -> (function, parameter names)
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark case that cannot (or should not) run here."""
+
+
+def benchmark(name, params=()):
+    """
+    Register a benchmark. The function takes the parameters listed in
+    `params` (catalog, interactions) plus the suite options, does its setup,
+    and returns (run, items): run() is the timed callable and items is how
+    many rows / samples / queries one run processes (for items/sec; None
+    when there is nothing to count, e.g. a model conversion).
+    """
+    def register(function):
+        BENCHMARKS[name] = (function, params)
+        return function
+    return register
+
+
+def replicate_catalog(courses, num_courses):
+    """
+    A num_courses catalog made of copies of `courses`.
+
+    Copy r of course 'x' is 'x__r' and its related list points at copy r of
+    the related courses, so categories, tags and relation density match the
+    real catalog at any size.
+    """
+    catalog = []
+    for i in range(num_courses):
+        course = courses[i % len(courses)]
+        replica = i // len(courses)
+        catalog.append({
+            **course,
+            'id': f"{course['id']}__{replica}",
+            'related': [f'{rid}__{replica}' for rid in course.get('related', [])],
+        })
+    return catalog
+
+
+def check_budget(options, seconds=0.0, bytes_needed=0):
+    """Skip a case whose estimated time or memory is over the suite limits."""
+    if seconds > options.max_seconds_estimate:
+        raise SkipBenchmark(f'estimated {seconds:,.0f}s per run (limit {options.max_seconds_estimate:,.0f}s)')
+    if bytes_needed > options.max_memory_gb * 1024 ** 3:
+        raise SkipBenchmark(f'needs ~{bytes_needed / 1024 ** 3:,.1f} GB (limit {options.max_memory_gb:g} GB)')
+
+
+# =============================================================================
+# DATA GENERATION
+# =============================================================================
+@benchmark('generate_interactions_loop', params=('catalog', 'interactions'))
+def bench_generate_interactions_loop(catalog, interactions, options):
+    import random
+    import generate_data
+    rnd = random.Random(0)
+    users = generate_data.generate_users(generate_data.NUM_USERS, rnd)
+    courses = generate_data.generate_courses(catalog, rnd)
+    # The loop scans the whole catalog for every row (~40 ns per course)
+    check_budget(options, seconds=interactions * (catalog * 4e-8 + 2e-6))
+    random.seed(0)
+    return (lambda: generate_data.generate_interactions(users, courses, interactions)), interactions
+
+
+@benchmark('generate_interactions_vectorized', params=('catalog', 'interactions'))
+def bench_generate_interactions_vectorized(catalog, interactions, options):
+    import random
+    import generate_data
+    rnd = random.Random(0)
+    users = generate_data.generate_users(generate_data.NUM_USERS, rnd)
+    courses = generate_data.generate_courses(catalog, rnd)
+    catalog_arrays = generate_data.encode_catalog(users, courses)
+    check_budget(options, bytes_needed=interactions * 40)
+    rng = np.random.default_rng(0)
+    return (lambda: generate_data.generate_interactions_vectorized(users, courses, interactions, rng=rng,
+                                                                   catalog=catalog_arrays)), interactions
+
+
+# =============================================================================
+# TRAINING DATA
+# =============================================================================
+@benchmark('create_training_data', params=('catalog',))
+def bench_create_training_data(catalog, options):
+    import train_course_similarity as tcs
+    courses = replicate_catalog(tcs.COURSES, catalog)
+    encoders = tcs.build_feature_encoders(courses)
+    pairs = catalog * (catalog - 1)
+    # pair indices + labels, plus one C x C block of labels at a time
+    check_budget(options, seconds=pairs * 5e-8, bytes_needed=pairs * 12 + catalog * catalog * 8)
+    return (lambda: tcs.create_training_data(courses, encoders)), pairs
+
+
+@benchmark('generate_augmented_training_data', params=('catalog', 'interactions'))
+def bench_generate_augmented_training_data(catalog, interactions, options):
+    import train_deep_learning_model as deep
+    courses = replicate_catalog(deep.COURSES, catalog)
+    encoders = deep.build_feature_encoders(courses)
+    feature_dim = len(deep.encode_course_features(courses[0], encoders))
+    # C x C relation matrix + the materialized X1/X2 feature pairs
+    check_budget(options, seconds=interactions * 4e-7 + catalog * catalog * 1e-8,
+                 bytes_needed=catalog * catalog * 8 + interactions * (2 * feature_dim * 4 + 24))
+    return (lambda: deep.generate_augmented_training_data(courses, encoders, num_samples=interactions,
+                                                          seed=0)), interactions
+
+
+# =============================================================================
+# TRAINING STEPS (100 optimizer steps per run, after a warm-up)
+# =============================================================================
+TRAINING_STEPS = 100
+
+
+def repeated_batches(inputs, labels):
+    """One fixed batch, repeated: measures the step itself, not the input pipeline."""
+    return tf.data.Dataset.from_tensors((inputs, labels)).repeat()
+
+
+def fit_steps(model, dataset):
+    model.fit(dataset, steps_per_epoch=10, epochs=1, verbose=0)  # warm-up: builds the graph
+    return lambda: model.fit(dataset, steps_per_epoch=TRAINING_STEPS, epochs=1, verbose=0)
+
+
+def interaction_model_step(catalog, architecture):
+    import train_model
+    num_users, batch_size = 1000, 64
+    if architecture == 'two_tower':
+        model = train_model.build_two_tower_model(num_users, catalog)
+    else:
+        model = train_model.build_model(num_users, catalog)
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    rng = np.random.default_rng(0)
+    inputs = (rng.integers(0, num_users, (batch_size, 1)), rng.integers(0, catalog, (batch_size, 1)))
+    labels = rng.integers(0, 2, (batch_size, 1)).astype(np.float32)
+    return fit_steps(model, repeated_batches(inputs, labels)), TRAINING_STEPS * batch_size
+
+
+@benchmark('train_step_interaction_mlp', params=('catalog',))
+def bench_train_step_interaction_mlp(catalog, options):
+    return interaction_model_step(catalog, 'mlp')
+
+
+@benchmark('train_step_interaction_two_tower', params=('catalog',))
+def bench_train_step_interaction_two_tower(catalog, options):
+    return interaction_model_step(catalog, 'two_tower')
+
+
+def course_features_for(module, catalog):
+    courses = replicate_catalog(module.COURSES, catalog)
+    encoders = module.build_feature_encoders(courses)
+    return np.array([module.encode_course_features(c, encoders) for c in courses], dtype=np.float32)
+
+
+def siamese_step(model, course_features, batch_size):
+    rng = np.random.default_rng(0)
+    x1 = course_features[rng.integers(0, len(course_features), batch_size)]
+    x2 = course_features[rng.integers(0, len(course_features), batch_size)]
+    labels = rng.random((batch_size, 1)).astype(np.float32)
+    return fit_steps(model, repeated_batches((x1, x2), labels)), TRAINING_STEPS * batch_size
+
+
+@benchmark('train_step_course_similarity')
+def bench_train_step_course_similarity(options):
+    import train_course_similarity as tcs
+    course_features = course_features_for(tcs, len(tcs.COURSES))
+    model, _ = tcs.build_similarity_model(len(course_features), course_features.shape[1], embedding_dim=64)
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    return siamese_step(model, course_features, batch_size=64)
+
+
+@benchmark('train_step_deep_similarity')
+def bench_train_step_deep_similarity(options):
+    import train_deep_learning_model as deep
+    course_features = course_features_for(deep, len(deep.COURSES))
+    model, _ = deep.build_siamese_similarity_model(course_features.shape[1], embedding_dim=64)
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['mae', 'accuracy'])
+    return siamese_step(model, course_features, batch_size=128)
+
+
+# =============================================================================
+# TFLITE CONVERSION
+# =============================================================================
+@benchmark('tflite_convert_interaction_mlp', params=('catalog',))
+def bench_tflite_convert_interaction_mlp(catalog, options):
+    import train_model
+    model = train_model.build_model(1000, catalog)
+    return (lambda: train_model.convert_to_tflite(model, catalog)), None
+
+
+@benchmark('tflite_convert_course_similarity')
+def bench_tflite_convert_course_similarity(options):
+    import train_course_similarity as tcs
+    course_features = course_features_for(tcs, len(tcs.COURSES))
+    _, embedding_network = tcs.build_similarity_model(len(course_features), course_features.shape[1])
+    inference_model = tcs.build_inference_model(embedding_network, course_features.shape[1])
+
+    def convert():
+        converter = tf.lite.TFLiteConverter.from_keras_model(inference_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        return converter.convert()
+    return convert, None
+
+
+@benchmark('tflite_convert_deep_similarity')
+def bench_tflite_convert_deep_similarity(options):
+    import train_deep_learning_model as deep
+    course_features = course_features_for(deep, len(deep.COURSES))
+    _, embedding_network = deep.build_siamese_similarity_model(course_features.shape[1])
+    return (lambda: deep.convert_to_tflite(embedding_network)), None
+
+
+# =============================================================================
+# TOP-K SIMILARITY LOOKUP
+# =============================================================================
+TOP_K = 10
+TOP_K_QUERIES = 256
+
+
+@benchmark('top_k_lookup', params=('catalog',))
+def bench_top_k_lookup(catalog, options):
+    """Top-10 neighbours of 256 query courses: one matmul + argpartition."""
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((catalog, 64)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = embeddings[rng.integers(0, catalog, TOP_K_QUERIES)]
+    k = min(TOP_K, catalog - 1)
+
+    def lookup():
+        scores = queries @ embeddings.T
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        return np.take_along_axis(top, order, axis=1)
+    return lookup, TOP_K_QUERIES
+
+
+@benchmark('ann_search', params=('catalog',))
+def bench_ann_search(catalog, options):
+    """Top-10 of 256 query courses through the IVF index (nprobe=8); index build is setup."""
+    from ann_index import IVFIndex, synthetic_embeddings
+    embeddings = synthetic_embeddings(catalog)
+    index = IVFIndex.build(embeddings)
+    queries = embeddings[np.random.default_rng(0).integers(0, catalog, TOP_K_QUERIES)]
+    return lambda: index.search(queries, TOP_K, nprobe=8), TOP_K_QUERIES
+
+
+EVAL_QUERIES = 2000
+
+
+@benchmark('retrieval_eval', params=('catalog',))
+def bench_retrieval_eval(catalog, options):
+    """recall/NDCG/MAP@{5,10,20} for up to 2000 query courses, each ranked against the whole catalog."""
+    from retrieval_eval import evaluate_retrieval, related_edges
+    import train_course_similarity as tcs
+    courses = replicate_catalog(tcs.COURSES, catalog)
+    related_src, related_dst = related_edges(courses)
+    embeddings = np.random.default_rng(0).standard_normal((catalog, 64)).astype(np.float32)
+    queries = min(EVAL_QUERIES, catalog)
+    return lambda: evaluate_retrieval(embeddings, related_src, related_dst, max_queries=queries), queries
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+def case_key(name, params):
+    if not params:
+        return name
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def expand_cases(names, options):
+    """(name, params) for every selected benchmark x size combination."""
+    values = {'catalog': options.catalog_sizes, 'interactions': options.interactions}
+    for name in names:
+        _, param_names = BENCHMARKS[name]
+        for combo in itertools.product(*(values[p] for p in param_names)):
+            yield name, dict(zip(param_names, combo))
+
+
+def run_case(name, params, options):
+    function, _ = BENCHMARKS[name]
+    try:
+        run, items = function(**params, options=options)
+    except SkipBenchmark as reason:
+        return {'name': name, 'params': params, 'status': 'skipped', 'reason': str(reason)}
+
+    times = []
+    for _ in range(options.repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    median = float(np.median(times))
+    tf.keras.backend.clear_session()
+    return {
+        'name': name,
+        'params': params,
+        'status': 'ok',
+        'median_seconds': round(median, 6),
+        'min_seconds': round(min(times), 6),
+        'times': [round(t, 6) for t in times],
+        'items': items,
+        'items_per_second': round(items / median, 1) if items and median > 0 else None,
+    }
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'tensorflow': tf.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Attach baseline_seconds / ratio / verdict to every result that has a baseline."""
+    previous = {key: r for key, r in baseline.get('results', {}).items() if r.get('status') == 'ok'}
+    regressions = []
+    for key, result in results.items():
+        if result['status'] != 'ok':
+            continue
+        if key not in previous:
+            result['verdict'] = 'new'
+            continue
+        ratio = result['median_seconds'] / previous[key]['median_seconds']
+        result['baseline_seconds'] = previous[key]['median_seconds']
+        result['ratio'] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            result['verdict'] = 'REGRESSION'
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            result['verdict'] = 'improved'
+        else:
+            result['verdict'] = 'ok'
+    return regressions
+
+
+def print_results(results):
+    width = max(len(key) for key in results)
+    print(f"\n{'case':<{width}}  {'median':>10}  {'items/s':>14}  {'vs baseline':>12}  verdict")
+    print('-' * (width + 56))
+    for key, r in results.items():
+        if r['status'] != 'ok':
+            print(f"{key:<{width}}  {'SKIPPED':>10}  {r['reason']}")
+            continue
+        ratio = f"{r['ratio']:.2f}x" if 'ratio' in r else '-'
+        items = f"{r['items_per_second']:,.0f}" if r['items_per_second'] else '-'
+        print(f"{key:<{width}}  {r['median_seconds'] * 1000:>8.1f}ms  {items:>14}  {ratio:>12}  "
+              f"{r.get('verdict', '')}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the ML pipeline stages.')
+    parser.add_argument('--only', nargs='+', default=None, metavar='NAME',
+                        help=f"benchmarks to run (substring match); all: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--catalog-sizes', type=int, nargs='+', default=list(DEFAULT_CATALOG_SIZES))
+    parser.add_argument('--interactions', type=int, nargs='+', default=list(DEFAULT_INTERACTIONS))
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per case (the median is reported)')
+    parser.add_argument('--max-seconds-estimate', type=float, default=120.0,
+                        help='skip cases estimated to take longer than this per run')
+    parser.add_argument('--max-memory-gb', type=float, default=4.0,
+                        help='skip cases estimated to need more memory than this')
+    parser.add_argument('--output-dir', default=BENCHMARK_DIR)
+    parser.add_argument('--baseline', default=None,
+                        help=f'baseline results to compare against (default: <output-dir>/{BASELINE_NAME})')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='flag a case when its median is this much slower than the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 on a regression')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+    names = [n for n in BENCHMARKS if not options.only or any(part in n for part in options.only)]
+    cases = list(expand_cases(names, options))
+
+    print("=" * 70)
+    print(f"ML PIPELINE BENCHMARKS ({len(cases)} cases, {options.repeats} repeats each)")
+    print("=" * 70)
+    results = {}
+    for name, params in cases:
+        key = case_key(name, params)
+        print(f"   {key} ...", flush=True)
+        results[key] = run_case(name, params, options)
+
+    baseline_path = options.baseline or os.path.join(options.output_dir, BASELINE_NAME)
+    regressions = []
+    if os.path.exists(baseline_path) and not options.save_baseline:
+        with open(baseline_path) as f:
+            regressions = compare_to_baseline(results, json.load(f), options.threshold)
+        print(f"\nCompared against {baseline_path} (threshold {options.threshold:.0%})")
+    print_results(results)
+
+    os.makedirs(options.output_dir, exist_ok=True)
+    output_path = os.path.join(options.output_dir, RESULTS_NAME)
+    with open(output_path, 'w') as f:
+        json.dump({'environment': environment_info(), 'results': results}, f, indent=2)
+    print(f"\nSaved results to {output_path}")
+    if options.save_baseline:
+        shutil.copyfile(output_path, baseline_path)
+        print(f"Saved baseline to {baseline_path}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        if options.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,19 +11,39 @@
 # - We can generate as much data as we need
 #
 # OUTPUT: data/user_interactions.json
+#         (or a streamed directory, see --output-format below)
+#
+# USAGE:
+#   python ml_scripts/generate_data.py                       # original Python loop
+#   python ml_scripts/generate_data.py --mode vectorized     # NumPy, millions of rows/sec
+#   python ml_scripts/generate_data.py --output-format jsonl --num-interactions 500000000
+#   python ml_scripts/generate_data.py --output-format columnar --num-interactions 500000000
+#   python ml_scripts/generate_data.py --output-format columnar --shards 64 --seed 42 \
+#       --num-interactions 500000000                         # all cores, resumable
 # =============================================================================
 
+import argparse
 import json
+import multiprocessing
+import os
 import random
+import shutil
 import time
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from interaction_dataset import InteractionWriter, open_interactions, write_vocab
+
 # =============================================================================
 # CONFIGURATION - How much data to generate
 # =============================================================================
 NUM_USERS = 1000         # Number of fake users to create
 NUM_COURSES = 50         # Number of fake courses to create
 NUM_INTERACTIONS = 10000 # Number of user-course interactions
+CHUNK_SIZE = 1_000_000   # Rows generated + written at a time in streaming mode
+DEFAULT_SEED = 42        # Master seed used by sharded mode when --seed is not given
+DEFAULT_TIMESTAMP = 1735689600  # Fixed row timestamp for reproducible runs (2025-01-01 UTC)
 
 # =============================================================================
 # COURSE CATEGORIES - Types of courses in our platform
@@ -49,13 +69,15 @@ LEVELS = ['Beginner', 'Intermediate', 'Advanced']
 #   'preferred_category': 'Web Development',  # What they like
 #   'skill_level': 'Beginner'                 # Their level
 # }
-def generate_users(num):
+#
+# `rnd` can be a seeded random.Random(...) to get the same users every run.
+def generate_users(num, rnd=random):
     users = []
     for i in range(num):
         users.append({
             'userId': f'user_{i}',
-            'preferred_category': random.choice(CATEGORIES),  # Random favorite category
-            'skill_level': random.choice(LEVELS)              # Random skill level
+            'preferred_category': rnd.choice(CATEGORIES),  # Random favorite category
+            'skill_level': rnd.choice(LEVELS)              # Random skill level
         })
     return users
 
@@ -74,17 +96,17 @@ def generate_users(num):
 #   'price': 0.125,  # In ETH
 #   'rating': 4.3
 # }
-def generate_courses(num):
+def generate_courses(num, rnd=random):
     courses = []
     for i in range(num):
-        category = random.choice(CATEGORIES)
+        category = rnd.choice(CATEGORIES)
         courses.append({
             'courseId': f'course_{i}',
             'title': f'{category} Course {i}',
             'category': category,
-            'level': random.choice(LEVELS),
-            'price': round(random.uniform(0.01, 0.5), 3),    # Random price 0.01-0.5 ETH
-            'rating': round(random.uniform(3.5, 5.0), 1)     # Random rating 3.5-5.0
+            'level': rnd.choice(LEVELS),
+            'price': round(rnd.uniform(0.01, 0.5), 3),    # Random price 0.01-0.5 ETH
+            'rating': round(rnd.uniform(3.5, 5.0), 1)     # Random rating 3.5-5.0
         })
     return courses
 
@@ -99,25 +121,25 @@ def generate_courses(num):
 #
 # purchased = 1 means user bought the course
 # purchased = 0 means user viewed but didn't buy
-def generate_interactions(users, courses, num):
+def generate_interactions(users, courses, num, rnd=random, timestamp=None):
     interactions = []
     
     for _ in range(num):
-        user = random.choice(users)  # Pick a random user
+        user = rnd.choice(users)  # Pick a random user
         
         # REALISTIC BEHAVIOR:
         # 70% of the time, user looks at courses in their preferred category
         # 30% of the time, user explores other categories
-        if random.random() < 0.7:
+        if rnd.random() < 0.7:
             # Pick from preferred category (more likely scenario)
             category_courses = [c for c in courses if c['category'] == user['preferred_category']]
             if category_courses:
-                course = random.choice(category_courses)
+                course = rnd.choice(category_courses)
             else:
-                course = random.choice(courses)
+                course = rnd.choice(courses)
         else:
             # Random exploration (less likely)
-            course = random.choice(courses)
+            course = rnd.choice(courses)
             
         # =================================================================
         # PURCHASE PROBABILITY CALCULATION
@@ -135,7 +157,7 @@ def generate_interactions(users, courses, num):
             prob += 0.2  # +20% if matching level
             
         # Roll the dice - did user purchase?
-        if random.random() < prob:
+        if rnd.random() < prob:
             purchased = 1  # Yes, bought it!
             
         # Record this interaction
@@ -143,26 +165,381 @@ def generate_interactions(users, courses, num):
             'userId': user['userId'],
             'courseId': course['courseId'],
             'purchased': purchased,  # 1 = bought, 0 = just viewed
-            'timestamp': int(time.time())
+            'timestamp': int(time.time()) if timestamp is None else timestamp
         })
         
     return interactions
 
 
+# =============================================================================
+# FUNCTION 4: Vectorized Interaction Generator (NumPy)
+# =============================================================================
+# Same behaviour as generate_interactions(), but every random draw is made for
+# ALL interactions at once with NumPy instead of one Python loop iteration each.
+#
+# WHY IS THE LOOP SLOW?
+# generate_interactions() rebuilds the list of courses in the user's preferred
+# category on 70% of draws, so it costs O(interactions x courses) in Python.
+#
+# HOW THIS VERSION WORKS:
+# 1. Turn categories / levels into small integers (one array per attribute)
+# 2. Build a per-category index table once:
+#      table   = course indices sorted by category
+#      offsets = where each category starts inside `table`
+#      counts  = how many courses each category has
+#    "random course of category k" is then table[offsets[k] + r * counts[k]]
+# 3. Draw users, explore/prefer flags, courses and purchase rolls as arrays
+# 4. Apply the SAME probability rules (base 0.3, +0.3 category, +0.2 level)
+#
+# Returns three columns instead of a list of dicts:
+#   user_idx  (int32) - index into `users`
+#   course_idx (int32) - index into `courses`
+#   purchased (uint8) - 1 = bought, 0 = just viewed
+def encode_catalog(users, courses):
+    category_to_idx = {cat: idx for idx, cat in enumerate(CATEGORIES)}
+    level_to_idx = {level: idx for idx, level in enumerate(LEVELS)}
+    return {
+        'user_category': np.array([category_to_idx[u['preferred_category']] for u in users], dtype=np.int32),
+        'user_level': np.array([level_to_idx[u['skill_level']] for u in users], dtype=np.int32),
+        'course_category': np.array([category_to_idx[c['category']] for c in courses], dtype=np.int32),
+        'course_level': np.array([level_to_idx[c['level']] for c in courses], dtype=np.int32),
+    }
+
+
+def build_category_index(course_category):
+    table = np.argsort(course_category, kind='stable').astype(np.int32)
+    counts = np.bincount(course_category, minlength=len(CATEGORIES)).astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    return table, offsets, counts
+
+
+def generate_interactions_vectorized(users, courses, num, rng=None, catalog=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    if catalog is None:
+        catalog = encode_catalog(users, courses)
+    table, offsets, counts = build_category_index(catalog['course_category'])
+    
+    # Pick a random user for every interaction
+    user_idx = rng.integers(0, len(users), size=num, dtype=np.int32)
+    preferred = catalog['user_category'][user_idx]
+    
+    # Default: random exploration over the whole catalog (30% case)
+    course_idx = rng.integers(0, len(courses), size=num, dtype=np.int32)
+    
+    # 70% of the time: pick from the preferred category (if it has any course)
+    use_category = (rng.random(num) < 0.7) & (counts[preferred] > 0)
+    sel = np.flatnonzero(use_category)
+    sel_category = preferred[sel]
+    pick = (rng.random(sel.size) * counts[sel_category]).astype(np.int64)
+    course_idx[sel] = table[offsets[sel_category] + pick]
+    
+    # Purchase probability: base 30%, +30% category match, +20% level match
+    prob = np.full(num, 0.3)
+    prob += 0.3 * (catalog['course_category'][course_idx] == preferred)
+    prob += 0.2 * (catalog['course_level'][course_idx] == catalog['user_level'][user_idx])
+    purchased = (rng.random(num) < prob).astype(np.uint8)
+    
+    return user_idx, course_idx, purchased
+
+
+# Convert vectorized columns back into the JSON record layout used above
+def interactions_to_records(users, courses, user_idx, course_idx, purchased, timestamp):
+    user_ids = [u['userId'] for u in users]
+    course_ids = [c['courseId'] for c in courses]
+    return [
+        {
+            'userId': user_ids[u],
+            'courseId': course_ids[c],
+            'purchased': p,
+            'timestamp': timestamp
+        }
+        for u, c, p in zip(user_idx.tolist(), course_idx.tolist(), purchased.tolist())
+    ]
+
+
+# =============================================================================
+# FUNCTION 5: Streaming Output (constant memory)
+# =============================================================================
+# The default JSON output keeps users, courses and EVERY interaction in one
+# dict and pretty-prints it, so memory and file size grow with the row count.
+#
+# Streaming mode instead generates CHUNK_SIZE rows, writes them, and throws
+# them away before drawing the next chunk. Peak memory is one chunk, whether
+# we generate 10k or 500M interactions.
+#
+# OUTPUT DIRECTORY LAYOUT:
+#   <out>/catalog.json          - users + courses (small, compact JSON)
+#   <out>/users.vocab, courses.vocab - ID strings, line N = encoded index N
+#   <out>/interactions.jsonl    - one compact JSON object per line   (jsonl)
+#   <out>/user.bin, course.bin, purchased.bin, meta.json             (columnar)
+#
+# The columnar layout is defined in interaction_dataset.py; train_model.py
+# memory-maps it directly (python ml_scripts/train_model.py --data <out>).
+def iter_interaction_chunks(users, courses, num, chunk_size=CHUNK_SIZE, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    catalog = encode_catalog(users, courses)
+    for start in range(0, num, chunk_size):
+        size = min(chunk_size, num - start)
+        yield generate_interactions_vectorized(users, courses, size, rng=rng, catalog=catalog)
+
+
+def write_catalog(out_dir, users, courses):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, 'catalog.json'), 'w') as f:
+        json.dump({'users': users, 'courses': courses}, f, separators=(',', ':'))
+    write_vocab(out_dir, 'user', [u['userId'] for u in users])
+    write_vocab(out_dir, 'course', [c['courseId'] for c in courses])
+
+
+# Memory-map a finished columnar dataset and print a quick sanity summary
+def summarize_columnar(path, block_size=CHUNK_SIZE * 16):
+    datasets = open_interactions(path)
+    rows = sum(len(d) for d in datasets)
+    purchases = sum(
+        int(np.count_nonzero(d.purchased[start:start + block_size]))
+        for d in datasets
+        for start in range(0, len(d), block_size)
+    )
+    print(f"Verified {rows:,} rows via memmap ({len(datasets[0].user_vocab)} users, "
+          f"{len(datasets[0].course_vocab)} courses, purchase rate {purchases / max(rows, 1):.3f})")
+
+
+def write_interactions_jsonl(path, users, courses, chunks, timestamp):
+    user_ids = [u['userId'] for u in users]
+    course_ids = [c['courseId'] for c in courses]
+    total = 0
+    with open(path, 'w') as f:
+        for user_idx, course_idx, purchased in chunks:
+            f.writelines(
+                f'{{"userId":"{user_ids[u]}","courseId":"{course_ids[c]}","purchased":{p},"timestamp":{timestamp}}}\n'
+                for u, c, p in zip(user_idx.tolist(), course_idx.tolist(), purchased.tolist())
+            )
+            total += len(user_idx)
+    return total
+
+
+def write_interactions_columnar(path, chunks, timestamp):
+    with InteractionWriter(path, timestamp=timestamp) as writer:
+        for user_idx, course_idx, purchased in chunks:
+            writer.append(user_idx, course_idx, purchased)
+    return writer.num_rows
+
+
+def stream_interactions(out_dir, output_format, users, courses, num, chunk_size=CHUNK_SIZE, rng=None,
+                        timestamp=None):
+    write_catalog(out_dir, users, courses)
+    chunks = iter_interaction_chunks(users, courses, num, chunk_size=chunk_size, rng=rng)
+    if timestamp is None:
+        timestamp = int(time.time())
+    if output_format == 'jsonl':
+        return write_interactions_jsonl(os.path.join(out_dir, 'interactions.jsonl'), users, courses, chunks, timestamp)
+    return write_interactions_columnar(out_dir, chunks, timestamp)
+
+
+# =============================================================================
+# FUNCTION 6: Sharded Multi-Process Generation (deterministic + resumable)
+# =============================================================================
+# Splits the interactions into `num_shards` pieces and generates them in a
+# process pool, so rebuilding a 500M-row stress dataset scales with cores.
+#
+# DETERMINISM:
+# - Users/courses come from random.Random(seed)
+# - Shard k draws from np.random.SeedSequence(seed, spawn_key=(k,)), so its
+#   rows only depend on (seed, k, rows in shard) - not on worker count or
+#   on which process happens to run it
+# - Every row uses the same fixed timestamp (stored in manifest.json)
+# - chunk_size is recorded too, because it decides the order of random draws
+# => same arguments give byte-identical files.
+#
+# RESUME:
+# Each shard is written under a ".tmp" name and renamed when complete.
+# Re-running the same command skips shards that already exist, so an
+# interrupted run only redoes the shards that were in flight.
+#
+# OUTPUT DIRECTORY LAYOUT:
+#   <out>/manifest.json              - seed, shard sizes, format, timestamp
+#   <out>/catalog.json               - users + courses
+#   <out>/shard-00000.jsonl ...      (jsonl)
+#   <out>/shard-00000/ ...           (columnar, one dataset directory per shard)
+def shard_sizes(num, num_shards):
+    base, extra = divmod(num, num_shards)
+    return [base + (1 if k < extra else 0) for k in range(num_shards)]
+
+
+def shard_name(index, output_format):
+    name = f'shard-{index:05d}'
+    return f'{name}.jsonl' if output_format == 'jsonl' else name
+
+
+def shard_rng(seed, index):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def generate_shard(task):
+    out_dir, output_format, index, num, seed, timestamp, chunk_size, users, courses = task
+    final_path = os.path.join(out_dir, shard_name(index, output_format))
+    tmp_path = final_path + '.tmp'
+    remove_path(tmp_path)  # Leftover from an interrupted run
+    
+    chunks = iter_interaction_chunks(users, courses, num, chunk_size=chunk_size, rng=shard_rng(seed, index))
+    if output_format == 'jsonl':
+        write_interactions_jsonl(tmp_path, users, courses, chunks, timestamp)
+    else:
+        write_interactions_columnar(tmp_path, chunks, timestamp)
+    
+    os.replace(tmp_path, final_path)  # Atomic: a shard is either complete or absent
+    return index, num
+
+
+def generate_sharded(out_dir, output_format, num, num_shards, seed, timestamp=DEFAULT_TIMESTAMP,
+                     workers=None, chunk_size=CHUNK_SIZE, num_users=NUM_USERS, num_courses=NUM_COURSES):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        'format': output_format,
+        'seed': seed,
+        'timestamp': timestamp,
+        'num_users': num_users,
+        'num_courses': num_courses,
+        'num_interactions': num,
+        'chunk_size': chunk_size,  # Chunking changes the order of random draws
+        'shards': [
+            {'file': shard_name(k, output_format), 'num_rows': rows}
+            for k, rows in enumerate(shard_sizes(num, num_shards))
+        ]
+    }
+    
+    # Refuse to mix shards from a different configuration into this directory
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            existing = json.load(f)
+        if existing != manifest:
+            raise ValueError(f'{out_dir} holds shards from a different configuration; '
+                             'use a new --output directory')
+    else:
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    
+    rnd = random.Random(seed)
+    users = generate_users(num_users, rnd)
+    courses = generate_courses(num_courses, rnd)
+    write_catalog(out_dir, users, courses)
+    
+    tasks = [
+        (out_dir, output_format, k, shard['num_rows'], seed, timestamp, chunk_size, users, courses)
+        for k, shard in enumerate(manifest['shards'])
+        if not os.path.exists(os.path.join(out_dir, shard['file']))
+    ]
+    skipped = num_shards - len(tasks)
+    if skipped:
+        print(f"Resuming: {skipped} of {num_shards} shards already written")
+    
+    written = 0
+    if tasks:
+        with multiprocessing.Pool(processes=min(workers or os.cpu_count(), len(tasks))) as pool:
+            for index, rows in pool.imap_unordered(generate_shard, tasks):
+                written += 1
+                print(f"  shard {index:05d} done ({rows:,} rows) [{written + skipped}/{num_shards}]")
+    return num
+
+
 # =============================================================================
 # MAIN FUNCTION - Run the data generation
 # =============================================================================
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate synthetic user-course interactions.')
+    parser.add_argument('--mode', choices=['python', 'vectorized'], default='python',
+                        help='python = original per-row loop, vectorized = NumPy array draws')
+    parser.add_argument('--num-interactions', type=int, default=NUM_INTERACTIONS)
+    parser.add_argument('--output-format', choices=['json', 'jsonl', 'columnar'], default='json',
+                        help='json = single pretty-printed file, jsonl/columnar = chunked streaming output')
+    parser.add_argument('--output', default=None,
+                        help='Output path (default: data/user_interactions.json or data/interactions/)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--shards', type=int, default=0,
+                        help='Split jsonl/columnar output into N shards generated by a process pool')
+    parser.add_argument('--workers', type=int, default=None, help='Pool size (default: all cores)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help=f'Master seed (sharded mode defaults to {DEFAULT_SEED})')
+    parser.add_argument('--timestamp', type=int, default=None,
+                        help=f'Row timestamp (sharded mode defaults to {DEFAULT_TIMESTAMP})')
+    return parser.parse_args()
+
+
 def main():
-    print("Generating synthetic data...")
+    args = parse_args()
+    
+    # Sharded mode builds its own seeded users/courses inside generate_sharded()
+    if args.shards:
+        if args.output_format == 'json':
+            raise SystemExit('--shards needs --output-format jsonl or columnar')
+        out_dir = args.output or 'data/interactions'
+        seed = DEFAULT_SEED if args.seed is None else args.seed
+        timestamp = DEFAULT_TIMESTAMP if args.timestamp is None else args.timestamp
+        print(f"Generating {args.num_interactions:,} interactions in {args.shards} shards "
+              f"(seed={seed}) to {out_dir}...")
+        start = time.perf_counter()
+        total = generate_sharded(out_dir, args.output_format, args.num_interactions, args.shards, seed,
+                                 timestamp=timestamp, workers=args.workers, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"Done in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/sec). Saved to {out_dir}")
+        if args.output_format == 'columnar':
+            summarize_columnar(out_dir)
+        return
+    
+    # A --seed makes the single-process modes reproducible too
+    rnd = random if args.seed is None else random.Random(args.seed)
+    rng = None if args.seed is None else np.random.default_rng(args.seed)
     
     # Step 1: Create fake users
-    users = generate_users(NUM_USERS)
+    users = generate_users(NUM_USERS, rnd)
     
     # Step 2: Create fake courses
-    courses = generate_courses(NUM_COURSES)
+    courses = generate_courses(NUM_COURSES, rnd)
+    
+    # Streaming formats always use the vectorized generator, one chunk at a time
+    if args.output_format != 'json':
+        out_dir = args.output or 'data/interactions'
+        print(f"Streaming synthetic data to {out_dir} ({args.output_format}, chunks of {args.chunk_size:,})...")
+        start = time.perf_counter()
+        total = stream_interactions(out_dir, args.output_format, users, courses,
+                                    args.num_interactions, chunk_size=args.chunk_size, rng=rng,
+                                    timestamp=args.timestamp)
+        elapsed = time.perf_counter() - start
+        print(f"Generated {len(users)} users, {len(courses)} courses, {total:,} interactions "
+              f"in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/sec).")
+        print(f"Saved to {out_dir}")
+        if args.output_format == 'columnar':
+            summarize_columnar(out_dir)
+        return
+    
+    print(f"Generating synthetic data ({args.mode} mode)...")
     
     # Step 3: Simulate interactions
-    interactions = generate_interactions(users, courses, NUM_INTERACTIONS)
+    start = time.perf_counter()
+    if args.mode == 'vectorized':
+        user_idx, course_idx, purchased = generate_interactions_vectorized(
+            users, courses, args.num_interactions, rng=rng
+        )
+        elapsed = time.perf_counter() - start
+        interactions = interactions_to_records(
+            users, courses, user_idx, course_idx, purchased,
+            int(time.time()) if args.timestamp is None else args.timestamp
+        )
+    else:
+        interactions = generate_interactions(users, courses, args.num_interactions, rnd,
+                                             timestamp=args.timestamp)
+        elapsed = time.perf_counter() - start
+    print(f"Generated interactions in {elapsed:.2f}s ({len(interactions) / max(elapsed, 1e-9):,.0f} rows/sec)")
     
     # Step 4: Save everything to JSON file
     data = {
@@ -171,11 +548,12 @@ def main():
         'interactions': interactions
     }
     
-    with open('data/user_interactions.json', 'w') as f:
+    output_path = args.output or 'data/user_interactions.json'
+    with open(output_path, 'w') as f:
         json.dump(data, f, indent=2)
         
     print(f"Generated {len(users)} users, {len(courses)} courses, {len(interactions)} interactions.")
-    print("Saved to data/user_interactions.json")
+    print(f"Saved to {output_path}")
 
 
 # Run the script when executed directly
@@ -0,0 +1,334 @@
+# =============================================================================
+# HYPERPARAMETER_SWEEP.PY - Parallel Hyperparameter Sweeps
+# =============================================================================
+# WHAT IS THIS FILE?
+# Trains many variants of the deep similarity model (train_deep_learning_model.py)
+# at the same time and ranks them by validation loss - instead of editing
+# embedding_dim / batch_size / dropout / layer widths by hand and re-running
+# the whole script for every guess.
+#
+# HOW IT WORKS:
+#   1. The training arrays are generated ONCE and written as .npy files:
+#        <sweep_dir>/data/X1.npy, X2.npy, y.npy   (200k x 2 x feature_dim floats)
+#      A later sweep with the same --num-samples/--seed reuses them.
+#   2. A pool of worker PROCESSES opens them with np.load(mmap_mode='r').
+#      A memory-mapped file is shared through the OS page cache: every worker
+#      reads the same physical pages, nobody regenerates or copies the arrays.
+#      Each batch gathers only its own rows from the mapping.
+#   3. Every worker is limited to --threads-per-worker TensorFlow threads, so
+#      N workers x T threads fill the machine without fighting over cores.
+#   4. Each trial trains with EarlyStopping and reports val loss / MAE /
+#      accuracy, epochs, time and parameter count. The ranked table is printed
+#      and saved to <sweep_dir>/sweep_results.json.
+#
+# EXAMPLE (4 x 2 x 2 = 16 trials):
+#   python hyperparameter_sweep.py --embedding-dim 32 64 --batch-size 128 256 \
+#       --widths 256,128,64 128,64,64 --dropout 0.3,0.25 0.1,0.1 --epochs 30
+#
+# Workers use the 'spawn' start method (TensorFlow is not fork-safe) and
+# import TensorFlow only inside the worker, after the thread limits are set.
+# =============================================================================
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+SWEEP_DIR = 'sweep'
+RESULTS_NAME = 'sweep_results.json'
+VALIDATION_SPLIT = 0.85  # same cut as train_deep_learning_model.py
+
+# Set in every worker process by init_worker()
+_worker_data = None
+
+
+# =============================================================================
+# 1. PUBLISH THE TRAINING DATA (parent process, once)
+# =============================================================================
+def publish_training_data(data_dir, num_samples=200000, seed=0):
+    """
+    Write shuffled X1/X2/y .npy files for the workers; reuse them if they match.
+
+    X1 and X2 are written block by block straight into np.lib.format.open_memmap
+    files, so the parent never holds them in RAM either.
+    Returns the metadata dict (feature_dim, split_idx, ...).
+    """
+    meta_path = os.path.join(data_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['num_samples'] == num_samples and meta['seed'] == seed:
+            print(f"   Reusing training data in {data_dir}")
+            return meta
+
+    from train_deep_learning_model import (COURSES, build_feature_encoders, generate_augmented_pairs,
+                                           materialize_augmented_features)
+    os.makedirs(data_dir, exist_ok=True)
+    encoders = build_feature_encoders(COURSES)
+    course_features, pairs_c1, pairs_c2, noise1, noise2, y = generate_augmented_pairs(
+        COURSES, encoders, num_samples=num_samples, seed=seed
+    )
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+
+    for name, pairs, noise in (('X1', pairs_c1, noise1), ('X2', pairs_c2, noise2)):
+        out = np.lib.format.open_memmap(os.path.join(data_dir, name + '.npy'), mode='w+', dtype=np.float32,
+                                        shape=(len(y), course_features.shape[1]))
+        materialize_augmented_features(course_features, pairs[order], noise[order], rng, out=out)
+        out.flush()
+        del out
+    np.save(os.path.join(data_dir, 'y.npy'), y[order])
+
+    # meta.json last: its presence means the data set is complete
+    meta = {
+        'num_samples': num_samples,
+        'seed': seed,
+        'feature_dim': int(course_features.shape[1]),
+        'split_idx': int(VALIDATION_SPLIT * len(y)),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    size_mb = 2 * len(y) * course_features.shape[1] * 4 / 1024 ** 2
+    print(f"   Published {len(y):,} samples ({size_mb:.0f} MB of features) to {data_dir}")
+    return meta
+
+
+# =============================================================================
+# 2. WORKERS
+# =============================================================================
+def init_worker(data_dir, threads):
+    """Process-pool initializer: limit threads, then memory-map the shared arrays."""
+    global _worker_data
+    # Must happen before TensorFlow starts its thread pools
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    with open(os.path.join(data_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    _worker_data = {name: np.load(os.path.join(data_dir, name + '.npy'), mmap_mode='r')
+                    for name in ('X1', 'X2', 'y')}
+    _worker_data['meta'] = meta
+
+
+def memmap_pair_dataset(X1, X2, y, start, stop, batch_size, seed=None, epochs=1):
+    """
+    tf.data batches of ((x1, x2), y) for rows [start, stop) of memory-mapped arrays.
+
+    seed=None: one pass in order (validation). Otherwise a fresh shuffle per
+    epoch via training_state.epoch_index_dataset; use steps_per_epoch in fit().
+    Rows are gathered in sorted order, which keeps reads from the file local.
+    """
+    import tensorflow as tf
+    from training_state import epoch_index_dataset
+
+    def gather(idx):
+        idx = np.sort(idx) + start
+        return X1[idx], X2[idx], y[idx]
+
+    def load(*batch):
+        x1, x2, labels = tf.numpy_function(gather, [batch[-1]], [tf.float32, tf.float32, tf.float32])
+        x1.set_shape([None, X1.shape[1]])
+        x2.set_shape([None, X2.shape[1]])
+        labels.set_shape([None])
+        return (x1, x2), labels
+
+    if seed is None:
+        ds = tf.data.Dataset.range(stop - start).batch(batch_size)
+    else:
+        ds = epoch_index_dataset(stop - start, batch_size, seed, 0, epochs)
+    return ds.map(load, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+def run_trial(trial):
+    """Train one configuration on the shared data; return the trial plus its scores."""
+    import tensorflow as tf
+    from train_deep_learning_model import build_siamese_similarity_model
+    from training_state import steps_per_epoch
+
+    X1, X2, y, meta = (_worker_data[key] for key in ('X1', 'X2', 'y', 'meta'))
+    split_idx, batch_size = meta['split_idx'], trial['batch_size']
+    tf.keras.utils.set_random_seed(trial['seed'])
+
+    model, embedding_network = build_siamese_similarity_model(
+        meta['feature_dim'], embedding_dim=trial['embedding_dim'], widths=tuple(trial['widths']),
+        dropout=tuple(trial['dropout']), num_heads=trial['num_heads']
+    )
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=trial['learning_rate']),
+        loss='binary_crossentropy',
+        metrics=['mae', 'accuracy']
+    )
+    train_ds = memmap_pair_dataset(X1, X2, y, 0, split_idx, batch_size, seed=trial['seed'], epochs=trial['epochs'])
+    val_ds = memmap_pair_dataset(X1, X2, y, split_idx, len(y), batch_size)
+
+    start = time.perf_counter()
+    history = model.fit(
+        train_ds,
+        steps_per_epoch=steps_per_epoch(split_idx, batch_size),
+        validation_data=val_ds,
+        epochs=trial['epochs'],
+        callbacks=[tf.keras.callbacks.EarlyStopping(patience=trial['patience'], restore_best_weights=True,
+                                                    monitor='val_loss')],
+        verbose=0
+    )
+    train_seconds = time.perf_counter() - start
+    scores = model.evaluate(val_ds, return_dict=True, verbose=0)
+
+    epochs_trained = len(history.history['loss'])
+    return {
+        **trial,
+        'val_loss': float(scores['loss']),
+        'val_mae': float(scores['mae']),
+        'val_accuracy': float(scores['accuracy']),
+        'epochs_trained': epochs_trained,
+        'train_seconds': round(train_seconds, 1),
+        'seconds_per_epoch': round(train_seconds / epochs_trained, 2),
+        'parameters': int(embedding_network.count_params()),
+        'worker_pid': os.getpid(),
+    }
+
+
+# =============================================================================
+# 3. SWEEP
+# =============================================================================
+def build_trials(args):
+    """Every combination of the grid arguments, as a list of plain dicts."""
+    grid = itertools.product(args.embedding_dim, args.batch_size, args.learning_rate, args.widths,
+                             args.dropout, args.num_heads)
+    return [
+        {
+            'trial': i,
+            'embedding_dim': embedding_dim,
+            'batch_size': batch_size,
+            'learning_rate': learning_rate,
+            'widths': list(widths),
+            'dropout': list(dropout),
+            'num_heads': num_heads,
+            'epochs': args.epochs,
+            'patience': args.patience,
+            'seed': args.seed,
+        }
+        for i, (embedding_dim, batch_size, learning_rate, widths, dropout, num_heads) in enumerate(grid)
+    ]
+
+
+def run_sweep(trials, data_dir, workers, threads_per_worker):
+    """Run trials in a spawn-based process pool; failed trials are kept with their error."""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(data_dir, threads_per_worker)) as pool:
+        futures = {pool.submit(run_trial, trial): trial for trial in trials}
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                result = future.result()
+                print(f"   trial {trial['trial']:3d} done: val_loss {result['val_loss']:.4f} "
+                      f"({result['train_seconds']:.0f}s, pid {result['worker_pid']})")
+            except Exception as error:  # a bad config must not kill the sweep
+                result = {**trial, 'error': f'{type(error).__name__}: {error}'}
+                print(f"   trial {trial['trial']:3d} FAILED: {result['error']}")
+            results.append(result)
+    return rank_results(results)
+
+
+def rank_results(results):
+    """Successful trials by val_loss (best first), then the failed ones."""
+    ok = sorted((r for r in results if 'error' not in r), key=lambda r: r['val_loss'])
+    failed = sorted((r for r in results if 'error' in r), key=lambda r: r['trial'])
+    for rank, result in enumerate(ok, start=1):
+        result['rank'] = rank
+    return ok + failed
+
+
+def print_results_table(results):
+    header = (f"{'rank':>4}  {'emb':>4}  {'batch':>5}  {'lr':>8}  {'widths':<12}  {'dropout':<10}  {'heads':>5}  "
+              f"{'val_loss':>8}  {'val_mae':>7}  {'val_acc':>7}  {'epochs':>6}  {'s/epoch':>7}  {'params':>8}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        widths = ','.join(str(w) for w in r['widths'])
+        dropout = ','.join(f'{d:g}' for d in r['dropout'])
+        settings = (f"{r['embedding_dim']:>4}  {r['batch_size']:>5}  {r['learning_rate']:>8.1e}  {widths:<12}  "
+                    f"{dropout:<10}  {r['num_heads']:>5}")
+        if 'error' in r:
+            print(f"{'-':>4}  {settings}  {r['error']}")
+        else:
+            print(f"{r['rank']:>4}  {settings}  {r['val_loss']:>8.4f}  {r['val_mae']:>7.4f}  "
+                  f"{r['val_accuracy']:>7.3f}  {r['epochs_trained']:>6}  {r['seconds_per_epoch']:>7.2f}  "
+                  f"{r['parameters']:>8,}")
+
+
+def int_tuple(text):
+    return tuple(int(v) for v in text.split(','))
+
+
+def float_tuple(text):
+    return tuple(float(v) for v in text.split(','))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep for the deep similarity model.')
+    parser.add_argument('--embedding-dim', type=int, nargs='+', default=[64])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[128])
+    parser.add_argument('--learning-rate', type=float, nargs='+', default=[0.001])
+    parser.add_argument('--widths', type=int_tuple, nargs='+', default=[(256, 128, 64)],
+                        help='comma-separated (layers 1-2, layers 3-4, layer 5 + attention) widths')
+    parser.add_argument('--dropout', type=float_tuple, nargs='+', default=[(0.3, 0.25)],
+                        help='comma-separated (layers 1-2, layers 3-4) dropout rates')
+    parser.add_argument('--num-heads', type=int, nargs='+', default=[4])
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--num-samples', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='parallel trials (default: cores // threads-per-worker)')
+    parser.add_argument('--sweep-dir', default=SWEEP_DIR)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    trials = build_trials(args)
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads_per_worker)
+    workers = min(workers, len(trials))
+
+    print("=" * 70)
+    print("HYPERPARAMETER SWEEP")
+    print("=" * 70)
+    print(f"\n1. Publishing training data ({args.num_samples:,} samples, seed {args.seed})...")
+    data_dir = os.path.join(args.sweep_dir, 'data')
+    publish_training_data(data_dir, num_samples=args.num_samples, seed=args.seed)
+
+    print(f"\n2. Running {len(trials)} trials on {workers} workers x {args.threads_per_worker} threads...")
+    start = time.perf_counter()
+    results = run_sweep(trials, data_dir, workers, args.threads_per_worker)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n3. Results ({elapsed:.0f}s total, ranked by validation loss):\n")
+    print_results_table(results)
+
+    results_path = os.path.join(args.sweep_dir, RESULTS_NAME)
+    with open(results_path, 'w') as f:
+        json.dump({
+            'num_samples': args.num_samples,
+            'seed': args.seed,
+            'workers': workers,
+            'threads_per_worker': args.threads_per_worker,
+            'elapsed_seconds': round(elapsed, 1),
+            'results': results,
+        }, f, indent=2)
+    print(f"\n   Saved results to {results_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# =============================================================================
+# ID_VOCABULARY.PY - Append-Only ID → Index Vocabulary
+# =============================================================================
+# WHAT IS THIS FILE?
+# A replacement for sklearn's LabelEncoder for user and course IDs.
+#
+# WHY NOT LabelEncoder?
+# - LabelEncoder is re-fitted from scratch and SORTS the IDs, so adding
+#   'user_1000' shifts the index of every user after it alphabetically.
+#   Every embedding row then belongs to a different user → full retrain.
+#
+# HOW THIS WORKS:
+# - Indices are handed out in first-seen order and NEVER change
+#   ('user_0' → 0 forever; a new 'user_1000' just gets the next free index)
+# - add()/lookup() take whole arrays: the Python dict is only touched once
+#   per UNIQUE ID, so encoding 10M rows with 1k users costs 1k dict lookups
+# - save()/load(): plain text, one ID per line (line N = index N), the same
+#   layout as the *.vocab side files in interaction_dataset.py
+# - export_binary(): compact sorted string table for the app/other tools
+#
+# BINARY LAYOUT (export_binary / load_binary), all little-endian:
+#   magic      4 bytes  b'IDV1'
+#   count      uint32   number of IDs
+#   blob_size  uint32   size of the UTF-8 string blob
+#   offsets    uint32[count + 1]  start of each SORTED string in the blob
+#   indices    int32[count]       sorted position → stable index
+#   blob       UTF-8 bytes of all IDs in sorted order
+# A lookup is a binary search over the sorted strings - no hash map to build.
+# =============================================================================
+
+import os
+
+import numpy as np
+
+BINARY_MAGIC = b'IDV1'
+
+
+class IdVocabulary:
+    """
+    Append-only vocabulary with stable indices.
+
+    Example:
+        vocab = IdVocabulary.load('assets/model/users.vocab')   # or IdVocabulary()
+        codes = vocab.add(user_ids)     # new IDs get new indices, old ones keep theirs
+        vocab.save('assets/model/users.vocab')
+    """
+    def __init__(self, ids=()):
+        self.ids = []
+        self.index = {}
+        for item in ids:
+            self._append(str(item))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def _append(self, item):
+        if item not in self.index:
+            self.index[item] = len(self.ids)
+            self.ids.append(item)
+
+    def _unique(self, ids):
+        # uniques (sorted), position of first occurrence, and row → unique mapping
+        ids = np.asarray(ids)
+        if ids.dtype.kind not in 'UO':
+            ids = ids.astype(str)
+        return np.unique(ids, return_index=True, return_inverse=True)
+
+    def add(self, ids):
+        """Add unseen IDs (in first-seen order) and return int32 codes for every row."""
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int32)
+        uniques, first_seen, inverse = self._unique(ids)
+        for pos in np.argsort(first_seen, kind='stable'):
+            self._append(str(uniques[pos]))
+        codes = np.fromiter((self.index[str(u)] for u in uniques), dtype=np.int32, count=len(uniques))
+        return codes[inverse.reshape(-1)]
+
+    def lookup(self, ids, default=-1):
+        """Return int32 codes for every row; unknown IDs map to `default`."""
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int32)
+        uniques, _, inverse = self._unique(ids)
+        codes = np.fromiter((self.index.get(str(u), default) for u in uniques),
+                            dtype=np.int32, count=len(uniques))
+        return codes[inverse.reshape(-1)]
+
+    def extend_from(self, other_ids):
+        """
+        Merge another vocabulary (e.g. a dataset's users.vocab) into this one.
+
+        Returns an int32 array `remap` so that remap[other_code] is the stable code.
+        """
+        for item in other_ids:
+            self._append(item)
+        return np.fromiter((self.index[item] for item in other_ids), dtype=np.int32, count=len(other_ids))
+
+    # -------------------------------------------------------------------------
+    # Text persistence (one ID per line)
+    # -------------------------------------------------------------------------
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(f'{item}\n' for item in self.ids)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(f.read().splitlines())
+
+    @classmethod
+    def load_or_create(cls, path):
+        return cls.load(path) if os.path.exists(path) else cls()
+
+    # -------------------------------------------------------------------------
+    # Compact binary export (sorted string table)
+    # -------------------------------------------------------------------------
+    def export_binary(self, path):
+        encoded = [item.encode('utf-8') for item in self.ids]
+        order = sorted(range(len(encoded)), key=encoded.__getitem__)
+        lengths = np.array([len(encoded[i]) for i in order], dtype=np.uint64)
+        offsets = np.zeros(len(order) + 1, dtype=np.uint64)
+        np.cumsum(lengths, out=offsets[1:])
+        if offsets[-1] > np.iinfo(np.uint32).max:
+            raise ValueError('Vocabulary is too large for 32-bit string offsets')
+
+        with open(path, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            np.array([len(order), int(offsets[-1])], dtype='<u4').tofile(f)
+            offsets.astype('<u4').tofile(f)
+            np.array(order, dtype='<i4').tofile(f)
+            f.write(b''.join(encoded[i] for i in order))
+
+    @classmethod
+    def load_binary(cls, path):
+        table = SortedIdTable(path)
+        ids = [None] * len(table)
+        for sorted_pos, idx in enumerate(table.indices.tolist()):
+            ids[idx] = table.sorted_ids[sorted_pos]
+        return cls(ids)
+
+
+class SortedIdTable:
+    """
+    Read-only view of an export_binary() file.
+
+    lookup() binary-searches the sorted strings with np.searchsorted, so it
+    needs no dict and works straight from the compact file.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != BINARY_MAGIC:
+            raise ValueError(f'{path} is not an IdVocabulary binary file')
+
+        count, blob_size = np.frombuffer(data, dtype='<u4', count=2, offset=4)
+        count, blob_size = int(count), int(blob_size)
+        pos = 12
+        offsets = np.frombuffer(data, dtype='<u4', count=count + 1, offset=pos)
+        pos += 4 * (count + 1)
+        self.indices = np.frombuffer(data, dtype='<i4', count=count, offset=pos)
+        pos += 4 * count
+        blob = data[pos:pos + blob_size]
+        self.sorted_ids = [
+            blob[start:end].decode('utf-8')
+            for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+        ]
+        # np.unicode arrays compare by code point, which matches UTF-8 byte order
+        self.sorted_array = np.array(self.sorted_ids, dtype=str)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def lookup(self, ids, default=-1):
+        ids = np.asarray(ids, dtype=str)
+        if len(self) == 0:
+            return np.full(ids.shape, default, dtype=np.int32)
+        pos = np.searchsorted(self.sorted_array, ids)
+        pos = np.minimum(pos, len(self) - 1)
+        found = self.sorted_array[pos] == ids
+        return np.where(found, self.indices[pos], default).astype(np.int32)
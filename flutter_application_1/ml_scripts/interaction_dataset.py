@@ -0,0 +1,219 @@
+# =============================================================================
+# INTERACTION_DATASET.PY - Compact Binary Columnar Interaction Files
+# =============================================================================
+# WHAT IS THIS FILE?
+# A tiny on-disk format for user-course interactions that can be written in
+# fixed-size chunks, so generating 500M rows never needs 500M rows in memory,
+# and read back with np.memmap, so loading 100M rows needs no parsing at all.
+#
+# LAYOUT (one directory per dataset):
+#   <dir>/meta.json        - row count, column dtypes, timestamp
+#   <dir>/user.bin         - int32 user index per row   (little-endian)
+#   <dir>/course.bin       - int32 course index per row (little-endian)
+#   <dir>/purchased.bin    - uint8 label per row (1 = bought, 0 = viewed)
+#   <dir>/users.vocab      - user ID strings, one per line (line N = index N)
+#   <dir>/courses.vocab    - course ID strings, one per line
+#
+# Each column is a raw array, so a chunk is appended with a single
+# ndarray.tofile() call and the file is exactly rows x itemsize bytes.
+#
+# SHARDED DATASETS (generate_data.py --shards N):
+#   <root>/manifest.json + <root>/users.vocab + <root>/courses.vocab
+#   <root>/shard-00000/, <root>/shard-00001/, ...  (columns + meta.json each)
+# Shards share the vocab files in the root directory.
+# =============================================================================
+
+import json
+import os
+
+import numpy as np
+
+FORMAT_NAME = 'interactions-columnar-v1'
+
+# Column name -> on-disk dtype (explicit little-endian so files are portable)
+COLUMNS = {
+    'user': np.dtype('<i4'),
+    'course': np.dtype('<i4'),
+    'purchased': np.dtype('u1'),
+}
+
+
+VOCAB_FILES = {
+    'user': 'users.vocab',
+    'course': 'courses.vocab',
+}
+
+
+def column_path(path, name):
+    return os.path.join(path, f'{name}.bin')
+
+
+# =============================================================================
+# VOCABULARY SIDE FILES
+# =============================================================================
+# The columns only hold integers; the strings live here, written once.
+# Example users.vocab:
+#   user_0
+#   user_1
+#   ...
+def write_vocab(path, name, ids):
+    with open(os.path.join(path, VOCAB_FILES[name]), 'w', encoding='utf-8') as f:
+        f.writelines(f'{i}\n' for i in ids)
+
+
+def read_vocab(path, name):
+    with open(os.path.join(path, VOCAB_FILES[name]), encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+class InteractionWriter:
+    """
+    Append-only writer for the columnar format.
+
+    Usage:
+        with InteractionWriter('data/interactions') as writer:
+            for user_idx, course_idx, purchased in chunks:
+                writer.append(user_idx, course_idx, purchased)
+
+    meta.json is written last, so a directory without it is an unfinished write.
+    """
+    def __init__(self, path, timestamp=None):
+        self.path = path
+        self.timestamp = timestamp
+        self.num_rows = 0
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self.files = {name: open(column_path(path, name), 'wb') for name in COLUMNS}
+
+    def append(self, user, course, purchased):
+        n = len(user)
+        if len(course) != n or len(purchased) != n:
+            raise ValueError('All columns in a chunk must have the same length')
+        for name, values in (('user', user), ('course', course), ('purchased', purchased)):
+            np.asarray(values).astype(COLUMNS[name], copy=False).tofile(self.files[name])
+        self.num_rows += n
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        meta = {
+            'format': FORMAT_NAME,
+            'num_rows': self.num_rows,
+            'columns': {name: dtype.str for name, dtype in COLUMNS.items()},
+            'timestamp': self.timestamp
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave no meta.json behind so the partial output is not mistaken for a finished one
+            for f in self.files.values():
+                f.close()
+        return False
+
+
+# =============================================================================
+# READING (memory-mapped)
+# =============================================================================
+# np.memmap maps the column files straight into memory: "loading" 100M rows
+# only reads meta.json, and pages are pulled in lazily as they are touched.
+class InteractionDataset:
+    """
+    Memory-mapped view of one columnar dataset directory.
+
+    Attributes:
+        user, course (int32 memmap), purchased (uint8 memmap)
+        user_vocab, course_vocab (list of ID strings, index = encoded value)
+        num_rows, timestamp
+    """
+    def __init__(self, path, vocab_path=None):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != FORMAT_NAME:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} dataset")
+
+        self.path = path
+        self.num_rows = meta['num_rows']
+        self.timestamp = meta.get('timestamp')
+        for name, dtype in meta['columns'].items():
+            setattr(self, name, open_column(path, name, np.dtype(dtype), self.num_rows))
+
+        vocab_path = vocab_path or path
+        self.user_vocab = read_vocab(vocab_path, 'user')
+        self.course_vocab = read_vocab(vocab_path, 'course')
+
+    def __len__(self):
+        return self.num_rows
+
+
+def open_column(path, name, dtype, num_rows):
+    # np.memmap refuses zero-length files, so empty columns become empty arrays
+    if num_rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(column_path(path, name), dtype=dtype, mode='r', shape=(num_rows,))
+
+
+def is_columnar_dataset(path):
+    """True for a dataset directory or a sharded root written in this format."""
+    if not os.path.isdir(path):
+        return False
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return True
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as f:
+        return json.load(f).get('format') == 'columnar'
+
+
+def open_interactions(path):
+    """
+    Open a dataset directory or a sharded root.
+
+    Returns a list of InteractionDataset (one per shard, or a single item).
+    """
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return [InteractionDataset(path)]
+
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != 'columnar':
+        raise ValueError(f"{path} does not contain columnar shards")
+
+    missing = [s['file'] for s in manifest['shards']
+               if not os.path.exists(os.path.join(path, s['file'], 'meta.json'))]
+    if missing:
+        raise ValueError(f"{path} is incomplete, missing shards: {', '.join(missing[:5])}")
+    return [InteractionDataset(os.path.join(path, s['file']), vocab_path=path) for s in manifest['shards']]
+
+
+def load_interaction_arrays(path):
+    """
+    Open `path` and return (user, course, purchased, user_vocab, course_vocab).
+
+    A single dataset comes back as zero-copy memmaps. A SHARDED dataset is
+    concatenated, i.e. every shard's columns are copied into RAM (9 bytes per
+    row) - fine for the in-memory array path, which holds all rows anyway.
+    To stay out of RAM, iterate over open_interactions(path) shard by shard
+    (each shard's columns are memmaps), as train_model.py --pipeline tfdata does.
+    """
+    datasets = open_interactions(path)
+    first = datasets[0]
+    if len(datasets) == 1:
+        return first.user, first.course, first.purchased, first.user_vocab, first.course_vocab
+    return (
+        np.concatenate([d.user for d in datasets]),
+        np.concatenate([d.course for d in datasets]),
+        np.concatenate([d.purchased for d in datasets]),
+        first.user_vocab,
+        first.course_vocab
+    )
@@ -0,0 +1,396 @@
+# =============================================================================
+# MODEL_COMPRESSION.PY - Pruning, Quantization-Aware Training and Reports
+# =============================================================================
+# WHAT IS THIS FILE?
+# Tools to ship a much SMALLER course embedding network, shared by
+# train_course_similarity.py and train_deep_learning_model.py.
+#
+# Post-training quantization (tf.lite.Optimize.DEFAULT) rounds the trained
+# weights to int8 after the fact, which costs some top-K quality. Here the
+# network is fine-tuned so it LEARNS to live with the compression:
+#
+# 1. MAGNITUDE PRUNING (MagnitudePruning callback)
+#    Every `frequency` steps, the smallest weights of each Dense kernel are
+#    set to zero, following a sparsity schedule (0% → target). The mask is
+#    re-applied after every step, so pruned weights stay zero while the rest
+#    of the network adapts. Exported with EXPERIMENTAL_SPARSITY, the zeros
+#    are stored in a compressed sparse format (and the int8 model shrinks
+#    further when gzipped for download). The sparse format has its own
+#    index overhead: it only beats the dense int8 model at high sparsity
+#    (~80% and up) - the report says when an export is NOT smaller.
+#
+# 2. QUANTIZATION-AWARE TRAINING (FakeQuantDense)
+#    During fine-tuning every Dense layer multiplies by its weights ROUNDED
+#    to int8 (per output channel, like TFLite does). Gradients pass straight
+#    through the rounding, so training pushes the float weights to values
+#    that survive quantization. The int8 export then loses far less.
+#    Only Dense layers of the network itself (and of nested models) are
+#    swapped: Dense layers living INSIDE a custom layer - the query/key/
+#    value/output projections of AttentionLayer - train in float and are
+#    quantized only at export, like plain post-training quantization.
+#
+# tensorflow_model_optimization is not used: its Keras wrappers do not work
+# with Keras 3, so both techniques are implemented directly here.
+#
+# Fine-tuning always runs in catalog mode (catalog_training.CatalogPairModel)
+# on a COPY of the network - the normally exported model is left untouched.
+#
+# OUTPUT (next to the regular model):
+#   course_similarity_model_sparse.tflite  - pruned, sparse int8 weights
+#   course_similarity_model_int8.tflite    - full int8 (float input/output)
+#   compression_report.json                - size, latency, top-K quality
+# =============================================================================
+
+import gzip
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from catalog_training import CatalogPairModel, make_index_dataset
+from retrieval_eval import top_k_neighbours
+
+SPARSE_TFLITE_NAME = 'course_similarity_model_sparse.tflite'
+INT8_TFLITE_NAME = 'course_similarity_model_int8.tflite'
+COMPRESSION_REPORT_NAME = 'compression_report.json'
+PRUNING_SCHEDULES = ('polynomial', 'constant')
+
+
+def add_compression_args(parser):
+    """The same compression flags for every similarity trainer."""
+    parser.add_argument('--prune-sparsity', type=float, default=0.0,
+                        help='fraction of Dense weights to prune while fine-tuning (0 = no pruning)')
+    parser.add_argument('--prune-schedule', choices=PRUNING_SCHEDULES, default='polynomial',
+                        help='how sparsity grows from 0 to --prune-sparsity')
+    parser.add_argument('--prune-frequency', type=int, default=100,
+                        help='recompute the pruning masks every N steps')
+    parser.add_argument('--qat', action='store_true',
+                        help='fine-tune with int8 fake-quantized weights (quantization-aware training)')
+    parser.add_argument('--compress-epochs', type=int, default=5,
+                        help='fine-tuning epochs for pruning/QAT')
+
+
+def compression_enabled(args):
+    return args.prune_sparsity > 0 or args.qat
+
+
+# =============================================================================
+# MAGNITUDE PRUNING
+# =============================================================================
+
+def scheduled_sparsity(step, target_sparsity, begin_step, end_step, schedule='polynomial', power=3):
+    """
+    Sparsity to reach at `step`.
+    - polynomial: ramps 0 → target between begin_step and end_step, fast at
+      first and gently at the end (target * (1 - (1 - progress)^3))
+    - constant: target from begin_step on
+    """
+    if step < begin_step:
+        return 0.0
+    if schedule == 'constant' or step >= end_step:
+        return target_sparsity
+    progress = (step - begin_step) / max(end_step - begin_step, 1)
+    return target_sparsity * (1.0 - (1.0 - progress) ** power)
+
+
+def prunable_kernels(network):
+    """All 2-D weight matrices (Dense kernels, including those inside custom layers)."""
+    return [v for v in network.trainable_weights if len(v.shape) == 2]
+
+
+def kernel_sparsity(network):
+    """Fraction of exactly-zero weights across all prunable kernels."""
+    kernels = [v.numpy() for v in prunable_kernels(network)]
+    return float(sum((k == 0).sum() for k in kernels) / sum(k.size for k in kernels))
+
+
+class MagnitudePruning(tf.keras.callbacks.Callback):
+    """
+    Zero out the smallest-magnitude weights of `network` during training.
+
+    Masks are recomputed every `frequency` steps from the schedule and
+    re-applied after every step; at the end of training the final target
+    sparsity is enforced exactly. The masks are tf.Variables next to the
+    kernels, so the per-step kernel * mask never leaves TensorFlow.
+    """
+    def __init__(self, network, target_sparsity, end_step, begin_step=0, frequency=100, schedule='polynomial'):
+        super().__init__()
+        if not 0.0 <= target_sparsity < 1.0:
+            raise ValueError('target_sparsity must be in [0, 1)')
+        if schedule not in PRUNING_SCHEDULES:
+            raise ValueError(f"schedule must be one of {', '.join(PRUNING_SCHEDULES)}")
+        self.kernels = prunable_kernels(network)
+        self.target_sparsity = target_sparsity
+        self.begin_step = begin_step
+        self.end_step = end_step
+        self.frequency = frequency
+        self.schedule = schedule
+        self.masks = [tf.Variable(tf.ones_like(kernel), trainable=False) for kernel in self.kernels]
+        self.masks_active = False
+        self.step = 0
+
+    def update_masks(self, sparsity):
+        # Only every `frequency` steps: the threshold needs a partial sort in NumPy
+        for kernel, mask in zip(self.kernels, self.masks):
+            magnitude = np.abs(kernel.numpy())
+            num_pruned = int(sparsity * magnitude.size)
+            if num_pruned == 0:
+                mask.assign(tf.ones_like(mask))
+                continue
+            threshold = np.partition(magnitude.ravel(), num_pruned - 1)[num_pruned - 1]
+            mask.assign((magnitude > threshold).astype(magnitude.dtype))
+        self.masks_active = True
+
+    def apply_masks(self):
+        for kernel, mask in zip(self.kernels, self.masks):
+            kernel.assign(kernel * mask)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+        if self.step >= self.begin_step and (self.step - self.begin_step) % self.frequency == 0:
+            self.update_masks(scheduled_sparsity(self.step, self.target_sparsity, self.begin_step,
+                                                 self.end_step, self.schedule))
+        if self.masks_active:
+            self.apply_masks()
+
+    def on_train_end(self, logs=None):
+        self.update_masks(self.target_sparsity)
+        self.apply_masks()
+
+
+# =============================================================================
+# QUANTIZATION-AWARE TRAINING
+# =============================================================================
+
+def fake_quantize_kernel(kernel, num_bits=8):
+    """
+    Round a (in, out) kernel to symmetric per-output-channel int8 and back.
+
+    Forward pass: the rounded weights. Backward pass: the identity
+    ("straight-through estimator"), so the float weights keep training.
+    """
+    max_level = 2 ** (num_bits - 1) - 1  # 127
+    scale = tf.maximum(tf.reduce_max(tf.abs(kernel), axis=0, keepdims=True), 1e-8) / max_level
+    quantized = tf.clip_by_value(tf.round(kernel / scale), -max_level, max_level) * scale
+    return kernel + tf.stop_gradient(quantized - kernel)
+
+
+@tf.keras.utils.register_keras_serializable(package='model_compression')
+class FakeQuantDense(tf.keras.layers.Dense):
+    """Dense layer that computes with int8-rounded weights (for QAT fine-tuning)."""
+    def call(self, inputs):
+        outputs = tf.matmul(inputs, fake_quantize_kernel(self.kernel))
+        if self.use_bias:
+            outputs = outputs + self.bias
+        if self.activation is not None:
+            outputs = self.activation(outputs)
+        return outputs
+
+
+def clone_network(network, quantize_aware=False):
+    """
+    Copy `network` with its weights. With quantize_aware=True, every top-level
+    Dense layer becomes a FakeQuantDense; with False, every FakeQuantDense
+    becomes a plain Dense again. The weights keep the same layout, so
+    get_weights()/set_weights() move freely between the copies.
+    """
+    def clone_layer(layer):
+        if isinstance(layer, tf.keras.layers.Dense):  # FakeQuantDense included
+            layer_class = FakeQuantDense if quantize_aware else tf.keras.layers.Dense
+            return layer_class.from_config(layer.get_config())
+        if not layer.weights:
+            return layer  # Stateless (ReLU, Dropout, Lambda...): safe to share
+        return layer.__class__.from_config(layer.get_config())
+
+    # recursive=True also clones models nested inside (e.g. a Sequential embedding network)
+    clone = tf.keras.models.clone_model(network, clone_function=clone_layer, recursive=True)
+    clone.set_weights(network.get_weights())
+    return clone
+
+
+# =============================================================================
+# FINE-TUNING
+# =============================================================================
+
+def finetune_compressed(embedding_network, course_features, pairs_c1, pairs_c2, labels, loss,
+                        epochs=5, batch_size=128, target_sparsity=0.0, schedule='polynomial',
+                        frequency=100, qat=False, noise_range=None, learning_rate=1e-4):
+    """
+    Fine-tune a copy of `embedding_network` with pruning and/or QAT.
+
+    Returns a plain (no FakeQuantDense) network ready for TFLite export.
+    """
+    network = clone_network(embedding_network, quantize_aware=qat)
+    model = CatalogPairModel(network, course_features, noise_range=noise_range)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate), loss=loss)
+
+    steps_per_epoch = int(np.ceil(len(labels) / batch_size))
+    callbacks = []
+    if target_sparsity > 0:
+        # Reach the target after ~70% of the steps, then let the rest recover
+        callbacks.append(MagnitudePruning(network, target_sparsity, end_step=int(0.7 * epochs * steps_per_epoch),
+                                          frequency=frequency, schedule=schedule))
+
+    model.fit(make_index_dataset(pairs_c1, pairs_c2, labels, batch_size, shuffle=True),
+              epochs=epochs, callbacks=callbacks, verbose=2)
+    return clone_network(network) if qat else network
+
+
+# =============================================================================
+# EXPORT & REPORT
+# =============================================================================
+
+def int8_converter(network, course_features):
+    """
+    Converter for a full-integer model calibrated on the catalog.
+
+    Only int8 builtin ops are allowed, so conversion fails instead of
+    silently leaving float ops behind; input/output stay float32.
+    """
+    def representative_dataset():
+        for row in course_features:
+            yield [row[None, :].astype(np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(network)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter
+
+
+def convert_sparse(network, course_features):
+    """
+    Full-integer weights stored in TFLite's sparse format (needs a pruned network).
+
+    Dynamic-range sparse int8 (DEFAULT + EXPERIMENTAL_SPARSITY without
+    calibration) does not load with the stock interpreter - the default
+    XNNPACK delegate fails on its FULLY_CONNECTED nodes - but the
+    calibrated full-integer version does.
+    """
+    converter = int8_converter(network, course_features)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT, tf.lite.Optimize.EXPERIMENTAL_SPARSITY]
+    return converter.convert()
+
+
+def convert_int8(network, course_features):
+    """Full-integer model calibrated on the catalog; input/output stay float32."""
+    return int8_converter(network, course_features).convert()
+
+
+def tflite_embeddings(tflite_model, course_features):
+    """Embed every course with one single-row invoke, as the app does."""
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    rows = []
+    for row in course_features:
+        interpreter.set_tensor(input_index, row[None, :].astype(np.float32))
+        interpreter.invoke()
+        rows.append(interpreter.get_tensor(output_index)[0].copy())
+    return np.array(rows)
+
+
+def tflite_latency_ms(tflite_model, course_features, runs=200):
+    """Median time of one single-course invoke, like the app does on device."""
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    timings = []
+    for i in range(runs):
+        interpreter.set_tensor(input_index, course_features[i % len(course_features)][None, :])
+        start = time.perf_counter()
+        interpreter.invoke()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def top_k_overlap(reference_embeddings, embeddings, k=5):
+    """Average fraction of each course's top-k that both embedding sets agree on."""
+    reference, _ = top_k_neighbours(reference_embeddings, k)
+    other, _ = top_k_neighbours(embeddings, k)
+    shared = (reference[:, :, None] == other[:, None, :]).any(axis=2).sum(axis=1)
+    return float(shared.mean() / k)
+
+
+def pair_mae(embeddings, pairs_c1, pairs_c2, labels):
+    """Mean |sigmoid(dot) - label| over the given pairs (the training objective's view)."""
+    similarity = np.sum(embeddings[pairs_c1] * embeddings[pairs_c2], axis=1)
+    return float(np.mean(np.abs(1.0 / (1.0 + np.exp(-similarity)) - labels)))
+
+
+def compression_report(variants, reference_embeddings, course_features, pairs_c1, pairs_c2, labels,
+                       k=5, report_path=None):
+    """
+    variants: {name: tflite bytes}. Each is compared with the uncompressed
+    Keras embeddings (top-k overlap) and the labels (pair MAE); vs_baseline
+    is its file size relative to the 'baseline' variant (the shipped model).
+    """
+    baseline_size = len(variants['baseline']) if 'baseline' in variants else None
+    rows = {}
+    for name, tflite_model in variants.items():
+        embeddings = tflite_embeddings(tflite_model, course_features)
+        rows[name] = {
+            'size_kb': round(len(tflite_model) / 1024, 2),
+            'vs_baseline': round(len(tflite_model) / baseline_size, 3) if baseline_size else None,
+            'gzip_kb': round(len(gzip.compress(tflite_model)) / 1024, 2),
+            'latency_ms': round(tflite_latency_ms(tflite_model, course_features), 4),
+            f'top{k}_overlap': round(top_k_overlap(reference_embeddings, embeddings, k), 4),
+            'pair_mae': round(pair_mae(embeddings, pairs_c1, pairs_c2, labels), 4)
+        }
+
+    print(f"   {'variant':<10} {'KB':>9} {'vs base':>8} {'gzip KB':>9} {'ms/course':>10} "
+          f"{f'top-{k}':>7} {'pair MAE':>9}")
+    for name, row in rows.items():
+        ratio = f"{row['vs_baseline']:.2f}x" if row['vs_baseline'] is not None else '-'
+        print(f"   {name:<10} {row['size_kb']:>9.2f} {ratio:>8} {row['gzip_kb']:>9.2f} {row['latency_ms']:>10.4f} "
+              f"{row[f'top{k}_overlap'] * 100:>6.1f}% {row['pair_mae']:>9.4f}")
+
+    # Say it plainly when a compressed export does not pay for itself
+    for name in ('sparse', 'int8'):
+        if name in rows and rows[name]['vs_baseline'] is not None and rows[name]['vs_baseline'] >= 1.0:
+            print(f"   NOTE: the {name} model is NOT smaller than the baseline "
+                  f"({rows[name]['size_kb']:.1f} KB vs {rows['baseline']['size_kb']:.1f} KB)"
+                  + (" - sparse storage needs higher --prune-sparsity to pay off." if name == 'sparse'
+                     else " - its gain is integer-only execution, not file size."))
+
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"   Saved compression report to {report_path}")
+    return rows
+
+
+def compress_and_export(embedding_network, baseline_tflite, course_features, pairs_c1, pairs_c2, labels,
+                        loss, output_dir, epochs=5, batch_size=128, target_sparsity=0.5,
+                        schedule='polynomial', frequency=100, qat=False, noise_range=None,
+                        eval_pairs=20000, seed=0):
+    """Fine-tune a compressed copy, export sparse + int8 models and write the report."""
+    compressed = finetune_compressed(
+        embedding_network, course_features, pairs_c1, pairs_c2, labels, loss,
+        epochs=epochs, batch_size=batch_size, target_sparsity=target_sparsity,
+        schedule=schedule, frequency=frequency, qat=qat, noise_range=noise_range
+    )
+    print(f"   Kernel sparsity after fine-tuning: {kernel_sparsity(compressed) * 100:.1f}%")
+
+    # float32 = the uncompressed network without any TFLite optimization
+    variants = {'baseline': baseline_tflite,
+                'float32': tf.lite.TFLiteConverter.from_keras_model(embedding_network).convert()}
+    if target_sparsity > 0:
+        variants['sparse'] = convert_sparse(compressed, course_features)
+    variants['int8'] = convert_int8(compressed, course_features)
+
+    for name, filename in (('sparse', SPARSE_TFLITE_NAME), ('int8', INT8_TFLITE_NAME)):
+        if name in variants:
+            path = os.path.join(output_dir, filename)
+            with open(path, 'wb') as f:
+                f.write(variants[name])
+            print(f"   Saved {name} model to {path}")
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(labels), size=min(eval_pairs, len(labels)), replace=False)
+    reference = embedding_network.predict(course_features, verbose=0)
+    return compression_report(variants, reference, course_features, pairs_c1[sample], pairs_c2[sample],
+                              labels[sample], report_path=os.path.join(output_dir, COMPRESSION_REPORT_NAME))
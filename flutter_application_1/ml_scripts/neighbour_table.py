@@ -0,0 +1,83 @@
+# =============================================================================
+# NEIGHBOUR_TABLE.PY - Precomputed "Related Courses" for the App
+# =============================================================================
+# WHAT IS THIS FILE?
+# Without it, the app compares the opened course's embedding with EVERY other
+# course's embedding (a cosine similarity loop in recommendation_service.dart)
+# each time a course page opens. But the catalog embeddings only change when
+# the model is retrained - so the answer can be computed once, here.
+#
+# WHAT IT WRITES (assets/model/course_similarity_neighbours.json):
+#   {
+#     "k": 10,
+#     "metric": "cosine",
+#     "course_ids": ["javascript_fundamentals", "react_complete", ...],
+#     "neighbours": [[1, 5, 3, ...], ...],   # row i = top-k of course_ids[i],
+#     "scores":     [[0.8921, ...], ...]     #   as indices into course_ids
+#   }
+# Indices instead of repeated ID strings and 4-decimal scores keep the file
+# small; the app turns it into a map once and every lookup is a map read.
+#
+# HOW:
+# All courses are scored against all courses as blocked matrix products with
+# argpartition top-k (retrieval_eval.top_k_neighbours), the same ranking the
+# training scripts evaluate - cosine, because the app ranks by cosine.
+#
+# Both training scripts write it next to course_similarity_encoders.json.
+# To rebuild it from the shipped embeddings without retraining:
+#   python neighbour_table.py [--k 10]
+# =============================================================================
+
+import argparse
+import json
+
+import numpy as np
+
+from retrieval_eval import top_k_neighbours
+
+NEIGHBOURS_PATH = '../assets/model/course_similarity_neighbours.json'
+ENCODERS_PATH = '../assets/model/course_similarity_encoders.json'
+DEFAULT_K = 10
+
+
+def build_neighbour_table(embeddings, course_ids, k=DEFAULT_K):
+    """Top-k cosine neighbours (indices into course_ids) and scores of every course."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    neighbours, scores = top_k_neighbours(embeddings, k)
+    return {
+        'k': int(neighbours.shape[1]),
+        'metric': 'cosine',
+        'course_ids': list(course_ids),
+        'neighbours': neighbours.tolist(),
+        'scores': np.round(scores.astype(np.float64), 4).tolist(),
+    }
+
+
+def export_neighbour_table(embeddings, course_ids, path=NEIGHBOURS_PATH, k=DEFAULT_K):
+    table = build_neighbour_table(embeddings, course_ids, k=k)
+    with open(path, 'w') as f:
+        json.dump(table, f, separators=(',', ':'))
+    return table
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Precompute every course\'s top-k related courses for the app.')
+    parser.add_argument('--encoders', default=ENCODERS_PATH,
+                        help='course_similarity_encoders.json with the exported course embeddings')
+    parser.add_argument('--output', default=NEIGHBOURS_PATH)
+    parser.add_argument('--k', type=int, default=DEFAULT_K)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.encoders) as f:
+        courses = json.load(f)['courses']
+    embeddings = np.array([c['embedding'] for c in courses], dtype=np.float32)
+    table = export_neighbour_table(embeddings, [c['id'] for c in courses], path=args.output, k=args.k)
+    print(f"Saved top-{table['k']} neighbours of {len(courses)} courses to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+# =============================================================================
+# RETRIEVAL_EVAL.PY - How Good Are the Course Embeddings, Over the WHOLE Catalog?
+# =============================================================================
+# WHAT IS THIS FILE?
+# Printing the top 5 neighbours of 3 hand-picked courses shows whether a model
+# is roughly sane, but not whether a change made it better or worse. This
+# file scores EVERY course against EVERY other course and compares the
+# top-K neighbours with the 'related' lists in COURSES (the ground truth):
+#
+#   recall@K - what fraction of a course's related courses are in its top K
+#   NDCG@K   - like recall, but a related course ranked 1st counts more than
+#              one ranked Kth (each hit is worth 1 / log2(rank + 1))
+#   MAP@K    - mean average precision: precision at each rank where a related
+#              course appears, averaged (so early hits matter most)
+#
+# Averages are over courses that HAVE related courses; the course itself is
+# never counted as its own neighbour.
+#
+# HOW IT STAYS FAST:
+#   1. scores for a BLOCK of query courses = one matrix product
+#        (block x dim) @ (dim x catalog) → (block x catalog)
+#      blocks are sized to fit a memory budget, so a 100k catalog never
+#      needs the 100k x 100k score matrix (40 GB) at once
+#   2. np.argpartition finds the K best columns per row in O(catalog)
+#      instead of sorting the whole row; only those K are then sorted
+#   3. hits (is neighbour j related to query i?) for all queries at once:
+#      every (i, j) pair becomes one int64 key i * catalog + j and is looked
+#      up in the sorted keys of the 'related' edges (np.isin)
+#
+# Every query still ranks against the full catalog. For very large catalogs
+# on a small CPU, max_queries evaluates a random sample of queries (e.g. 2000
+# of 100k), which gives the same averages up to sampling noise, in seconds.
+#
+# USAGE:
+#   from retrieval_eval import evaluate_retrieval, print_retrieval_report
+#   report = evaluate_retrieval(all_embeddings, related_src, related_dst)
+#   print_retrieval_report(report)
+#
+#   python retrieval_eval.py                      # the shipped embeddings
+#   python retrieval_eval.py --catalog mlp --encoders <train_course_similarity output>
+#   python retrieval_eval.py --catalog-size 100000 --max-queries 2000
+#
+# The 'related' ground truth comes from the catalog of the script that wrote
+# the encoders file: train_deep_learning_model.py (deep, the shipped one - its
+# encoders file has a 'model_type' key) or train_course_similarity.py (mlp).
+# --catalog auto picks it from the file; a shipped course missing from the
+# ground truth is an error, never silently dropped.
+# =============================================================================
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+DEFAULT_KS = (5, 10, 20)
+BLOCK_MEMORY_MB = 256
+ENCODERS_PATH = '../assets/model/course_similarity_encoders.json'
+
+
+def related_edges(courses, course_to_idx=None):
+    """
+    The 'related' lists of `courses` as edges (src, dst) of course indices.
+
+    Unknown IDs, self-references and duplicates are dropped. Both training
+    scripts build their 'related' labels from these edges too, so training
+    and evaluation always agree on what counts as related.
+    """
+    if course_to_idx is None:
+        course_to_idx = {c['id']: i for i, c in enumerate(courses)}
+    edges = {
+        (i, course_to_idx[other_id])
+        for i, course in enumerate(courses)
+        for other_id in course.get('related', [])
+        if other_id in course_to_idx and course_to_idx[other_id] != i
+    }
+    if not edges:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    edges = np.array(sorted(edges), dtype=np.int64)
+    return edges[:, 0], edges[:, 1]
+
+
+def default_block_size(num_items, memory_mb=BLOCK_MEMORY_MB):
+    """Query rows per block: float32 scores + int64 argpartition indices ≈ 12 bytes per cell."""
+    return max(1, min(num_items, int(memory_mb * 1024 ** 2 // (12 * num_items))))
+
+
+def top_k_neighbours(embeddings, k, queries=None, block_size=None):
+    """
+    The k highest dot-product neighbours of each query course (itself excluded).
+
+    Returns (indices, scores), both (num_queries, k), best first.
+    queries defaults to every course.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    num_items = embeddings.shape[0]
+    queries = np.arange(num_items) if queries is None else np.asarray(queries)
+    k = min(k, num_items - 1)
+    block_size = block_size or default_block_size(num_items)
+
+    top_indices = np.empty((len(queries), k), dtype=np.int64)
+    top_scores = np.empty((len(queries), k), dtype=np.float32)
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        rows = np.arange(len(block))
+        scores = embeddings[block] @ embeddings.T
+        scores[rows, block] = -np.inf  # a course is not its own neighbour
+
+        # Unordered top k per row, then sort just those k
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_score = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_score, axis=1, kind='stable')
+        top_indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        top_scores[start:start + len(block)] = np.take_along_axis(top_score, order, axis=1)
+    return top_indices, top_scores
+
+
+def ranking_metrics(top_indices, queries, related_src, related_dst, num_items, ks=DEFAULT_KS):
+    """
+    recall@K, NDCG@K and MAP@K of ranked neighbour lists against 'related' edges.
+
+    top_indices[q] is the ranked neighbour list of course queries[q]; queries
+    without any related course are left out of the averages.
+    """
+    queries = np.asarray(queries, dtype=np.int64)
+    num_relevant = np.bincount(related_src, minlength=num_items)[queries]
+    evaluated = num_relevant > 0
+    top_indices, queries, num_relevant = top_indices[evaluated], queries[evaluated], num_relevant[evaluated]
+
+    # hits[q, r] = is the rank-r neighbour of query q one of its related courses?
+    related_keys = np.unique(related_src * num_items + related_dst)
+    hits = np.isin(queries[:, None] * num_items + top_indices, related_keys)
+
+    depth = hits.shape[1]
+    discounts = 1.0 / np.log2(np.arange(depth) + 2)
+    cumulative_hits = np.cumsum(hits, axis=1)
+    precision_at_rank = cumulative_hits / np.arange(1, depth + 1)
+
+    metrics = {}
+    for k in ks:
+        k_eff = min(k, depth)
+        ideal_hits = np.minimum(num_relevant, k_eff)
+        dcg = (hits[:, :k_eff] * discounts[:k_eff]).sum(axis=1)
+        idcg = np.cumsum(discounts[:k_eff])[ideal_hits - 1]
+        average_precision = (precision_at_rank[:, :k_eff] * hits[:, :k_eff]).sum(axis=1) / ideal_hits
+
+        metrics[f'recall@{k}'] = float(np.mean(cumulative_hits[:, k_eff - 1] / num_relevant)) if len(hits) else None
+        metrics[f'ndcg@{k}'] = float(np.mean(dcg / idcg)) if len(hits) else None
+        metrics[f'map@{k}'] = float(np.mean(average_precision)) if len(hits) else None
+    metrics['evaluated_queries'] = int(evaluated.sum())
+    return metrics
+
+
+def evaluate_retrieval(embeddings, related_src, related_dst, ks=DEFAULT_KS, max_queries=None,
+                       block_size=None, seed=0):
+    """
+    Rank the whole catalog for every course (or max_queries random courses)
+    and score the top max(ks) against the 'related' edges.
+    """
+    start_time = time.perf_counter()
+    num_items = len(embeddings)
+    queries = np.arange(num_items)
+    if max_queries is not None and max_queries < num_items:
+        queries = np.sort(np.random.default_rng(seed).choice(num_items, max_queries, replace=False))
+
+    top_indices, _ = top_k_neighbours(embeddings, max(ks), queries=queries, block_size=block_size)
+    report = {
+        'num_items': num_items,
+        'num_queries': len(queries),
+        **ranking_metrics(top_indices, queries, related_src, related_dst, num_items, ks=ks),
+        'seconds': round(time.perf_counter() - start_time, 3),
+    }
+    return report
+
+
+def load_catalog(name):
+    """The COURSES list (with 'related' lists) of the 'deep' or 'mlp' trainer."""
+    if name == 'deep':
+        from train_deep_learning_model import COURSES
+    else:
+        from train_course_similarity import COURSES
+    return COURSES
+
+
+def print_retrieval_report(report, ks=DEFAULT_KS):
+    sampled = (f" ({report['num_queries']:,} sampled queries)"
+               if report['num_queries'] < report['num_items'] else '')
+    print(f"   Retrieval quality over {report['num_items']:,} courses{sampled}, "
+          f"{report['evaluated_queries']:,} with related courses, {report['seconds']:.2f}s:")
+    print(f"   {'K':>6} {'recall':>8} {'NDCG':>8} {'MAP':>8}")
+    for k in ks:
+        if report.get(f'recall@{k}') is None:
+            continue
+        print(f"   {k:>6} {report[f'recall@{k}']:>8.4f} {report[f'ndcg@{k}']:>8.4f} {report[f'map@{k}']:>8.4f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Score course embeddings against the related-course lists.')
+    parser.add_argument('--encoders', default=ENCODERS_PATH,
+                        help='course_similarity_encoders.json with a 64-number embedding per course')
+    parser.add_argument('--catalog', choices=['auto', 'deep', 'mlp'], default='auto',
+                        help='ground-truth catalog: deep = train_deep_learning_model.py, '
+                             'mlp = train_course_similarity.py (auto: the one that wrote --encoders)')
+    parser.add_argument('--ks', type=int, nargs='+', default=list(DEFAULT_KS))
+    parser.add_argument('--max-queries', type=int, default=None,
+                        help='evaluate this many random query courses (each still ranks the full catalog)')
+    parser.add_argument('--block-size', type=int, default=None,
+                        help=f'query rows per matrix product (default: fit {BLOCK_MEMORY_MB} MB)')
+    parser.add_argument('--catalog-size', type=int, default=None,
+                        help='speed check: replicate the catalog (and jittered embeddings) to this many courses')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.encoders) as f:
+        encoders = json.load(f)
+    shipped = {c['id']: c['embedding'] for c in encoders['courses']}
+
+    # Only train_deep_learning_model.py writes 'model_type'
+    catalog = args.catalog if args.catalog != 'auto' else ('deep' if 'model_type' in encoders else 'mlp')
+    known = {c['id']: c for c in load_catalog(catalog)}
+    missing = [course_id for course_id in shipped if course_id not in known]
+    if missing:
+        raise SystemExit(f"{len(missing)} of {len(shipped)} courses in {args.encoders} are not in the "
+                         f"'{catalog}' catalog (e.g. {', '.join(missing[:3])}) - try --catalog "
+                         f"{'mlp' if catalog == 'deep' else 'deep'}")
+    courses = [known[course_id] for course_id in shipped]
+    print(f"Ground truth: '{catalog}' catalog, {len(courses)} courses")
+    embeddings = np.array([shipped[c['id']] for c in courses], dtype=np.float32)
+
+    if args.catalog_size:
+        # Copy r of course x relates to copy r of x's related courses; the
+        # jitter keeps copies from tying exactly, but they still crowd each
+        # other's top K - use this for timing, not for quality.
+        from benchmark_suite import replicate_catalog
+        base = len(courses)
+        courses = replicate_catalog(courses, args.catalog_size)
+        rng = np.random.default_rng(0)
+        embeddings = embeddings[np.arange(args.catalog_size) % base]
+        embeddings = embeddings + rng.normal(0, 0.01, embeddings.shape).astype(np.float32)
+
+    related_src, related_dst = related_edges(courses)
+    report = evaluate_retrieval(embeddings, related_src, related_dst, ks=tuple(args.ks),
+                                max_queries=args.max_queries, block_size=args.block_size)
+    print_retrieval_report(report, ks=tuple(args.ks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# =============================================================================
+# TFLITE_BENCHMARK.PY - Off-Device Inference Latency of the Shipped Models
+# =============================================================================
+# WHAT IS THIS FILE?
+# Measures what the app pays per inference for every .tflite model in
+# assets/model, with the same tf.lite.Interpreter the exports are checked
+# with - so a slower export is caught here instead of after release.
+#
+# FOR EVERY MODEL x SIGNATURE x BATCH SIZE x num_threads:
+#   1. create an Interpreter(num_threads=...), resize the inputs to the batch
+#   2. warm up (first invokes allocate buffers and pick kernels)
+#   3. time --runs signature calls (copy inputs in, invoke, copy outputs
+#      out - what the app pays per call) → p50 / p95 / p99 / mean latency,
+#      latency per sample and samples/sec
+#   4. memory: RSS growth of this process for the interpreter, and the
+#      total size of the tensor buffers of the main subgraph
+#
+# VARIANTS SIDE BY SIDE:
+# recommendation_model*.tflite (float32, _dynamic, _float16, _int8 from
+# train_model.py --quantize) and course_similarity_model*.tflite (_sparse,
+# _int8 from model_compression.py) are grouped into families; each variant's
+# p50 is shown relative to the family's base model.
+#
+# INPUT VALUES:
+# Latency does not depend on WHICH user or course is looked up, so ID inputs
+# (names ending in _input/_index with one value per row) are all zeros -
+# always a valid index - and feature inputs are uniform [0, 1) noise.
+#
+# REGRESSIONS:
+# Results are keyed like benchmark_suite.py results, so --save-baseline /
+# --fail-on-regression compare p50 latencies against a stored baseline.
+# =============================================================================
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from benchmark_suite import compare_to_baseline, environment_info
+
+MODEL_DIR = '../assets/model'
+MODEL_FAMILIES = ('recommendation_model', 'course_similarity_model')
+REPORT_PATH = 'benchmarks/tflite_latency.json'
+BASELINE_PATH = 'benchmarks/tflite_latency_baseline.json'
+PERCENTILES = (50, 95, 99)
+
+
+def current_rss_mb():
+    """Resident memory of this process right now (Linux; None elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def find_models(model_dir):
+    """{family: [paths]} for every shipped model and its exported variants (base model first)."""
+    families = {}
+    for family in MODEL_FAMILIES:
+        paths = sorted(glob.glob(os.path.join(model_dir, f'{family}*.tflite')))
+        base = os.path.join(model_dir, f'{family}.tflite')
+        if paths:
+            families[family] = sorted(paths, key=lambda p: p != base)
+    return families
+
+
+def is_id_input(name, detail):
+    return name.endswith(('_input', '_index')) and (len(detail['shape']) == 1 or detail['shape'][-1] == 1)
+
+
+def make_inputs(input_details, batch_size, rng):
+    """Input arrays for one signature at the given batch size (see INPUT VALUES above)."""
+    inputs = {}
+    for name, detail in input_details.items():
+        shape = [batch_size, *detail['shape_signature'][1:]]
+        if is_id_input(name, detail):
+            inputs[name] = np.zeros(shape, dtype=detail['dtype'])
+        elif np.issubdtype(detail['dtype'], np.integer):
+            inputs[name] = rng.integers(0, 2, shape).astype(detail['dtype'])
+        else:
+            inputs[name] = rng.random(shape, dtype=np.float32).astype(detail['dtype'])
+    return inputs
+
+
+def tensor_bytes(interpreter):
+    """Total size of the main subgraph's tensor buffers (weights + activations) after allocation."""
+    total = 0
+    for detail in interpreter.get_tensor_details():
+        total += int(np.prod(detail['shape'])) * np.dtype(detail['dtype']).itemsize
+    return total
+
+
+def measure(model_path, signature, batch_size, num_threads, warmup, runs, seed=0):
+    """
+    Latency of one signature call for one configuration, or None when the
+    model has a fixed batch size of 1 and batch_size > 1.
+
+    The first call resizes and allocates; later calls with the same shapes
+    only copy inputs in, invoke and copy outputs out.
+    """
+    rss_before = current_rss_mb()
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+    runner = interpreter.get_signature_runner(signature)
+    input_details = runner.get_input_details()
+    if batch_size > 1 and any(d['shape_signature'][0] != -1 for d in input_details.values()):
+        return None
+
+    inputs = make_inputs(input_details, batch_size, np.random.default_rng(seed))
+    for _ in range(warmup):
+        runner(**inputs)
+    timings = np.empty(runs)
+    for i in range(runs):
+        start = time.perf_counter()
+        runner(**inputs)
+        timings[i] = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    timings_ms = timings * 1000
+    p50 = float(np.percentile(timings_ms, 50))
+    return {
+        'status': 'ok',
+        'model': os.path.basename(model_path),
+        'signature': signature,
+        'batch_size': batch_size,
+        'num_threads': num_threads,
+        'median_seconds': p50 / 1000,  # for benchmark_suite.compare_to_baseline
+        'latency_ms': {
+            **{f'p{p}': round(float(np.percentile(timings_ms, p)), 4) for p in PERCENTILES},
+            'mean': round(float(timings_ms.mean()), 4),
+            'min': round(float(timings_ms.min()), 4),
+        },
+        'ms_per_sample': round(p50 / batch_size, 4),
+        'samples_per_second': round(batch_size / (p50 / 1000), 1),
+        'rss_delta_mb': round(rss_after - rss_before, 2) if rss_before is not None else None,
+        'tensor_mb': round(tensor_bytes(interpreter) / 1024 ** 2, 3),
+        'model_kb': round(os.path.getsize(model_path) / 1024, 1),
+    }
+
+
+def result_key(result):
+    return (f"{result['model']}[{result['signature']},batch={result['batch_size']},"
+            f"threads={result['num_threads']}]")
+
+
+def print_table(results):
+    header = (f"{'model':<42} {'signature':<20} {'batch':>5} {'thr':>3} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'ms/sample':>10} {'RSS +MB':>8} {'KB':>7} {'vs base':>8}")
+    print(header)
+    print('-' * len(header))
+    for r in results.values():
+        rss = f"{r['rss_delta_mb']:.1f}" if r['rss_delta_mb'] is not None else '-'
+        relative = f"{r['vs_base']:.2f}x" if 'vs_base' in r else ''
+        verdict = f"  {r['verdict']}" if r.get('verdict') not in (None, 'ok', 'new') else ''
+        print(f"{r['model']:<42} {r['signature']:<20} {r['batch_size']:>5} {r['num_threads']:>3} "
+              f"{r['latency_ms']['p50']:>9.3f} {r['latency_ms']['p95']:>9.3f} {r['latency_ms']['p99']:>9.3f} "
+              f"{r['ms_per_sample']:>10.4f} {rss:>8} {r['model_kb']:>7.1f} {relative:>8}{verdict}")
+
+
+def add_variant_ratios(results, families):
+    """vs_base: each variant's p50 divided by its family base model's p50 (same signature/batch/threads)."""
+    base_of = {os.path.basename(p): os.path.basename(paths[0]) for paths in families.values() for p in paths}
+    by_key = {(r['model'], r['signature'], r['batch_size'], r['num_threads']): r for r in results.values()}
+    for (model, signature, batch, threads), r in by_key.items():
+        base = by_key.get((base_of.get(model), signature, batch, threads))
+        if base is not None and base is not r:
+            r['vs_base'] = round(r['median_seconds'] / base['median_seconds'], 3)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure TFLite inference latency of the exported models.')
+    parser.add_argument('models', nargs='*',
+                        help=f'.tflite files (default: every {"/".join(MODEL_FAMILIES)}*.tflite in --model-dir)')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--signatures', nargs='+', default=None,
+                        help='signature keys to measure (default: all of each model)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--output', default=REPORT_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='flag a configuration whose p50 is this much slower than the baseline')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.models:
+        families = {os.path.basename(p): [p] for p in args.models}
+    else:
+        families = find_models(args.model_dir)
+    if not families:
+        raise SystemExit(f'No .tflite models found in {args.model_dir}')
+
+    print("=" * 70)
+    print("TFLITE INFERENCE LATENCY")
+    print("=" * 70)
+    results = {}
+    for paths in families.values():
+        for path in paths:
+            signatures = list(tf.lite.Interpreter(model_path=path).get_signature_list())
+            for signature in signatures:
+                if args.signatures and signature not in args.signatures:
+                    continue
+                for batch_size in args.batch_sizes:
+                    for num_threads in args.threads:
+                        result = measure(path, signature, batch_size, num_threads, args.warmup, args.runs)
+                        if result is not None:
+                            results[result_key(result)] = result
+    add_variant_ratios(results, families)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        print(f"\nCompared against {args.baseline} (threshold {args.threshold:.0%})")
+    print()
+    print_table(results)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment_info(), 'results': results}, f, indent=2)
+    print(f"\nSaved report to {args.output}")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} latency regression(s): {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,16 +12,31 @@
 #
 # This is an Embedding-Based MLP for course-to-course recommendations.
 #
+# USAGE (from ml_scripts/):
+#   python train_course_similarity.py                        # copy features per pair
+#   python train_course_similarity.py --input-mode indices   # gather features per batch
+#   python train_course_similarity.py --input-mode catalog   # embed each course once per step
+#   python train_course_similarity.py --compare-speed        # time per-pair vs catalog steps
+#   python train_course_similarity.py --prune-sparsity 0.5 --qat   # + sparse/int8 exports
+#
 # OUTPUT:
 # - assets/model/course_similarity_model.tflite
 # - assets/model/course_similarity_encoders.json
+# - assets/model/course_similarity_neighbours.json (top-10 related courses per course)
 # =============================================================================
 
 import tensorflow as tf
 import numpy as np
+import argparse
 import json
 import os
 
+from catalog_training import CatalogPairModel, compare_training_speed, make_index_dataset
+from model_compression import add_compression_args, compress_and_export, compression_enabled
+from neighbour_table import NEIGHBOURS_PATH, export_neighbour_table
+from retrieval_eval import evaluate_retrieval, print_retrieval_report, related_edges, top_k_neighbours
+from training_metrics import TrainingMetrics, add_metrics_args
+
 # =============================================================================
 # COURSE DATA & KNOWLEDGE GRAPH
 # =============================================================================
@@ -478,60 +493,92 @@ def encode_course_features(course, encoders):
     return np.concatenate([category_vec, tag_vec])
 
 
-def create_training_data(courses, encoders):
+def pair_label_block(course_features, num_categories, related_src, related_dst, start, stop):
+    """
+    Similarity labels for rows [start, stop) against the WHOLE catalog.
+    
+    Instead of comparing pairs one by one, everything is an array operation:
+    - shared tags    = multi-hot(tags) · multi-hot(tags)ᵀ   (count per pair)
+    - same category  = category index equality (the same as one-hot · one-hotᵀ,
+                       without the matrix product)
+    - related        = adjacency matrix built from the 'related' edges
+    
+    Returns a (stop - start, num_courses) float32 matrix, same rules as before.
+    """
+    num_courses = course_features.shape[0]
+    category_idx = np.argmax(course_features[:, :num_categories], axis=1)
+    tags = course_features[:, num_categories:]
+    
+    # 0 shared tags → 0.0, 1 → 0.2, 2+ → 0.4
+    common_tags = np.minimum(np.rint(tags[start:stop] @ tags.T), 2).astype(np.intp)
+    labels = np.array([0.0, 0.2, 0.4], dtype=np.float32)[common_tags]
+    
+    # Same category overrides tag overlap
+    labels[category_idx[start:stop, None] == category_idx[None, :]] = 0.6
+    
+    # Directly related overrides everything
+    in_block = (related_src >= start) & (related_src < stop)
+    labels[related_src[in_block] - start, related_dst[in_block]] = 1.0
+    return labels
+
+
+def iter_training_pair_blocks(course_features, num_categories, related_src, related_dst, block_size=1024):
+    """
+    Yield (pairs_course1, pairs_course2, labels) one block of rows at a time.
+    
+    Memory per block is block_size x num_courses, so catalogs far too large
+    for a dense C x C matrix can still be labelled (and streamed to disk or
+    straight into training) block by block.
+    """
+    num_courses = course_features.shape[0]
+    for start in range(0, num_courses, block_size):
+        stop = min(start + block_size, num_courses)
+        labels = pair_label_block(course_features, num_categories, related_src, related_dst, start, stop)
+        
+        # Drop the diagonal (course vs itself): row k of the block skips column start + k
+        rows = np.arange(start, stop, dtype=np.int32)
+        pairs_course1 = np.repeat(rows, num_courses - 1)
+        pairs_course2 = np.tile(np.arange(num_courses - 1, dtype=np.int32), stop - start)
+        pairs_course2 += pairs_course2 >= pairs_course1
+        off_diagonal = np.ones(labels.shape, dtype=bool)
+        off_diagonal[np.arange(stop - start), rows] = False
+        yield pairs_course1, pairs_course2, labels[off_diagonal]
+
+
+def create_training_data(courses, encoders, block_size=None):
     """
     Create training pairs from course relationships.
     
     For each pair of courses (A, B), we assign a similarity score:
-    - 1.0 = They are in each other's 'related' list (most similar)
+    - 1.0 = B is in A's 'related' list (most similar)
     - 0.6 = Same category but not directly related
     - 0.4 = Different category but share 2+ tags
     - 0.2 = Different category but share 1 tag
     - 0.0 = No relationship at all
+    
+    All C x (C - 1) labels come from a few matrix operations (see
+    pair_label_block). Pass block_size to build them in row blocks instead of
+    one dense C x C matrix. Pairs come out in the same order as the old
+    double loop: row by row, skipping the course itself.
     """
     # First, encode all courses into feature vectors
-    course_features = []
-    for course in courses:
-        features = encode_course_features(course, encoders)
-        course_features.append(features)
-    
-    course_features = np.array(course_features, dtype=np.float32)
-    
-    # Create pairs: (course1_idx, course2_idx, similarity_score)
-    pairs_course1 = []
-    pairs_course2 = []
-    labels = []
-    
-    for i, course in enumerate(courses):
-        for j, other_course in enumerate(courses):
-            if i == j:
-                continue  # Skip comparing course to itself
-            
-            pairs_course1.append(i)
-            pairs_course2.append(j)
-            
-            # Determine similarity score based on relationship
-            if other_course['id'] in course.get('related', []):
-                # Directly related courses (in each other's 'related' list)
-                labels.append(1.0)
-            elif other_course['category'] == course['category']:
-                # Same category but not directly related
-                labels.append(0.6)
-            else:
-                # Check for tag overlap
-                common_tags = set(course['tags']) & set(other_course['tags'])
-                if len(common_tags) >= 2:
-                    labels.append(0.4)
-                elif len(common_tags) == 1:
-                    labels.append(0.2)
-                else:
-                    labels.append(0.0)
+    course_features = np.array([encode_course_features(c, encoders) for c in courses], dtype=np.float32)
+    # The same edges the retrieval report scores against (retrieval_eval.related_edges)
+    related_src, related_dst = related_edges(courses, encoders['course_to_idx'])
+    
+    blocks = list(iter_training_pair_blocks(
+        course_features, encoders['num_categories'], related_src, related_dst,
+        block_size=block_size or max(len(courses), 1)
+    ))
+    if not blocks:
+        empty = np.zeros(0, dtype=np.int32)
+        return course_features, empty, empty, np.zeros(0, dtype=np.float32)
     
     return (
         course_features,
-        np.array(pairs_course1, dtype=np.int32),
-        np.array(pairs_course2, dtype=np.int32),
-        np.array(labels, dtype=np.float32)
+        np.concatenate([b[0] for b in blocks]),
+        np.concatenate([b[1] for b in blocks]),
+        np.concatenate([b[2] for b in blocks])
     )
 
 
@@ -632,11 +679,54 @@ def build_inference_model(embedding_network, feature_dim):
     return inference_model
 
 
+# =============================================================================
+# INDEX-BASED PAIR BATCHING
+# =============================================================================
+# The default input mode copies a full feature vector for EVERY pair:
+#   X1 = course_features[pairs_c1]   → pairs x feature_dim floats
+#   X2 = course_features[pairs_c2]   → pairs x feature_dim floats
+# That is C² x F floats, and it explodes as the catalog grows.
+#
+# Index mode keeps ONE copy of course_features and only streams the
+# (i, j, label) triples. Each batch gathers its rows on the fly:
+#
+#   (i, j, label) ──shuffle──► batch ──gather(course_features)──► model
+#
+# Memory: O(C·F + pairs) instead of O(pairs·F).
+# =============================================================================
+
+def make_pair_dataset(course_features, pairs_c1, pairs_c2, labels, batch_size, shuffle=False, seed=None):
+    features = tf.constant(course_features)
+    ds = tf.data.Dataset.from_tensor_slices((pairs_c1, pairs_c2, labels))
+    if shuffle:
+        # Shuffles small index triples, never feature vectors
+        ds = ds.shuffle(len(labels), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(
+        lambda i, j, y: ((tf.gather(features, i), tf.gather(features, j)), y),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
 # =============================================================================
 # MAIN TRAINING FUNCTION
 # =============================================================================
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the course similarity MLP.')
+    parser.add_argument('--input-mode', choices=['arrays', 'indices', 'catalog'], default='arrays',
+                        help='arrays = copy X1/X2 feature rows per pair, indices = gather per batch, '
+                             'catalog = embed each course once per step (see catalog_training.py)')
+    parser.add_argument('--compare-speed', action='store_true',
+                        help='time per-pair Siamese steps against catalog-indexed steps before training')
+    add_compression_args(parser)  # --prune-sparsity, --qat, ... (see model_compression.py)
+    add_metrics_args(parser)  # --metrics-file (see training_metrics.py)
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     print("=" * 60)
     print("Course Similarity MLP Training")
     print("=" * 60)
@@ -656,23 +746,48 @@ def main():
     print(f"   - Training pairs: {len(labels)}")
     print(f"   - Positive pairs (similarity > 0.5): {np.sum(labels > 0.5)}")
     
-    # Prepare training inputs
-    X1 = course_features[pairs_c1]  # Course 1 features for each pair
-    X2 = course_features[pairs_c2]  # Course 2 features for each pair
-    y = labels                       # Similarity scores
-    
-    # Shuffle the data
-    indices = np.random.permutation(len(y))
-    X1, X2, y = X1[indices], X2[indices], y[indices]
-    
-    # STEP 3: Split into train/test
-    split_idx = int(0.8 * len(y))
-    X1_train, X1_test = X1[:split_idx], X1[split_idx:]
-    X2_train, X2_test = X2[:split_idx], X2[split_idx:]
-    y_train, y_test = y[:split_idx], y[split_idx:]
-    
-    print(f"   - Train samples: {len(y_train)}")
-    print(f"   - Test samples: {len(y_test)}")
+    # Shuffle the pair indices, then split into train/test (80/20)
+    indices = np.random.permutation(len(labels))
+    split_idx = int(0.8 * len(labels))
+    train_idx, test_idx = indices[:split_idx], indices[split_idx:]
+    
+    if args.input_mode == 'catalog':
+        # STEP 3: Only (i, j) indices go in; the model looks features up itself
+        train_data = make_index_dataset(pairs_c1[train_idx], pairs_c2[train_idx], labels[train_idx],
+                                        batch_size=64, shuffle=True)
+        test_data = make_index_dataset(pairs_c1[test_idx], pairs_c2[test_idx], labels[test_idx],
+                                       batch_size=64)
+    elif args.input_mode == 'indices':
+        # STEP 3: Stream (i, j, label) triples; features are gathered per batch
+        train_data = make_pair_dataset(course_features, pairs_c1[train_idx], pairs_c2[train_idx],
+                                       labels[train_idx], batch_size=64, shuffle=True)
+        test_data = make_pair_dataset(course_features, pairs_c1[test_idx], pairs_c2[test_idx],
+                                      labels[test_idx], batch_size=64)
+    else:
+        # Prepare training inputs
+        X1 = course_features[pairs_c1]  # Course 1 features for each pair
+        X2 = course_features[pairs_c2]  # Course 2 features for each pair
+        y = labels                       # Similarity scores
+        
+        # STEP 3: Split into train/test
+        X1_train, X1_test = X1[train_idx], X1[test_idx]
+        X2_train, X2_test = X2[train_idx], X2[test_idx]
+        y_train, y_test = y[train_idx], y[test_idx]
+    
+    print(f"   - Train samples: {len(train_idx)}")
+    print(f"   - Test samples: {len(test_idx)}")
+    
+    if args.compare_speed:
+        print("\n   Comparing training step time (throwaway models)...")
+        pair_model, _ = build_similarity_model(encoders['num_courses'], feature_dim, embedding_dim=64)
+        pair_model.compile(optimizer='adam', loss='mse')
+        _, catalog_network = build_similarity_model(encoders['num_courses'], feature_dim, embedding_dim=64)
+        catalog_model = CatalogPairModel(catalog_network, course_features)
+        catalog_model.compile(optimizer='adam', loss='mse')
+        compare_training_speed(
+            pair_model, make_pair_dataset(course_features, pairs_c1, pairs_c2, labels, batch_size=64),
+            catalog_model, make_index_dataset(pairs_c1, pairs_c2, labels, batch_size=64)
+        )
     
     # STEP 4: Build model
     print("\n3. Building MLP model...")
@@ -681,6 +796,9 @@ def main():
         feature_dim=feature_dim,
         embedding_dim=64
     )
+    if args.input_mode == 'catalog':
+        # Same shared embedding network, fed by course index instead of features
+        model = CatalogPairModel(embedding_network, course_features, name='catalog_similarity_model')
     
     model.compile(
         optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
@@ -688,18 +806,32 @@ def main():
         metrics=['mae']
     )
     
-    model.summary()
+    if args.input_mode == 'catalog':
+        embedding_network.summary()
+    else:
+        model.summary()
     
     # STEP 5: Train
-    print("\n4. Training model...")
-    history = model.fit(
-        [X1_train, X2_train],
-        y_train,
-        validation_data=([X1_test, X2_test], y_test),
-        epochs=50,
-        batch_size=64,
-        verbose=1
-    )
+    print(f"\n4. Training model ({args.input_mode} input mode)...")
+    callbacks = []
+    if args.metrics_file:
+        metrics = TrainingMetrics(args.metrics_file, batch_size=64,
+                                  run={'script': 'train_course_similarity.py', **vars(args)})
+        callbacks.append(metrics)
+        if args.input_mode in ('indices', 'catalog'):
+            train_data = metrics.instrument(train_data)
+    if args.input_mode in ('indices', 'catalog'):
+        history = model.fit(train_data, validation_data=test_data, epochs=50, callbacks=callbacks, verbose=1)
+    else:
+        history = model.fit(
+            [X1_train, X2_train],
+            y_train,
+            validation_data=([X1_test, X2_test], y_test),
+            epochs=50,
+            batch_size=64,
+            callbacks=callbacks,
+            verbose=1
+        )
     
     print(f"\n   Final train loss: {history.history['loss'][-1]:.4f}")
     print(f"   Final val loss: {history.history['val_loss'][-1]:.4f}")
@@ -716,20 +848,18 @@ def main():
     
     # STEP 8: Test similarity predictions
     print("\n7. Testing similarity predictions...")
+    related_src, related_dst = related_edges(COURSES, encoders['course_to_idx'])
+    print_retrieval_report(evaluate_retrieval(all_embeddings, related_src, related_dst))
+    
     test_courses = ['javascript_fundamentals', 'flutter_complete', 'blockchain_fundamentals']
+    test_indices = [encoders['course_to_idx'][test_id] for test_id in test_courses]
     
-    for test_id in test_courses:
-        test_idx = encoders['course_to_idx'][test_id]
-        test_embedding = all_embeddings[test_idx]
-        
-        # Compute similarities using dot product
-        similarities = np.dot(all_embeddings, test_embedding)
-        top_indices = np.argsort(similarities)[::-1][1:6]  # Top 5, excluding self
-        
+    # Top 5 by dot product, excluding self (see retrieval_eval.py)
+    top_indices, top_scores = top_k_neighbours(all_embeddings, 5, queries=test_indices)
+    for test_id, neighbours, scores in zip(test_courses, top_indices, top_scores):
         print(f"\n   '{test_id}' similar to:")
-        for idx in top_indices:
+        for idx, sim_score in zip(neighbours, scores):
             course_id = encoders['idx_to_course'][idx]
-            sim_score = similarities[idx]
             print(f"      - {course_id}: {sim_score:.3f}")
     
     # STEP 9: Convert to TFLite
@@ -775,6 +905,21 @@ def main():
         json.dump(encoder_data, f, indent=2)
     print(f"   Saved encoders to {encoder_path}")
     
+    # Related courses for the app, precomputed (see neighbour_table.py)
+    neighbour_table = export_neighbour_table(all_embeddings, [c['id'] for c in COURSES])
+    print(f"   Saved top-{neighbour_table['k']} neighbours to {NEIGHBOURS_PATH}")
+    
+    # STEP 11 (optional): Pruning / quantization-aware fine-tuning
+    if compression_enabled(args):
+        print("\n10. Pruning / quantization-aware fine-tuning...")
+        compress_and_export(
+            inference_model, tflite_model, course_features,
+            pairs_c1[train_idx], pairs_c2[train_idx], labels[train_idx], loss='mse',
+            output_dir='../assets/model', epochs=args.compress_epochs, batch_size=64,
+            target_sparsity=args.prune_sparsity, schedule=args.prune_schedule,
+            frequency=args.prune_frequency, qat=args.qat
+        )
+    
     print("\n" + "=" * 60)
     print("Training complete!")
     print("=" * 60)
@@ -13,13 +13,31 @@ Key Features:
 - Batch normalization & regularization
 
 Architecture: Embedding-Based MLP with Attention Enhancement
+
+Usage (from ml_scripts/):
+    python train_deep_learning_model.py                        # pre-generated (X1, X2) samples
+    python train_deep_learning_model.py --input-mode catalog   # embed each course once per step
+    python train_deep_learning_model.py --input-mode augment   # add noise per batch in tf.data
+    python train_deep_learning_model.py --compare-speed        # time per-pair vs catalog steps
+    python train_deep_learning_model.py --distill              # ship a small distilled student
+    python train_deep_learning_model.py --prune-sparsity 0.5 --qat   # + sparse/int8 exports
 """
 
 import tensorflow as tf
 import numpy as np
+import argparse
 import json
 import os
-import random
+from collections import Counter
+
+from catalog_training import CatalogPairModel, compare_training_speed, make_index_dataset
+from model_compression import (add_compression_args, compress_and_export, compression_enabled,
+                               tflite_latency_ms, top_k_overlap)
+from neighbour_table import NEIGHBOURS_PATH, export_neighbour_table
+from retrieval_eval import evaluate_retrieval, print_retrieval_report, related_edges, top_k_neighbours
+from training_metrics import TrainingMetrics, add_metrics_args
+from training_state import (ResumableCheckpoint, epoch_index_dataset, load_arrays, load_or_create_config,
+                            save_arrays, steps_per_epoch)
 
 # ============================================================================
 # EXPANDED COURSE DATA (100+ courses for more training data)
@@ -252,11 +270,16 @@ print(f"Total courses in catalog: {len(COURSES)}")
 # parts of the input. Just like how humans pay attention to key words when
 # reading, this layer learns which features are important for each course.
 #
-# HOW IT WORKS:
+# HOW IT WORKS (per course, never across the batch):
+# 0. The 64 features are split into 8 "tokens" of 8 features each
 # 1. Query (Q): "What am I looking for?"
 # 2. Key (K): "What do I have?"  
 # 3. Value (V): "What's the actual content?"
 # 4. Attention = softmax(Q·K) × V  → Weighted combination of values
+#    computed separately by each head, between the tokens of ONE course
+#
+# Scores are (batch, heads, tokens, tokens): cost grows linearly with the
+# batch, and a course gets the same embedding alone or inside any batch.
 #
 # WHY USE IT?
 # - Helps the model understand feature importance
@@ -266,44 +289,86 @@ print(f"Total courses in catalog: {len(COURSES)}")
 # PARAMETERS:
 # - embed_dim: Size of embedding (64 in our case)
 # - num_heads: Number of parallel attention heads (4 = looks at 4 patterns)
+# - num_tokens: How many feature groups attend to each other (8)
 # =============================================================================
+@tf.keras.utils.register_keras_serializable(package='course_similarity')
 class AttentionLayer(tf.keras.layers.Layer):
-    """Attention Layer for MLP Feature Enhancement"""
-    def __init__(self, embed_dim, num_heads=4, **kwargs):
+    """Per-sample multi-head attention between feature groups of one course."""
+    def __init__(self, embed_dim, num_heads=4, num_tokens=8, **kwargs):
         super().__init__(**kwargs)
+        if embed_dim % num_tokens or embed_dim % num_heads:
+            raise ValueError('embed_dim must be divisible by num_tokens and num_heads')
         self.embed_dim = embed_dim
         self.num_heads = num_heads
+        self.num_tokens = num_tokens
+        self.token_dim = embed_dim // num_tokens
         self.head_dim = embed_dim // num_heads
         
+        # Applied to every token: token_dim features → embed_dim (all heads)
         self.query_dense = tf.keras.layers.Dense(embed_dim)
         self.key_dense = tf.keras.layers.Dense(embed_dim)
         self.value_dense = tf.keras.layers.Dense(embed_dim)
-        self.output_dense = tf.keras.layers.Dense(embed_dim)
-        
+        # Heads merged back to token_dim per token → embed_dim after flattening
+        self.output_dense = tf.keras.layers.Dense(self.token_dim)
+    
+    def split_heads(self, x):
+        # (batch, tokens, embed_dim) → (batch, heads, tokens, head_dim)
+        x = tf.reshape(x, [-1, self.num_tokens, self.num_heads, self.head_dim])
+        return tf.transpose(x, [0, 2, 1, 3])
+    
     def call(self, inputs):
-        batch_size = tf.shape(inputs)[0]
+        # (batch, embed_dim) → (batch, tokens, token_dim)
+        tokens = tf.reshape(inputs, [-1, self.num_tokens, self.token_dim])
         
         # Linear projections
-        query = self.query_dense(inputs)
-        key = self.key_dense(inputs)
-        value = self.value_dense(inputs)
+        query = self.split_heads(self.query_dense(tokens))
+        key = self.split_heads(self.key_dense(tokens))
+        value = self.split_heads(self.value_dense(tokens))
         
-        # Compute attention scores
+        # Compute attention scores: (batch, heads, tokens, tokens)
         attention_scores = tf.matmul(query, key, transpose_b=True)
         attention_scores = attention_scores / tf.math.sqrt(tf.cast(self.head_dim, tf.float32))
         attention_weights = tf.nn.softmax(attention_scores, axis=-1)
         
-        # Apply attention to values
+        # Apply attention to values, then merge the heads again
         attention_output = tf.matmul(attention_weights, value)
+        attention_output = tf.transpose(attention_output, [0, 2, 1, 3])
+        attention_output = tf.reshape(attention_output, [-1, self.num_tokens, self.embed_dim])
         
-        return self.output_dense(attention_output)
+        output = self.output_dense(attention_output)
+        return tf.reshape(output, [-1, self.embed_dim])
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({'embed_dim': self.embed_dim, 'num_heads': self.num_heads, 'num_tokens': self.num_tokens})
+        return config
+
+
+def check_batch_independence(embedding_network, course_features, atol=1e-5):
+    """
+    Embed every course alone and inside one big batch; the results must match.
+    
+    This is what on-device inference relies on: the app embeds one course at
+    a time, while training and the exported JSON embed the whole catalog.
+    Returns the largest absolute difference.
+    """
+    batched = embedding_network(course_features, training=False).numpy()
+    single = np.concatenate([
+        embedding_network(course_features[i:i + 1], training=False).numpy()
+        for i in range(len(course_features))
+    ])
+    max_diff = float(np.abs(batched - single).max())
+    if max_diff > atol:
+        raise ValueError(f'Embeddings depend on the batch (max difference {max_diff:.2e})')
+    return max_diff
 
 
 # -----------------------------------------------------------------------------
 # BUILD THE MLP NETWORK - This is the main neural network!
 # -----------------------------------------------------------------------------
 
-def build_deep_embedding_network(feature_dim, embedding_dim=64):
+def build_deep_embedding_network(feature_dim, embedding_dim=64, widths=(256, 128, 64), dropout=(0.3, 0.25),
+                                 num_heads=4):
     """
     Embedding-Based Multilayer Perceptron (MLP) Network
     
@@ -319,7 +384,13 @@ def build_deep_embedding_network(feature_dim, embedding_dim=64):
     - Embedding Layer: Dense(64) → Course Embedding Vector
     
     Total: 7 MLP layers (Deep Learning)
+    
+    widths = (layers 1-2, layers 3-4, layer 5 + attention), dropout =
+    (layers 1-2, layers 3-4) and num_heads (attention) are the knobs that
+    hyperparameter_sweep.py tunes; the defaults are the shipped model.
     """
+    wide, narrow, attention_dim = widths
+    wide_dropout, narrow_dropout = dropout
     
     inputs = tf.keras.layers.Input(shape=(feature_dim,), name='course_features')
     
@@ -330,46 +401,46 @@ def build_deep_embedding_network(feature_dim, embedding_dim=64):
     # ReLU = Activation function (if input < 0, output = 0, else output = input)
     # Dropout(0.3) = Randomly turns off 30% of neurons to prevent overfitting
     # =========================================================================
-    x = tf.keras.layers.Dense(256, name='dense_1')(inputs)
+    x = tf.keras.layers.Dense(wide, name='dense_1')(inputs)
     x = tf.keras.layers.BatchNormalization(name='bn_1')(x)
     x = tf.keras.layers.ReLU(name='relu_1')(x)
-    x = tf.keras.layers.Dropout(0.3, name='dropout_1')(x)
+    x = tf.keras.layers.Dropout(wide_dropout, name='dropout_1')(x)
     
     # =========================================================================
     # MLP LAYER 2: Second layer with SKIP CONNECTION
     # Skip connection = We save the input and add it to the output
     # This helps the network learn better (used in ResNet architecture)
     # =========================================================================
-    residual = tf.keras.layers.Dense(256, name='residual_proj_1')(x)  # Save for skip
-    x = tf.keras.layers.Dense(256, name='dense_2')(x)
+    residual = tf.keras.layers.Dense(wide, name='residual_proj_1')(x)  # Save for skip
+    x = tf.keras.layers.Dense(wide, name='dense_2')(x)
     x = tf.keras.layers.BatchNormalization(name='bn_2')(x)
     x = tf.keras.layers.ReLU(name='relu_2')(x)
-    x = tf.keras.layers.Dropout(0.3, name='dropout_2')(x)
+    x = tf.keras.layers.Dropout(wide_dropout, name='dropout_2')(x)
     x = tf.keras.layers.Add(name='residual_add_1')([x, residual])  # Add skip connection!
     
     # =========================================================================
     # MLP LAYER 3: Reduce dimensions from 256 to 128 neurons
     # We gradually compress the information
     # =========================================================================
-    x = tf.keras.layers.Dense(128, name='dense_3')(x)
+    x = tf.keras.layers.Dense(narrow, name='dense_3')(x)
     x = tf.keras.layers.BatchNormalization(name='bn_3')(x)
     x = tf.keras.layers.ReLU(name='relu_3')(x)
-    x = tf.keras.layers.Dropout(0.25, name='dropout_3')(x)
+    x = tf.keras.layers.Dropout(narrow_dropout, name='dropout_3')(x)
     
     # =========================================================================
     # MLP LAYER 4: Another layer with skip connection
     # =========================================================================
-    residual = tf.keras.layers.Dense(128, name='residual_proj_2')(x)
-    x = tf.keras.layers.Dense(128, name='dense_4')(x)
+    residual = tf.keras.layers.Dense(narrow, name='residual_proj_2')(x)
+    x = tf.keras.layers.Dense(narrow, name='dense_4')(x)
     x = tf.keras.layers.BatchNormalization(name='bn_4')(x)
     x = tf.keras.layers.ReLU(name='relu_4')(x)
-    x = tf.keras.layers.Dropout(0.25, name='dropout_4')(x)
+    x = tf.keras.layers.Dropout(narrow_dropout, name='dropout_4')(x)
     x = tf.keras.layers.Add(name='residual_add_2')([x, residual])
     
     # =========================================================================
     # MLP LAYER 5: Further compress to 64 neurons
     # =========================================================================
-    x = tf.keras.layers.Dense(64, name='dense_5')(x)
+    x = tf.keras.layers.Dense(attention_dim, name='dense_5')(x)
     x = tf.keras.layers.BatchNormalization(name='bn_5')(x)
     x = tf.keras.layers.ReLU(name='relu_5')(x)
     
@@ -377,9 +448,7 @@ def build_deep_embedding_network(feature_dim, embedding_dim=64):
     # ATTENTION LAYER: Helps model focus on important features
     # Like asking "which course features matter most?"
     # =========================================================================
-    x = tf.keras.layers.Reshape((1, 64))(x)  # Reshape for attention
-    x = AttentionLayer(64, num_heads=4, name='attention')(x)
-    x = tf.keras.layers.Flatten()(x)
+    x = AttentionLayer(attention_dim, num_heads=num_heads, num_tokens=8, name='attention')(x)
     
     # =========================================================================
     # EMBEDDING LAYER (OUTPUT): Final 64-dimensional course embedding
@@ -394,12 +463,13 @@ def build_deep_embedding_network(feature_dim, embedding_dim=64):
     return model
 
 
-def build_siamese_similarity_model(feature_dim, embedding_dim=64):
+def build_siamese_similarity_model(feature_dim, embedding_dim=64, **network_kwargs):
     """
     Embedding-Based MLP Recommender Model
     
     Uses shared MLP weights to create embeddings for course pairs,
     then computes similarity for recommendations.
+    network_kwargs (widths, dropout, num_heads) go to build_deep_embedding_network.
     """
     # =========================================================================
     # HOW THIS WORKS:
@@ -410,7 +480,7 @@ def build_siamese_similarity_model(feature_dim, embedding_dim=64):
     # =========================================================================
     
     # Create the shared MLP network (same network for both courses)
-    embedding_network = build_deep_embedding_network(feature_dim, embedding_dim)
+    embedding_network = build_deep_embedding_network(feature_dim, embedding_dim, **network_kwargs)
     
     # Two inputs: one for Course A, one for Course B
     course1_input = tf.keras.layers.Input(shape=(feature_dim,), name='course1_features')
@@ -520,7 +590,180 @@ def encode_course_features(course, encoders):
 # - X1, X2: Two course feature vectors (the pair)
 # - y: Similarity score (0.0 = unrelated, 1.0 = very related)
 # =============================================================================
-def generate_augmented_training_data(courses, encoders, num_samples=200000):
+# -----------------------------------------------------------------------------
+# PAIR RELATIONS - how two courses are related, as one small integer
+# -----------------------------------------------------------------------------
+# Every (i, j) pair falls into exactly one of these classes. The relation of
+# ALL pairs is precomputed once as a C x C matrix, so labelling a million
+# samples is a single fancy-indexing lookup: relations[pairs_c1, pairs_c2].
+RELATED, SAME_CATEGORY, TWO_TAGS, ONE_TAG, UNRELATED = range(5)
+
+# (low, high) label range per relation class for each generation step.
+# Labels are drawn uniformly from [low, high); low == high means a fixed label.
+ORIGINAL_LABELS = np.array([(1.0, 1.0), (0.7, 0.7), (0.5, 0.5), (0.3, 0.3), (0.0, 0.0)], dtype=np.float32)
+USER_LABELS = np.array([(0.88, 1.0), (0.65, 0.85), (0.3, 0.55), (0.3, 0.55), (0.3, 0.55)], dtype=np.float32)
+RANDOM_LABELS = np.array([(0.85, 1.0), (0.55, 0.8), (0.2, 0.5), (0.2, 0.5), (0.0, 0.15)], dtype=np.float32)
+
+# Noise stddev ranges: user behavior samples and random fill samples
+USER_NOISE_RANGE = (0.02, 0.08)
+RANDOM_NOISE_RANGE = (0.03, 0.1)
+# Combined range, for noise drawn per course (catalog mode, distillation)
+CATALOG_NOISE_RANGE = (0.02, 0.1)
+
+# Simulated users: (number of users, categories they are interested in).
+# None = career changers, who pick 2 random categories from CAREER_CHANGER_INTERESTS.
+USER_PROFILE_GROUPS = [
+    (150, ['Web Development']),
+    (100, ['Mobile Development']),
+    (100, ['Data Science']),
+    (50, ['Blockchain']),
+    (50, ['Web Development', 'Backend']),   # Full-stack
+    (25, ['Data Science']),                 # ML/AI specialists
+    (25, None),                             # Career changers - mixed interests
+]
+CAREER_CHANGER_INTERESTS = ['Web Development', 'Mobile Development', 'Data Science', 'Business']
+
+
+def build_relation_matrix(courses, encoders, course_features):
+    """C x C uint8 matrix of relation classes (RELATED ... UNRELATED)."""
+    num_categories = encoders['num_categories']
+    categories = course_features[:, :num_categories].argmax(axis=1)
+    tags = course_features[:, num_categories:]
+    common_tags = np.rint(tags @ tags.T)
+    
+    relations = np.full((len(courses), len(courses)), UNRELATED, dtype=np.uint8)
+    relations[common_tags == 1] = ONE_TAG
+    relations[common_tags >= 2] = TWO_TAGS
+    relations[categories[:, None] == categories[None, :]] = SAME_CATEGORY
+    # The same edges the retrieval report scores against (retrieval_eval.related_edges)
+    related_src, related_dst = related_edges(courses, encoders['course_to_idx'])
+    relations[related_src, related_dst] = RELATED
+    return relations
+
+
+def draw_labels(relations, pairs_c1, pairs_c2, label_ranges, rng):
+    """One label per pair, uniform in the range of its relation class."""
+    ranges = label_ranges[relations[pairs_c1, pairs_c2]]
+    low, high = ranges[:, 0], ranges[:, 1]
+    return low + rng.random(len(low), dtype=np.float32) * (high - low)
+
+
+def sample_user_pairs(courses, rng):
+    """Course pairs that the simulated users view together (i != j)."""
+    course_categories = np.array([c['category'] for c in courses])
+    
+    # Expand the groups into one interest list per user
+    profiles = []
+    for count, interests in USER_PROFILE_GROUPS:
+        for _ in range(count):
+            if interests is None:
+                picked = rng.choice(len(CAREER_CHANGER_INTERESTS), size=2, replace=False)
+                profiles.append(tuple(sorted(CAREER_CHANGER_INTERESTS[k] for k in picked)))
+            else:
+                profiles.append(tuple(interests))
+    
+    # Users with the same interests share one vectorized draw:
+    # each user views 50-150 pairs of courses from their categories
+    c1_parts, c2_parts = [], []
+    for interests, num_users in Counter(profiles).items():
+        matching = np.flatnonzero(np.isin(course_categories, list(interests)))
+        if len(matching) < 2:
+            continue
+        num_pairs = int(rng.integers(50, 151, size=num_users).sum())
+        c1 = matching[rng.integers(0, len(matching), size=num_pairs)]
+        c2 = matching[rng.integers(0, len(matching), size=num_pairs)]
+        keep = c1 != c2
+        c1_parts.append(c1[keep])
+        c2_parts.append(c2[keep])
+    
+    if not c1_parts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(c1_parts).astype(np.int32), np.concatenate(c2_parts).astype(np.int32)
+
+
+def generate_augmented_pairs(courses, encoders, num_samples=200000, seed=None):
+    """
+    Vectorized sample DEFINITIONS - no feature vectors yet.
+    
+    Returns (course_features, pairs_c1, pairs_c2, noise1, noise2, y):
+    - pairs_c1, pairs_c2: int32 course index of each side of each sample
+    - noise1, noise2: float32 noise stddev of each side (0 = clean)
+    - y: float32 similarity label
+    All arrays are whole-array numpy draws, so 10M samples take seconds and
+    ~200 MB; materialize_augmented_features() turns them into X1/X2.
+    """
+    rng = np.random.default_rng(seed)
+    course_features = np.array([encode_course_features(c, encoders) for c in courses], dtype=np.float32)
+    relations = build_relation_matrix(courses, encoders, course_features)
+    num_courses = len(courses)
+    
+    # 1. Original relationship pairs (high quality): every (i, j) with i != j, row by row
+    c1 = np.repeat(np.arange(num_courses, dtype=np.int32), num_courses - 1)
+    c2 = np.tile(np.arange(num_courses - 1, dtype=np.int32), num_courses)
+    c2 += c2 >= c1  # skip the course itself
+    original = (c1, c2, np.zeros(len(c1), dtype=np.float32), draw_labels(relations, c1, c2, ORIGINAL_LABELS, rng))
+    print(f"  Original pairs: {len(c1):,}")
+    
+    # 2. Simulated user behavior (realistic user patterns)
+    print(f"  Simulating {sum(count for count, _ in USER_PROFILE_GROUPS)} user behavior patterns...")
+    c1, c2 = sample_user_pairs(courses, rng)
+    user = (c1, c2, None, draw_labels(relations, c1, c2, USER_LABELS, rng))
+    print(f"  User behavior pairs: {len(c1):,}")
+    
+    # 3. Random augmented pairs to reach the target (i != j)
+    print(f"  Generating remaining samples to reach {num_samples:,}...")
+    num_random = max(num_samples - len(original[0]) - len(user[0]), 0)
+    c1 = rng.integers(0, num_courses, size=num_random, dtype=np.int32)
+    c2 = rng.integers(0, num_courses - 1, size=num_random, dtype=np.int32)
+    c2 += c2 >= c1
+    random_fill = (c1, c2, None, draw_labels(relations, c1, c2, RANDOM_LABELS, rng))
+    
+    # Noise stddev per side: one uniform draw per sample
+    noise1, noise2 = [original[2]], [original[2]]
+    for (c1, _, _, _), (low, high) in ((user, USER_NOISE_RANGE), (random_fill, RANDOM_NOISE_RANGE)):
+        noise1.append(rng.uniform(low, high, size=len(c1)).astype(np.float32))
+        noise2.append(rng.uniform(low, high, size=len(c1)).astype(np.float32))
+    
+    parts = (original, user, random_fill)
+    return (
+        course_features,
+        np.concatenate([p[0] for p in parts]),
+        np.concatenate([p[1] for p in parts]),
+        np.concatenate(noise1),
+        np.concatenate(noise2),
+        np.concatenate([p[3] for p in parts])
+    )
+
+
+def materialize_augmented_features(course_features, pairs, noise, rng, out=None, block_size=65536):
+    """
+    Write clip(course_features[pairs] + N(0, noise), 0, 1) into a float32 buffer.
+    
+    `out` may be any preallocated (len(pairs), feature_dim) float32 array,
+    e.g. an np.memmap. Works in blocks, so the only temporaries are one
+    block of noise - never a Python object per sample.
+    """
+    if out is None:
+        out = np.empty((len(pairs), course_features.shape[1]), dtype=np.float32)
+    for start in range(0, len(pairs), block_size):
+        stop = min(start + block_size, len(pairs))
+        block = out[start:stop]
+        np.take(course_features, pairs[start:stop], axis=0, out=block)
+        noisy = np.flatnonzero(noise[start:stop])
+        if len(noisy) == len(block):
+            # Usual case: every row is augmented, so work fully in place
+            scaled = rng.standard_normal(block.shape, dtype=np.float32)
+            scaled *= noise[start:stop, None]
+            block += scaled
+            np.clip(block, 0, 1, out=block)
+        elif len(noisy):
+            scaled = rng.standard_normal((len(noisy), block.shape[1]), dtype=np.float32)
+            scaled *= noise[start:stop][noisy, None]
+            block[noisy] = np.clip(block[noisy] + scaled, 0, 1)
+    return out
+
+
+def generate_augmented_training_data(courses, encoders, num_samples=200000, return_pairs=False, seed=None):
     """
     Generate 200,000+ training samples through data augmentation.
     
@@ -530,145 +773,212 @@ def generate_augmented_training_data(courses, encoders, num_samples=200000):
     3. Random augmented pairs with noise (fills the rest)
     
     Returns: (course_features, X1, X2, y) where y is similarity 0-1
+    With return_pairs=True, also returns the course indices of each sample
+    (pairs_c1, pairs_c2) for catalog-indexed training.
     """
     print(f"Generating {num_samples:,} training samples (this is REAL deep learning scale!)...")
     
-    # Encode all courses
-    course_features = np.array([encode_course_features(c, encoders) for c in courses], dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    course_features, pairs_c1, pairs_c2, noise1, noise2, y = generate_augmented_pairs(
+        courses, encoders, num_samples, seed=rng
+    )
+    X1 = materialize_augmented_features(course_features, pairs_c1, noise1, rng)
+    X2 = materialize_augmented_features(course_features, pairs_c2, noise2, rng)
     
-    X1_list, X2_list, y_list = [], [], []
-    
-    # 1. Original relationship pairs (high quality)
-    for i, course in enumerate(courses):
-        for j, other in enumerate(courses):
-            if i == j:
-                continue
-            
-            X1_list.append(course_features[i])
-            X2_list.append(course_features[j])
-            
-            if other['id'] in course.get('related', []):
-                y_list.append(1.0)
-            elif other['category'] == course['category']:
-                y_list.append(0.7)
-            else:
-                common_tags = set(course['tags']) & set(other['tags'])
-                if len(common_tags) >= 2:
-                    y_list.append(0.5)
-                elif len(common_tags) == 1:
-                    y_list.append(0.3)
-                else:
-                    y_list.append(0.0)
-    
-    original_count = len(y_list)
-    print(f"  Original pairs: {original_count:,}")
-    
-    # ============================================================================
-    # SIMULATED USER BEHAVIOR (Add realistic user patterns)
-    # ============================================================================
-    
-    # Define 500 simulated users with different learning interests
-    USER_PROFILES = [
-        # Web developers (150 users)
-        *[{'interests': ['Web Development'], 'skill_level': random.choice(['beginner', 'intermediate', 'advanced'])} for _ in range(150)],
-        # Mobile developers (100 users)
-        *[{'interests': ['Mobile Development'], 'skill_level': random.choice(['beginner', 'intermediate', 'advanced'])} for _ in range(100)],
-        # Data scientists (100 users)
-        *[{'interests': ['Data Science'], 'skill_level': random.choice(['beginner', 'intermediate', 'advanced'])} for _ in range(100)],
-        # Blockchain developers (50 users)
-        *[{'interests': ['Blockchain'], 'skill_level': random.choice(['beginner', 'intermediate', 'advanced'])} for _ in range(50)],
-        # Full-stack (50 users)
-        *[{'interests': ['Web Development', 'Backend'], 'skill_level': random.choice(['intermediate', 'advanced'])} for _ in range(50)],
-        # ML/AI specialists (25 users)
-        *[{'interests': ['Data Science'], 'skill_level': 'advanced', 'focus': 'deep_learning'} for _ in range(25)],
-        # Career changers (25 users) - mixed interests
-        *[{'interests': random.sample(['Web Development', 'Mobile Development', 'Data Science', 'Business'], 2), 'skill_level': 'beginner'} for _ in range(25)],
-    ]
+    print(f"  ✅ Total samples generated: {len(y):,}")
     
-    print(f"  Simulating {len(USER_PROFILES)} user behavior patterns...")
+    result = (course_features, X1, X2, y)
+    if return_pairs:
+        result += (pairs_c1, pairs_c2)
+    return result
+
+
+# =============================================================================
+# ON-THE-FLY AUGMENTATION PIPELINE
+# =============================================================================
+# The 'arrays' input mode materializes every noisy (X1, X2) pair up front:
+# 2 x samples x feature_dim floats in RAM, and every epoch sees the SAME noise.
+#
+# This pipeline keeps only the clean course_features matrix plus the sample
+# definitions from generate_augmented_pairs() and builds each batch on demand:
+#
+#   (c1, c2, noise1, noise2, y) ──shuffle──► batch ──map (parallel)──► model
+#                                                      │
+#                       gather course_features rows, add N(0, noise), clip
+#
+# Feature memory stays at one batch no matter how many samples there are,
+# and every epoch draws fresh noise. With fixed_noise=True (validation) the
+# noise comes from a stateless RNG seeded by the batch number, so each pass
+# over the same unshuffled data sees identical samples.
+# =============================================================================
+
+def make_augmented_dataset(course_features, pairs_c1, pairs_c2, noise1, noise2, labels, batch_size,
+                           shuffle=False, fixed_noise=False, seed=0):
+    features = tf.constant(course_features)
+    ds = tf.data.Dataset.from_tensor_slices((pairs_c1, pairs_c2, noise1, noise2, labels))
+    if shuffle:
+        ds = ds.shuffle(len(labels), reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size).enumerate()
     
-    # Generate user-course interaction pairs
-    user_generated = 0
-    for user_profile in USER_PROFILES:
-        user_interests = user_profile['interests']
-        skill_level = user_profile['skill_level']
-        
-        # Find courses matching user interests
-        matching_indices = [i for i, c in enumerate(courses) if c['category'] in user_interests]
-        
-        if len(matching_indices) < 2:
-            continue
-        
-        # Generate course pairs this user would likely engage with together
-        num_pairs_per_user = random.randint(50, 150)
-        for _ in range(num_pairs_per_user):
-            i = random.choice(matching_indices)
-            j = random.choice(matching_indices)
-            if i == j:
-                continue
-            
-            # Add some noise to simulate real user behavior
-            noise1 = np.random.normal(0, random.uniform(0.02, 0.08), course_features[i].shape).astype(np.float32)
-            noise2 = np.random.normal(0, random.uniform(0.02, 0.08), course_features[j].shape).astype(np.float32)
-            
-            aug_feat1 = np.clip(course_features[i] + noise1, 0, 1)
-            aug_feat2 = np.clip(course_features[j] + noise2, 0, 1)
-            
-            X1_list.append(aug_feat1)
-            X2_list.append(aug_feat2)
-            
-            # Users interested in same category view related courses
-            course1, course2 = courses[i], courses[j]
-            if course2['id'] in course1.get('related', []):
-                y_list.append(random.uniform(0.88, 1.0))
-            elif course2['category'] == course1['category']:
-                y_list.append(random.uniform(0.65, 0.85))
-            else:
-                y_list.append(random.uniform(0.3, 0.55))
-            
-            user_generated += 1
+    def augment(batch_index, batch):
+        c1, c2, scale1, scale2, y = batch
+        noise_key = 2 * batch_index if fixed_noise else None
+        return augment_pair_batch(features, c1, c2, scale1, scale2, seed, noise_key), y
     
-    print(f"  User behavior pairs: {user_generated:,}")
+    return ds.map(augment, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+def augment_pair_batch(features, c1, c2, scale1, scale2, seed=0, noise_key=None):
+    """
+    Gather the clean rows of a batch of pairs, add N(0, scale) noise, clip to [0, 1].
     
-    # 2. Continue with random augmentation to reach target
-    print(f"  Generating remaining samples to reach {num_samples:,}...")
+    noise_key=None draws fresh noise; an int64 key k makes the noise a pure
+    function of (seed, k) and (seed, k + 1) - the same batch, the same noise.
+    """
+    x1, x2 = tf.gather(features, c1), tf.gather(features, c2)
+    if noise_key is None:
+        noise_a = tf.random.normal(tf.shape(x1))
+        noise_b = tf.random.normal(tf.shape(x2))
+    else:
+        seed = tf.constant(seed, tf.int64)
+        noise_a = tf.random.stateless_normal(tf.shape(x1), seed=tf.stack([seed, noise_key]))
+        noise_b = tf.random.stateless_normal(tf.shape(x2), seed=tf.stack([seed, noise_key + 1]))
+    x1 = tf.clip_by_value(x1 + noise_a * scale1[:, None], 0.0, 1.0)
+    x2 = tf.clip_by_value(x2 + noise_b * scale2[:, None], 0.0, 1.0)
+    return x1, x2
+
+
+def make_resumable_dataset(input_mode, course_features, pairs_c1, pairs_c2, noise1, noise2, labels,
+                           batch_size, seed, initial_epoch, epochs, X1=None, X2=None):
+    """
+    Training batches for epochs [initial_epoch, epochs) that a resumed run
+    reproduces exactly (see training_state.epoch_index_dataset).
     
-    while len(y_list) < num_samples:
-        i = random.randint(0, len(courses) - 1)
-        j = random.randint(0, len(courses) - 1)
-        if i == j:
-            continue
-        
-        # Add noise to features (data augmentation)
-        noise1 = np.random.normal(0, random.uniform(0.03, 0.1), course_features[i].shape).astype(np.float32)
-        noise2 = np.random.normal(0, random.uniform(0.03, 0.1), course_features[j].shape).astype(np.float32)
-        
-        aug_feat1 = np.clip(course_features[i] + noise1, 0, 1)
-        aug_feat2 = np.clip(course_features[j] + noise2, 0, 1)
-        
-        X1_list.append(aug_feat1)
-        X2_list.append(aug_feat2)
-        
-        course1, course2 = courses[i], courses[j]
-        if course2['id'] in course1.get('related', []):
-            y_list.append(random.uniform(0.85, 1.0))  # Positive with variance
-        elif course2['category'] == course1['category']:
-            y_list.append(random.uniform(0.55, 0.8))
-        else:
-            common_tags = set(course1['tags']) & set(course2['tags'])
-            if len(common_tags) >= 1:
-                y_list.append(random.uniform(0.2, 0.5))
-            else:
-                y_list.append(random.uniform(0.0, 0.15))  # Negative with variance
+    Returns (dataset, steps_per_epoch) for fit(..., steps_per_epoch=...).
+    In 'augment' mode the noise is keyed by (epoch, batch), so it is still
+    fresh every epoch but the same after a resume.
+    """
+    steps = steps_per_epoch(len(labels), batch_size)
+    features = tf.constant(course_features)
+    c1, c2, scale1, scale2, y = (tf.constant(a) for a in (pairs_c1, pairs_c2, noise1, noise2, labels))
     
-    print(f"  ✅ Total samples generated: {len(y_list):,}")
+    def select(epoch, batch_number, idx):
+        y_batch = tf.gather(y, idx)
+        if input_mode == 'catalog':
+            return (tf.gather(c1, idx), tf.gather(c2, idx)), y_batch
+        if input_mode == 'augment':
+            noise_key = 2 * (epoch * steps + batch_number)
+            return augment_pair_batch(features, tf.gather(c1, idx), tf.gather(c2, idx), tf.gather(scale1, idx),
+                                      tf.gather(scale2, idx), seed, noise_key), y_batch
+        # arrays: rows of the pre-generated X1/X2 (numpy_function avoids a second in-graph copy)
+        x1, x2 = tf.numpy_function(lambda i: (X1[i], X2[i]), [idx], [tf.float32, tf.float32])
+        x1.set_shape([None, X1.shape[1]])
+        x2.set_shape([None, X2.shape[1]])
+        return (x1, x2), y_batch
     
-    return (
-        course_features,
-        np.array(X1_list, dtype=np.float32),
-        np.array(X2_list, dtype=np.float32),
-        np.array(y_list, dtype=np.float32)
-    )
+    ds = epoch_index_dataset(len(labels), batch_size, seed, initial_epoch, epochs)
+    return ds.map(select, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE), steps
+
+
+# =============================================================================
+# KNOWLEDGE DISTILLATION - A Tiny On-Device Student
+# =============================================================================
+# WHAT IS THIS?
+# The 7-layer teacher above is accurate but big for a phone. Distillation
+# trains a SMALL "student" network to imitate the trained teacher:
+#
+#   course features ──► teacher (frozen) ──► target embedding
+#                  └──► student (2 layers) ──► embedding  ← learns to match
+#
+# The loss matches both each embedding AND the similarity matrix of the
+# batch (embeddings @ embeddings.T), because the app ranks courses by those
+# similarities. Inputs are the clean catalog plus noisy copies (the same
+# augmentation the teacher saw), so the student also learns the space
+# around every course.
+#
+# We then check how often both models agree on each course's top 5.
+# =============================================================================
+
+STUDENT_HIDDEN_DIM = 64
+DISTILLATION_REPORT_PATH = '../assets/model/distillation_report.json'
+
+
+def build_student_network(feature_dim, embedding_dim=64, hidden_dim=STUDENT_HIDDEN_DIM):
+    """2-layer MLP student: Dense(hidden) + ReLU → Dense(embedding) → L2 norm."""
+    inputs = tf.keras.layers.Input(shape=(feature_dim,), name='course_features')
+    x = tf.keras.layers.Dense(hidden_dim, activation='relu', name='student_dense_1')(inputs)
+    x = tf.keras.layers.Dense(embedding_dim, name='student_embedding')(x)
+    outputs = tf.keras.layers.Lambda(lambda x: tf.nn.l2_normalize(x, axis=1), name='l2_norm')(x)
+    return tf.keras.Model(inputs=inputs, outputs=outputs, name='student_embedding_network')
+
+
+@tf.keras.utils.register_keras_serializable(package='course_similarity')
+def distillation_loss(teacher_embeddings, student_embeddings):
+    # Match each embedding, plus every pairwise similarity inside the batch
+    embedding_loss = tf.reduce_mean(tf.reduce_sum(tf.square(student_embeddings - teacher_embeddings), axis=1))
+    teacher_sims = tf.matmul(teacher_embeddings, teacher_embeddings, transpose_b=True)
+    student_sims = tf.matmul(student_embeddings, student_embeddings, transpose_b=True)
+    return embedding_loss + tf.reduce_mean(tf.square(student_sims - teacher_sims))
+
+
+def distill_student(teacher_network, course_features, num_samples=50000, epochs=30, batch_size=256, seed=None):
+    """Train a student to reproduce the teacher's embeddings; returns the student."""
+    rng = np.random.default_rng(seed)
+    num_courses = len(course_features)
+    
+    # Clean catalog first, then noisy copies of random courses
+    course_idx = rng.integers(0, num_courses, size=max(num_samples, num_courses), dtype=np.int32)
+    course_idx[:num_courses] = np.arange(num_courses)
+    noise = rng.uniform(*CATALOG_NOISE_RANGE, size=len(course_idx)).astype(np.float32)
+    noise[:num_courses] = 0.0
+    X = materialize_augmented_features(course_features, course_idx, noise, rng)
+    targets = teacher_network.predict(X, batch_size=1024, verbose=0)
+    
+    student = build_student_network(course_features.shape[1], embedding_dim=targets.shape[1])
+    student.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.003), loss=distillation_loss)
+    history = student.fit(X, targets, epochs=epochs, batch_size=batch_size, shuffle=True, verbose=0)
+    print(f"   Student distillation loss: {history.history['loss'][0]:.4f} → {history.history['loss'][-1]:.4f}")
+    return student
+
+
+def convert_to_tflite(embedding_network):
+    converter = tf.lite.TFLiteConverter.from_keras_model(embedding_network)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    return converter.convert()
+
+
+def distillation_report(teacher_network, teacher_tflite, student, student_tflite, course_features,
+                        related_src, related_dst, report_path=DISTILLATION_REPORT_PATH):
+    teacher_embeddings = teacher_network.predict(course_features, verbose=0)
+    student_embeddings = student.predict(course_features, verbose=0)
+    report = {
+        'top5_overlap': round(top_k_overlap(teacher_embeddings, student_embeddings, k=5), 4),
+        'teacher': {
+            'parameters': teacher_network.count_params(),
+            'tflite_kb': round(len(teacher_tflite) / 1024, 2),
+            'latency_ms': round(tflite_latency_ms(teacher_tflite, course_features), 4),
+            'retrieval': evaluate_retrieval(teacher_embeddings, related_src, related_dst)
+        },
+        'student': {
+            'parameters': student.count_params(),
+            'tflite_kb': round(len(student_tflite) / 1024, 2),
+            'latency_ms': round(tflite_latency_ms(student_tflite, course_features), 4),
+            'retrieval': evaluate_retrieval(student_embeddings, related_src, related_dst)
+        }
+    }
+    print(f"   Top-5 agreement with teacher: {report['top5_overlap'] * 100:.1f}%")
+    for name in ('teacher', 'student'):
+        stats = report[name]
+        print(f"   {name:8s} {stats['parameters']:>9,} params  {stats['tflite_kb']:>8.2f} KB  "
+              f"{stats['latency_ms']:.4f} ms/course  recall@10 {stats['retrieval']['recall@10']:.4f}  "
+              f"NDCG@10 {stats['retrieval']['ndcg@10']:.4f}")
+    print(f"   Size: {report['teacher']['tflite_kb'] / report['student']['tflite_kb']:.1f}x smaller, "
+          f"latency: {report['teacher']['latency_ms'] / report['student']['latency_ms']:.1f}x faster")
+    
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"   Saved distillation report to {report_path}")
+    return report
 
 
 # =============================================================================
@@ -684,25 +994,79 @@ def generate_augmented_training_data(courses, encoders, num_samples=200000):
 # 3. Split into train/validation sets (85%/15%)
 # 4. Build the Siamese MLP network
 # 5. Train for up to 150 epochs
-# 6. Test the model on sample courses
+# 6. Score retrieval over the whole catalog (recall / NDCG / MAP against
+#    the 'related' lists, see retrieval_eval.py) and show sample courses
 # 7. Convert to TFLite for mobile
 # 8. Save model and embeddings
+#    (with --distill: train a small student on the teacher first and ship
+#    the student's TFLite model and embeddings instead)
+# 9. Optional: pruning / quantization-aware fine-tuning of a copy, exported
+#    as extra sparse and int8 models (--prune-sparsity, --qat)
 #
 # TRAINING CALLBACKS (automatic helpers):
 # - EarlyStopping: Stop if model stops improving (patience=15)
 # - ReduceLROnPlateau: Lower learning rate if stuck
 # - ModelCheckpoint: Save the best model during training
 #
+# INPUT MODES (--input-mode):
+# - arrays:  every sample is a pre-generated noisy (X1, X2) feature pair
+# - catalog: samples are (course1_idx, course2_idx) and the model embeds each
+#            course once per step (catalog_training.CatalogPairModel); the
+#            feature noise is drawn once per course per step instead
+# - augment: samples are built per batch from course_features in tf.data
+#            (make_augmented_dataset) with fresh noise every epoch
+#
+# RESUMING (--checkpoint-dir DIR):
+# The full training state (weights, Adam moments, learning rate, callback
+# counters, history, samples and seed) is saved to DIR after every epoch -
+# see training_state.py. Re-running the same command continues from the last
+# saved epoch. Batches come from an epoch-keyed stream (make_resumable_dataset),
+# so the resumed run sees the same shuffle order and augmentation noise.
+# Dropout's random state is saved too; only the catalog-mode noise is
+# re-seeded from (seed, epoch) at a resume. Raising the epoch count and
+# re-running continues a finished run (unless EarlyStopping ended it).
+#
 # OUTPUT FILES:
 # - assets/model/course_similarity_model.tflite (the trained model)
 # - assets/model/course_similarity_encoders.json (embeddings + mappings)
+# - assets/model/course_similarity_neighbours.json (top-10 related courses per course)
 # =============================================================================
 
-def train_model():
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the deep course similarity model.')
+    parser.add_argument('--input-mode', choices=['arrays', 'catalog', 'augment'], default='arrays',
+                        help='arrays = pre-generated noisy (X1, X2) pairs, '
+                             'catalog = embed each course once per step (see catalog_training.py), '
+                             'augment = build noisy pairs per batch in tf.data')
+    parser.add_argument('--compare-speed', action='store_true',
+                        help='time per-pair Siamese steps against catalog-indexed steps before training')
+    parser.add_argument('--distill', action='store_true',
+                        help='distill the trained model into a 2-layer student and export the student')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='save the full training state here every epoch and resume from it if present')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for samples, shuffling and noise (stored in --checkpoint-dir)')
+    add_compression_args(parser)  # --prune-sparsity, --qat, ... (see model_compression.py)
+    add_metrics_args(parser)  # --metrics-file (see training_metrics.py)
+    return parser.parse_args()
+
+
+def train_model(input_mode='arrays', compare_speed=False, distill=False, compression=None,
+                checkpoint_dir=None, seed=None, metrics_file=None):
     print("=" * 70)
     print("DEEP LEARNING Course Recommendation Model Training")
     print("=" * 70)
     
+    num_samples, batch_size, epochs = 200000, 128, 150
+    if checkpoint_dir:
+        config = load_or_create_config(checkpoint_dir, {
+            'input_mode': input_mode, 'num_samples': num_samples, 'batch_size': batch_size, 'seed': seed
+        })
+        seed = config['seed']
+        print(f"\n   Checkpoint directory: {checkpoint_dir} (seed {seed})")
+    if seed is not None:
+        tf.keras.utils.set_random_seed(seed)  # Python, NumPy, TensorFlow and Keras
+    
     # Build encoders
     print("\n1. Building feature encoders...")
     encoders = build_feature_encoders(COURSES)
@@ -710,28 +1074,65 @@ def train_model():
     print(f"   - {encoders['num_categories']} categories")
     print(f"   - {encoders['num_tags']} unique tags")
     
-    # Generate training data
+    # Generate training data: sample definitions first, features only for 'arrays'
     print("\n2. Generating augmented training data...")
-    course_features, X1, X2, y = generate_augmented_training_data(COURSES, encoders, num_samples=200000)
+    samples = load_arrays(checkpoint_dir, 'samples') if checkpoint_dir else None
+    if samples is not None:
+        print("   - Reusing the shuffled samples saved in the checkpoint directory")
+        course_features, pairs_c1, pairs_c2, noise1, noise2, y = (
+            samples[key] for key in ('course_features', 'pairs_c1', 'pairs_c2', 'noise1', 'noise2', 'y')
+        )
+    else:
+        course_features, pairs_c1, pairs_c2, noise1, noise2, y = generate_augmented_pairs(
+            COURSES, encoders, num_samples=num_samples, seed=seed
+        )
+        
+        # Shuffle (the split below is then just a cut)
+        indices = np.random.default_rng(seed).permutation(len(y))
+        pairs_c1, pairs_c2, noise1, noise2, y = (
+            pairs_c1[indices], pairs_c2[indices], noise1[indices], noise2[indices], y[indices]
+        )
+        if checkpoint_dir:
+            save_arrays(checkpoint_dir, 'samples', course_features=course_features, pairs_c1=pairs_c1,
+                        pairs_c2=pairs_c2, noise1=noise1, noise2=noise2, y=y)
     feature_dim = course_features.shape[1]
     print(f"   - Feature dimension: {feature_dim}")
     print(f"   - Total training samples: {len(y)}")
     
-    # Shuffle and split
-    indices = np.random.permutation(len(y))
-    X1, X2, y = X1[indices], X2[indices], y[indices]
-    
     split_idx = int(0.85 * len(y))
-    X1_train, X1_val = X1[:split_idx], X1[split_idx:]
-    X2_train, X2_val = X2[:split_idx], X2[split_idx:]
-    y_train, y_val = y[:split_idx], y[split_idx:]
+    train, val = slice(None, split_idx), slice(split_idx, None)
+    y_train, y_val = y[train], y[val]
+    
+    if input_mode == 'arrays':
+        rng = np.random.default_rng(seed)
+        X1 = materialize_augmented_features(course_features, pairs_c1, noise1, rng)
+        X2 = materialize_augmented_features(course_features, pairs_c2, noise2, rng)
+        X1_train, X1_val = X1[train], X1[val]
+        X2_train, X2_val = X2[train], X2[val]
     
     print(f"   - Train samples: {len(y_train)}")
     print(f"   - Validation samples: {len(y_val)}")
     
+    if compare_speed:
+        print("\n   Comparing training step time (throwaway models)...")
+        pair_model, _ = build_siamese_similarity_model(feature_dim, embedding_dim=64)
+        pair_model.compile(optimizer='adam', loss='binary_crossentropy')
+        _, catalog_network = build_siamese_similarity_model(feature_dim, embedding_dim=64)
+        catalog_model = CatalogPairModel(catalog_network, course_features, noise_range=CATALOG_NOISE_RANGE)
+        catalog_model.compile(optimizer='adam', loss='binary_crossentropy')
+        compare_training_speed(
+            pair_model, make_augmented_dataset(course_features, pairs_c1[train], pairs_c2[train],
+                                               noise1[train], noise2[train], y_train, batch_size=128),
+            catalog_model, make_index_dataset(pairs_c1[train], pairs_c2[train], y_train, batch_size=128)
+        )
+    
     # Build DEEP model
     print("\n3. Building DEEP Siamese Network...")
     model, embedding_network = build_siamese_similarity_model(feature_dim, embedding_dim=64)
+    if input_mode == 'catalog':
+        # Same shared MLP, fed by course index; validation runs without noise
+        model = CatalogPairModel(embedding_network, course_features, noise_range=CATALOG_NOISE_RANGE,
+                                 name='catalog_similarity_model')
     
     model.compile(
         optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
@@ -740,9 +1141,12 @@ def train_model():
     )
     
     print("\n   Model Architecture:")
-    model.summary()
+    if input_mode == 'catalog':
+        embedding_network.summary()
+    else:
+        model.summary()
     
-    print(f"\n   Total parameters: {model.count_params():,}")
+    print(f"\n   Total parameters: {embedding_network.count_params():,}")
     
     # Callbacks
     callbacks = [
@@ -763,50 +1167,110 @@ def train_model():
         )
     ]
     
+    checkpoint, initial_epoch = None, 0
+    if checkpoint_dir:
+        if input_mode == 'catalog':
+            model((np.zeros(1, dtype=np.int32), np.zeros(1, dtype=np.int32)))  # create the weights to load into
+        checkpoint = ResumableCheckpoint(checkpoint_dir, callbacks)
+        initial_epoch = checkpoint.restore(model)
+        callbacks.append(checkpoint)  # last: it restores the other callbacks' counters
+        tf.random.set_seed(seed + initial_epoch)  # catalog-mode noise uses TensorFlow's global RNG
+    
+    # Validation data is never shuffled or re-noised, so it is the same on resume
+    if input_mode == 'catalog':
+        validation_data = make_index_dataset(pairs_c1[val], pairs_c2[val], y_val, batch_size=batch_size)
+    elif input_mode == 'augment':
+        validation_data = make_augmented_dataset(course_features, pairs_c1[val], pairs_c2[val], noise1[val],
+                                                 noise2[val], y_val, batch_size=batch_size, fixed_noise=True)
+    else:
+        validation_data = ([X1_val, X2_val], y_val)
+    
+    if checkpoint is not None:
+        train_data, steps = make_resumable_dataset(
+            input_mode, course_features, pairs_c1[train], pairs_c2[train], noise1[train], noise2[train], y_train,
+            batch_size, seed, initial_epoch, epochs,
+            X1=X1_train if input_mode == 'arrays' else None, X2=X2_train if input_mode == 'arrays' else None
+        )
+        fit_args = {'steps_per_epoch': steps, 'initial_epoch': initial_epoch}
+    elif input_mode == 'catalog':
+        train_data = make_index_dataset(pairs_c1[train], pairs_c2[train], y_train, batch_size=batch_size, shuffle=True)
+        fit_args = {}
+    elif input_mode == 'augment':
+        train_data = make_augmented_dataset(course_features, pairs_c1[train], pairs_c2[train], noise1[train],
+                                            noise2[train], y_train, batch_size=batch_size, shuffle=True)
+        fit_args = {}
+    else:
+        train_data = [X1_train, X2_train]
+        fit_args = {'y': y_train, 'batch_size': batch_size}
+    
+    if metrics_file:
+        metrics = TrainingMetrics(metrics_file, batch_size=batch_size, run={
+            'script': 'train_deep_learning_model.py', 'input_mode': input_mode, 'num_samples': num_samples,
+            'batch_size': batch_size, 'epochs': epochs, 'initial_epoch': initial_epoch, 'seed': seed
+        })
+        if isinstance(train_data, tf.data.Dataset):
+            train_data = metrics.instrument(train_data)
+        # Before the checkpoint callback, which must stay last
+        callbacks.insert(len(callbacks) - (checkpoint is not None), metrics)
+    
     # Train
-    print("\n4. Training DEEP model (150 epochs)...")
-    history = model.fit(
-        [X1_train, X2_train],
-        y_train,
-        validation_data=([X1_val, X2_val], y_val),
-        epochs=150,
-        batch_size=128,
-        callbacks=callbacks,
-        verbose=1
-    )
+    print(f"\n4. Training DEEP model ({epochs} epochs, {input_mode} input mode)...")
+    if checkpoint is not None and (checkpoint.stopped_early or initial_epoch >= epochs):
+        print("   Training already finished in this checkpoint directory - skipping to export")
+    else:
+        history = model.fit(
+            train_data,
+            validation_data=validation_data,
+            epochs=epochs,
+            callbacks=callbacks,
+            verbose=1,
+            **fit_args
+        ).history
+    if checkpoint is not None:
+        history = checkpoint.history  # every epoch, including those before the resume
     
-    print(f"\n   Final train loss: {history.history['loss'][-1]:.4f}")
-    print(f"   Final val loss: {history.history['val_loss'][-1]:.4f}")
-    print(f"   Final val accuracy: {history.history['val_accuracy'][-1]:.4f}")
+    print(f"\n   Final train loss: {history['loss'][-1]:.4f}")
+    print(f"   Final val loss: {history['val_loss'][-1]:.4f}")
+    print(f"   Final val accuracy: {history['val_accuracy'][-1]:.4f}")
     
     # Test predictions
     print("\n5. Testing similarity predictions...")
     test_courses = ['javascript_fundamentals', 'flutter_complete', 'blockchain_fundamentals', 'deep_learning_tensorflow']
     
     all_embeddings = embedding_network.predict(course_features, verbose=0)
+    max_diff = check_batch_independence(embedding_network, course_features)
+    print(f"   Single-course vs batched embeddings: max difference {max_diff:.2e}")
     
-    for test_id in test_courses:
-        if test_id not in encoders['course_to_idx']:
-            continue
-        test_idx = encoders['course_to_idx'][test_id]
-        test_embedding = all_embeddings[test_idx]
-        
-        similarities = np.dot(all_embeddings, test_embedding)
-        top_indices = np.argsort(similarities)[::-1][1:6]
-        
+    related_src, related_dst = related_edges(COURSES, encoders['course_to_idx'])
+    print_retrieval_report(evaluate_retrieval(all_embeddings, related_src, related_dst))
+    
+    test_courses = [test_id for test_id in test_courses if test_id in encoders['course_to_idx']]
+    test_indices = [encoders['course_to_idx'][test_id] for test_id in test_courses]
+    top_indices, top_scores = top_k_neighbours(all_embeddings, 5, queries=test_indices)
+    for test_id, neighbours, scores in zip(test_courses, top_indices, top_scores):
         print(f"\n   '{test_id}' most similar to:")
-        for idx in top_indices:
+        for idx, sim_score in zip(neighbours, scores):
             course_id = encoders['idx_to_course'][idx]
-            sim_score = similarities[idx]
             print(f"      - {course_id}: {sim_score:.3f}")
     
     # Convert to TFLite
     print("\n6. Converting to TFLite...")
-    converter = tf.lite.TFLiteConverter.from_keras_model(embedding_network)
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
-    tflite_model = converter.convert()
+    tflite_model = convert_to_tflite(embedding_network)
+    model_type, num_layers = 'Embedding-Based MLP Recommender Model', 7
     
     os.makedirs('../assets/model', exist_ok=True)
+    if distill:
+        print("\n6b. Distilling into a small student network...")
+        student = distill_student(embedding_network, course_features, seed=seed)
+        student_tflite = convert_to_tflite(student)
+        distillation_report(embedding_network, tflite_model, student, student_tflite, course_features,
+                            related_src, related_dst)
+        
+        # Ship the student: the app's embeddings must come from the model it runs
+        tflite_model = student_tflite
+        all_embeddings = student.predict(course_features, verbose=0)
+        model_type, num_layers = 'Distilled MLP Student (from Embedding-Based MLP)', 2
+    
     tflite_path = '../assets/model/course_similarity_model.tflite'
     with open(tflite_path, 'wb') as f:
         f.write(tflite_model)
@@ -833,10 +1297,10 @@ def train_model():
         'tag_to_idx': encoders['tag_to_idx'],
         'feature_dim': feature_dim,
         'embedding_dim': 64,
-        'model_type': 'Embedding-Based MLP Recommender Model',
-        'num_layers': 7,
+        'model_type': model_type,
+        'num_layers': num_layers,
         'training_samples': len(y),
-        'epochs_trained': len(history.history['loss'])
+        'epochs_trained': len(history['loss'])
     }
     
     encoder_path = '../assets/model/course_similarity_encoders.json'
@@ -844,17 +1308,37 @@ def train_model():
         json.dump(encoder_data, f, indent=2)
     print(f"   Saved encoders to {encoder_path}")
     
+    # Related courses for the app, precomputed (see neighbour_table.py)
+    neighbour_table = export_neighbour_table(all_embeddings, [c['id'] for c in COURSES])
+    print(f"   Saved top-{neighbour_table['k']} neighbours to {NEIGHBOURS_PATH}")
+    
+    if compression is not None and compression_enabled(compression):
+        # Compress whatever was shipped above (the student with --distill)
+        print("\n8. Pruning / quantization-aware fine-tuning...")
+        compress_and_export(
+            student if distill else embedding_network, tflite_model, course_features,
+            pairs_c1[train], pairs_c2[train], y_train, loss='binary_crossentropy',
+            output_dir='../assets/model', epochs=compression.compress_epochs, batch_size=128,
+            target_sparsity=compression.prune_sparsity, schedule=compression.prune_schedule,
+            frequency=compression.prune_frequency, qat=compression.qat, noise_range=CATALOG_NOISE_RANGE
+        )
+    
     print("\n" + "=" * 70)
     print("DEEP LEARNING TRAINING COMPLETE!")
     print("=" * 70)
     print(f"\nModel Statistics:")
     print(f"  - Architecture: Embedding-Based Multilayer Perceptron (MLP) Recommender")
     print(f"  - Number of MLP layers: 7 (qualifies as Deep Learning)")
-    print(f"  - Total parameters: {model.count_params():,}")
+    print(f"  - Total parameters: {embedding_network.count_params():,}")
     print(f"  - Training samples: {len(y):,}")
-    print(f"  - Epochs trained: {len(history.history['loss'])}")
-    print(f"  - Final validation accuracy: {history.history['val_accuracy'][-1]*100:.1f}%")
+    print(f"  - Epochs trained: {len(history['loss'])}")
+    print(f"  - Final validation accuracy: {history['val_accuracy'][-1]*100:.1f}%")
+    if distill:
+        print(f"  - Shipped model: distilled 2-layer student ({student.count_params():,} parameters)")
 
 
 if __name__ == '__main__':
-    train_model()
+    args = parse_args()
+    train_model(input_mode=args.input_mode, compare_speed=args.compare_speed, distill=args.distill,
+                compression=args, checkpoint_dir=args.checkpoint_dir, seed=args.seed,
+                metrics_file=args.metrics_file)
@@ -11,80 +11,225 @@
 # 3. Train an embedding-based neural network
 # 4. Save model for use in Flutter app
 #
+# USAGE:
+#   python ml_scripts/train_model.py                              # data/user_interactions.json
+#   python ml_scripts/train_model.py --data data/interactions     # columnar (memory-mapped)
+#   python ml_scripts/train_model.py --data data/interactions --pipeline tfdata
+#                                          # stream shards from disk (larger than RAM)
+#   python ml_scripts/train_model.py --architecture two_tower     # dot-product towers
+#   python ml_scripts/train_model.py --quantize                   # + dynamic/float16/int8 variants
+#
 # OUTPUT:
 # - assets/model/recommendation_model.tflite (the trained model)
-# - assets/model/label_encoders.json (ID mappings)
+# - assets/model/label_encoders.json (ID mappings, read by the Flutter app)
+# - assets/model/users.vocab, courses.vocab (persistent append-only vocabularies)
+# - assets/model/users.idv, courses.idv (compact binary sorted string tables)
+# - assets/model/course_tower_embeddings.npy (two_tower only: [courses, dim] matrix)
+# - assets/model/recommendation_model_{dynamic,float16,int8}.tflite (--quantize)
+# - assets/model/quantization_report.json (--quantize)
 # =============================================================================
 
+import argparse
+import json
+import os
+import tempfile
+import time
+
 import tensorflow as tf
 import numpy as np
-import json
-import sklearn
-from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import roc_auc_score
 from sklearn.model_selection import train_test_split
 
-# =============================================================================
-# STEP 1: Load Data from JSON file
-# =============================================================================
-print("Loading data...")
-with open('data/user_interactions.json', 'r') as f:
-    data = json.load(f)
+from id_vocabulary import IdVocabulary
+from interaction_dataset import column_path, is_columnar_dataset, load_interaction_arrays, open_interactions
+from training_metrics import TrainingMetrics, add_metrics_args
+
+DEFAULT_DATA_PATH = 'data/user_interactions.json'
+MAPPINGS_PATH = 'assets/model/label_encoders.json'
+TFLITE_PATH = 'assets/model/recommendation_model.tflite'
+COURSE_TOWER_PATH = 'assets/model/course_tower_embeddings.npy'
+QUANTIZATION_REPORT_PATH = 'assets/model/quantization_report.json'
+VOCAB_DIR = 'assets/model'
+WARM_START_NAME = 'recommendation_{architecture}.weights.npz'  # next to the vocab files
+
+# tf.data pipeline settings (see make_interaction_pipeline)
+BLOCK_ROWS = 65536          # Rows read from disk per record
+SHUFFLE_BUFFER = 200_000    # Bounded shuffle buffer (rows), independent of dataset size
+VALIDATION_PERCENT = 20     # Same 80/20 split as train_test_split below
 
-# Get the list of user-course interactions
-interactions = data['interactions']
 
 # =============================================================================
-# STEP 2: Prepare Data - Extract features and labels
+# STEP 1 + 2 + 3 (JSON): Load, extract features/labels, encode IDs
 # =============================================================================
 # Features = user ID + course ID
 # Label = did they purchase? (1 = yes, 0 = no)
+#
+# Neural networks need numbers, not strings!
+# IdVocabulary: 'user_0' → 0, 'user_1' → 1, etc. Indices are STABLE: they are
+# loaded from the previous run and new IDs are only ever appended, so the
+# embedding rows of existing users/courses keep their meaning.
+def load_json_interactions(path, user_vocab, course_vocab):
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    # Get the list of user-course interactions
+    interactions = data['interactions']
+
+    user_ids = [i['userId'] for i in interactions]      # ['user_1', 'user_2', ...]
+    course_ids = [i['courseId'] for i in interactions]  # ['course_5', 'course_12', ...]
+    labels = [i['purchased'] for i in interactions]     # [1, 0, 1, 0, ...]
+
+    user_encoded = user_vocab.add(user_ids)        # ['user_0', 'user_1'] → [0, 1]
+    course_encoded = course_vocab.add(course_ids)  # ['course_0'] → [0]
+
+    return user_encoded, course_encoded, np.array(labels)
 
-user_ids = [i['userId'] for i in interactions]      # ['user_1', 'user_2', ...]
-course_ids = [i['courseId'] for i in interactions]  # ['course_5', 'course_12', ...]
-labels = [i['purchased'] for i in interactions]     # [1, 0, 1, 0, ...]
 
 # =============================================================================
-# STEP 3: Encode IDs to Numbers
+# STEP 1 + 2 + 3 (COLUMNAR): Memory-map pre-encoded integer columns
 # =============================================================================
-# Neural networks need numbers, not strings!
-# LabelEncoder: 'user_0' → 0, 'user_1' → 1, etc.
+# generate_data.py --output-format columnar already stores user/course as
+# int32 indices and the ID strings in vocab side files (interaction_dataset.py).
+# No JSON parsing and no string sorting: 100M rows open in milliseconds.
+#
+# The dataset's own vocab is merged into the persistent one. If the indices
+# already agree (the usual case) the memmaps are used as-is; otherwise the
+# columns are remapped with one vectorized gather.
+def merge_vocabulary(vocab, dataset_ids):
+    # Returns None when dataset codes already equal the stable codes
+    remap = vocab.extend_from(dataset_ids)
+    if np.array_equal(remap, np.arange(len(remap))):
+        return None
+    return remap
+
+
+def load_columnar_interactions(path, user_vocab, course_vocab):
+    user_col, course_col, labels, dataset_users, dataset_courses = load_interaction_arrays(path)
+    user_remap = merge_vocabulary(user_vocab, dataset_users)
+    course_remap = merge_vocabulary(course_vocab, dataset_courses)
+    if user_remap is not None:
+        user_col = user_remap[user_col]
+    if course_remap is not None:
+        course_col = course_remap[course_col]
+    return user_col, course_col, labels
+
 
-user_encoder = LabelEncoder()
-course_encoder = LabelEncoder()
+def load_interactions(path, user_vocab, course_vocab):
+    if is_columnar_dataset(path):
+        return load_columnar_interactions(path, user_vocab, course_vocab)
+    return load_json_interactions(path, user_vocab, course_vocab)
 
-user_encoded = user_encoder.fit_transform(user_ids)    # ['user_0', 'user_1'] → [0, 1]
-course_encoded = course_encoder.fit_transform(course_ids)  # ['course_0'] → [0]
 
-num_users = len(user_encoder.classes_)     # How many unique users
-num_courses = len(course_encoder.classes_) # How many unique courses
+def load_vocabularies(vocab_dir=VOCAB_DIR):
+    return (
+        IdVocabulary.load_or_create(os.path.join(vocab_dir, 'users.vocab')),
+        IdVocabulary.load_or_create(os.path.join(vocab_dir, 'courses.vocab'))
+    )
+
+
+def save_vocabularies(user_vocab, course_vocab, vocab_dir=VOCAB_DIR):
+    for name, vocab in (('users', user_vocab), ('courses', course_vocab)):
+        vocab.save(os.path.join(vocab_dir, f'{name}.vocab'))
+        vocab.export_binary(os.path.join(vocab_dir, f'{name}.idv'))
 
-print(f"Num Users: {num_users}, Num Courses: {num_courses}")
 
 # =============================================================================
 # STEP 4: Save Mappings for Flutter App
 # =============================================================================
 # Flutter needs to know: 'user_42' → 42
 # So it can use the model on real user IDs
+def save_mappings(user_vocab, course_vocab, path=MAPPINGS_PATH):
+    mappings = {
+        'user_mapping': {label: idx for idx, label in enumerate(user_vocab.ids)},
+        'course_mapping': {label: idx for idx, label in enumerate(course_vocab.ids)}
+    }
+    with open(path, 'w') as f:
+        json.dump(mappings, f)
 
-mappings = {
-    'user_mapping': {str(label): int(idx) for idx, label in enumerate(user_encoder.classes_)},
-    'course_mapping': {str(label): int(idx) for idx, label in enumerate(course_encoder.classes_)}
-}
-with open('assets/model/label_encoders.json', 'w') as f:
-    json.dump(mappings, f)
 
 # =============================================================================
-# STEP 5: Split Data into Train/Test Sets
+# STEP 5 (tf.data): Stream Interaction Shards From Disk
 # =============================================================================
-# 80% for training, 20% for testing
+# The array path above holds every row in RAM and train_test_split copies
+# them again. This pipeline keeps only a bounded shuffle buffer in memory:
+#
+#   shard files ──interleave──► raw blocks ──map (parallel)──► decode + split
+#        ──unbatch──► shuffle(buffer) ──batch──► prefetch(AUTOTUNE) ──► model.fit
+#
+# - Reading: each column file is read as fixed-size records of BLOCK_ROWS
+#   values (FixedLengthRecordDataset); a shorter tail record picks up the
+#   rows left over at the end of each shard
+# - Parallelism: shards are interleaved and blocks decoded with
+#   num_parallel_calls=AUTOTUNE, so input prep runs on all cores
+# - Split: a row is validation if hash(user, course) % 100 < VALIDATION_PERCENT.
+#   The same (user, course) pair always lands on the same side, on every
+#   run and for every shard layout - no shuffled index array needed
+def split_bucket(user, course):
+    # Integer hash mix; user * 2654435761 stays below 2^63 for any int32 user
+    key = tf.cast(user, tf.int64) * 2654435761 + tf.cast(course, tf.int64) * 40503
+    key = tf.bitwise.bitwise_xor(key, tf.bitwise.right_shift(key, 16))
+    return tf.math.floormod(key, 100)
+
+
+def shard_records(user_path, course_path, purchased_path, full_blocks, tail_rows, block_rows):
+    def column_records(path, itemsize):
+        # Full blocks stop before the tail (footer); the tail skips the full blocks (header).
+        # A zero-length body simply yields no records, so no branching is needed.
+        blocks = tf.data.FixedLengthRecordDataset(
+            path, record_bytes=block_rows * itemsize, footer_bytes=tail_rows * itemsize)
+        tail = tf.data.FixedLengthRecordDataset(
+            path, record_bytes=tf.maximum(tail_rows, 1) * itemsize,
+            header_bytes=full_blocks * block_rows * itemsize)
+        return blocks.concatenate(tail)
+
+    return tf.data.Dataset.zip((
+        column_records(user_path, 4),
+        column_records(course_path, 4),
+        column_records(purchased_path, 1)
+    ))
+
+
+def make_interaction_pipeline(path, split, batch_size, user_remap=None, course_remap=None,
+                              validation_percent=VALIDATION_PERCENT, shuffle_buffer=SHUFFLE_BUFFER,
+                              block_rows=BLOCK_ROWS, seed=42):
+    shards = [d for d in open_interactions(path) if len(d)]
+    specs = tf.data.Dataset.from_tensor_slices((
+        [column_path(d.path, 'user') for d in shards],
+        [column_path(d.path, 'course') for d in shards],
+        [column_path(d.path, 'purchased') for d in shards],
+        tf.constant([len(d) // block_rows for d in shards], dtype=tf.int64),
+        tf.constant([len(d) % block_rows for d in shards], dtype=tf.int64)
+    ))
+    user_table = None if user_remap is None else tf.constant(user_remap)
+    course_table = None if course_remap is None else tf.constant(course_remap)
+
+    def decode_block(user_raw, course_raw, purchased_raw):
+        user = tf.io.decode_raw(user_raw, tf.int32)
+        course = tf.io.decode_raw(course_raw, tf.int32)
+        purchased = tf.io.decode_raw(purchased_raw, tf.uint8)
+        in_validation = split_bucket(user, course) < validation_percent
+        keep = in_validation if split == 'validation' else tf.logical_not(in_validation)
+        user, course, purchased = (tf.boolean_mask(t, keep) for t in (user, course, purchased))
+        if user_table is not None:
+            user = tf.gather(user_table, user)
+        if course_table is not None:
+            course = tf.gather(course_table, course)
+        return user, course, tf.cast(purchased, tf.float32)
 
-X_user = np.array(user_encoded)
-X_course = np.array(course_encoded)
-y = np.array(labels).astype('float32')
+    ds = specs.interleave(
+        lambda *spec: shard_records(*spec, block_rows),
+        cycle_length=min(len(shards), 8),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    ds = ds.map(decode_block, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.unbatch()
+    if split == 'train':
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(lambda user, course, label: ((user[:, None], course[:, None]), label[:, None]),
+                num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
 
-X_train_user, X_test_user, X_train_course, X_test_course, y_train, y_test = train_test_split(
-    X_user, X_course, y, test_size=0.2, random_state=42
-)
 
 # =============================================================================
 # STEP 6: Define the Neural Network Model
@@ -98,70 +243,569 @@ X_train_user, X_test_user, X_train_course, X_test_course, y_train, y_test = trai
 # - Converts an ID (like 42) into a meaningful vector of 50 numbers
 # - Similar users will have similar embeddings
 # - Similar courses will have similar embeddings
+def build_model(num_users, num_courses, embedding_size=50):
+    # ----- User Input Path -----
+    user_input = tf.keras.layers.Input(shape=(1,), name='user_input')
+    # Embedding: user_id → 50-dim vector
+    user_embedding = tf.keras.layers.Embedding(input_dim=num_users + 1, output_dim=embedding_size,
+                                               name='user_embedding')(user_input)
+    user_vec = tf.keras.layers.Flatten()(user_embedding)  # Flatten to 1D
 
-embedding_size = 50  # Each user/course becomes a 50-number vector
+    # ----- Course Input Path -----
+    course_input = tf.keras.layers.Input(shape=(1,), name='course_input')
+    # Embedding: course_id → 50-dim vector
+    course_embedding = tf.keras.layers.Embedding(input_dim=num_courses + 1, output_dim=embedding_size,
+                                                 name='course_embedding')(course_input)
+    course_vec = tf.keras.layers.Flatten()(course_embedding)  # Flatten to 1D
 
-# ----- User Input Path -----
-user_input = tf.keras.layers.Input(shape=(1,), name='user_input')
-# Embedding: user_id → 50-dim vector
-user_embedding = tf.keras.layers.Embedding(input_dim=num_users + 1, output_dim=embedding_size)(user_input)
-user_vec = tf.keras.layers.Flatten()(user_embedding)  # Flatten to 1D
+    # ----- Combine User + Course -----
+    concat = tf.keras.layers.Concatenate()([user_vec, course_vec])  # 50 + 50 = 100 numbers
 
-# ----- Course Input Path -----
-course_input = tf.keras.layers.Input(shape=(1,), name='course_input')
-# Embedding: course_id → 50-dim vector
-course_embedding = tf.keras.layers.Embedding(input_dim=num_courses + 1, output_dim=embedding_size)(course_input)
-course_vec = tf.keras.layers.Flatten()(course_embedding)  # Flatten to 1D
+    # ----- Dense (Fully Connected) Layers -----
+    dense1 = tf.keras.layers.Dense(128, activation='relu', name='dense_1')(concat)  # 128 neurons
+    dense2 = tf.keras.layers.Dense(64, activation='relu', name='dense_2')(dense1)   # 64 neurons
 
-# ----- Combine User + Course -----
-concat = tf.keras.layers.Concatenate()([user_vec, course_vec])  # 50 + 50 = 100 numbers
+    # ----- Output Layer -----
+    # Sigmoid: outputs probability 0-1 (will user buy?)
+    output = tf.keras.layers.Dense(1, activation='sigmoid', name='output')(dense2)
 
-# ----- Dense (Fully Connected) Layers -----
-dense1 = tf.keras.layers.Dense(128, activation='relu')(concat)  # 128 neurons
-dense2 = tf.keras.layers.Dense(64, activation='relu')(dense1)   # 64 neurons
+    # Build the final model
+    return tf.keras.Model(inputs=[user_input, course_input], outputs=output)
 
-# ----- Output Layer -----
-# Sigmoid: outputs probability 0-1 (will user buy?)
-output = tf.keras.layers.Dense(1, activation='sigmoid')(dense2)
-
-# Build the final model
-model = tf.keras.Model(inputs=[user_input, course_input], outputs=output)
 
 # =============================================================================
-# STEP 7: Compile the Model
+# STEP 6 (ALTERNATIVE): Two-Tower Model
 # =============================================================================
-# - Optimizer: Adam (adjusts weights during training)
-# - Loss: Binary crossentropy (for yes/no classification)
-# - Metrics: Accuracy (how often is it correct?)
+# ARCHITECTURE:
+#   User ID   → Embedding(50) → Dense(64) → Dense(32) = user vector   ┐
+#                                                                     ├→ Dot → Sigmoid
+#   Course ID → Embedding(50) → Dense(64) → Dense(32) = course vector ┘
+#
+# WHY?
+# In the MLP above every (user, course) pair needs its own forward pass.
+# Here the user and course never meet until the final dot product, so:
+# - all course vectors can be computed ONCE and saved as a matrix
+# - ranking every course for a user = ONE matrix-vector product
+# - ranking for a batch of users    = ONE matrix-matrix product (GEMM)
+def build_tower(name, vocab_size, embedding_size, tower_dim):
+    id_input = tf.keras.layers.Input(shape=(1,), name=f'{name}_input')
+    x = tf.keras.layers.Embedding(input_dim=vocab_size + 1, output_dim=embedding_size,
+                                  name=f'{name}_embedding')(id_input)
+    x = tf.keras.layers.Flatten()(x)
+    x = tf.keras.layers.Dense(64, activation='relu', name=f'{name}_tower_hidden')(x)
+    x = tf.keras.layers.Dense(tower_dim, name=f'{name}_tower')(x)
+    return id_input, x
+
+
+def build_two_tower_model(num_users, num_courses, embedding_size=50, tower_dim=32):
+    user_input, user_vec = build_tower('user', num_users, embedding_size, tower_dim)
+    course_input, course_vec = build_tower('course', num_courses, embedding_size, tower_dim)
+
+    logit = tf.keras.layers.Dot(axes=1, name='tower_dot')([user_vec, course_vec])
+    output = tf.keras.layers.Activation('sigmoid', name='output')(logit)
+    return tf.keras.Model(inputs=[user_input, course_input], outputs=output, name='two_tower')
 
-model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
 
 # =============================================================================
-# STEP 8: Train the Model
+# STEP 6b: Warm Start From the Previous Run
 # =============================================================================
-print("Training model...")
-model.fit(
-    [X_train_user, X_train_course],  # Inputs: user IDs and course IDs
-    y_train,                          # Labels: 1 = purchased, 0 = not
-    epochs=10,                        # Train for 10 passes through the data
-    batch_size=64,                    # Process 64 samples at a time
-    validation_data=([X_test_user, X_test_course], y_test)  # Test on held-out data
-)
+# The vocabularies only ever APPEND IDs, so row i of an embedding table means
+# the same user/course in every run. After training, every layer's weights are
+# saved next to the vocab files; the next run copies them back in before fit():
+#
+#   old user_embedding (old users + 1 rows)     new table (grown)
+#   ┌──────────────┐                           ┌──────────────┐
+#   │ learned rows │ ── first len(old vocab) ─►│ learned rows │
+#   └──────────────┘                           ├──────────────┤
+#                                              │ new users:   │
+#                                              │ random init  │
+#                                              └──────────────┘
+#
+# Dense layers are copied as-is when their shapes match. Anything that no
+# longer fits (another architecture, a changed embedding size) keeps its
+# fresh initialisation. --from-scratch skips the warm start.
+def save_warm_start(model, path):
+    arrays = {f'{layer.name}/{i}': w for layer in model.layers for i, w in enumerate(layer.get_weights())}
+    np.savez(path, **arrays)
+
+
+def warm_start(model, path):
+    """Load the previous run's weights into `model`. Returns the names of the layers restored."""
+    if not os.path.exists(path):
+        return []
+    restored = []
+    with np.load(path) as previous:
+        for layer in model.layers:
+            weights = layer.get_weights()
+            old = [previous.get(f'{layer.name}/{i}') for i in range(len(weights))]
+            if not weights or any(w is None for w in old):
+                continue
+            if isinstance(layer, tf.keras.layers.Embedding):
+                (table,), (old_table,) = weights, old
+                known = old_table.shape[0] - 1  # the last row is the spare "+ 1" row
+                if old_table.shape[1] != table.shape[1] or known > table.shape[0]:
+                    continue
+                table[:known] = old_table[:known]
+                layer.set_weights([table])
+            elif all(w.shape == o.shape for w, o in zip(weights, old)):
+                layer.set_weights(old)
+            else:
+                continue
+            restored.append(layer.name)
+    return restored
+
+
+def is_two_tower(model):
+    return any(layer.name == 'user_tower' for layer in model.layers)
+
+
+def tower_model(model, name):
+    return tf.keras.Model(model.get_layer(f'{name}_input').output, model.get_layer(f'{name}_tower').output)
+
+
+def compute_course_matrix(model, num_courses):
+    # [num_courses, tower_dim] - every course vector, computed once
+    return tower_model(model, 'course').predict(np.arange(num_courses, dtype=np.float32)[:, None], verbose=0)
+
 
 # =============================================================================
-# STEP 9: Convert to TFLite for Mobile
+# STEP 9: TFLite Export With a Batched "Score All Courses" Signature
 # =============================================================================
-# TFLite = TensorFlow Lite (optimized for mobile devices)
-# Flutter can run TFLite models on Android/iOS
+# The model scores ONE (user, course) pair per row, so ranking the catalog
+# for a user means feeding N copies of the user ID next to N course IDs.
+#
+# The exported file now has two signatures:
+#   'serving_default'   (user_input [N,1], course_input [N,1]) → score [N,1]
+#                       Same as before - the Flutter app keeps working as-is.
+#   'user_course_scores' (user_index [B]) → scores [B, num_courses]
+#                       Every course for a batch of users in ONE invoke.
+#
+# NOTE: TFLite orders subgraphs by signature key, and a plain Interpreter.run
+# (what the app calls) uses the first one. 'user_course_scores' sorts after
+# 'serving_default' on purpose - don't rename it to something smaller.
+#
+# TRICK: the first Dense layer sees concat(user_vec, course_vec), so
+#   concat(u, c) · W1 = u · W1[:50] + c · W1[50:]
+# The course half is the same for every user, so it is computed once for
+# the whole catalog (the converter folds it into a constant) and only
+# broadcast-added to each user's half.
+class RecommendationSignatures(tf.Module):
+    def __init__(self, model, num_courses):
+        super().__init__()
+        self.model = model
+        self.num_courses = num_courses
+        # Keras 3 variables wrap a tf.Variable that tf.Module does not track by
+        # itself; without this the TFLite converter sees no weights at all.
+        self.weights = [v if isinstance(v, tf.Variable) else v.value for v in model.variables]
+
+    @tf.function(input_signature=[
+        tf.TensorSpec([None, 1], tf.float32, name='user_input'),
+        tf.TensorSpec([None, 1], tf.float32, name='course_input')
+    ])
+    def score_pairs(self, user_input, course_input):
+        return {'score': self.model([user_input, course_input])}
+
+    @tf.function(input_signature=[tf.TensorSpec([None], tf.int32, name='user_index')])
+    def score_all_courses(self, user_index):
+        user_table = tf.convert_to_tensor(self.model.get_layer('user_embedding').embeddings)
+        course_table = tf.convert_to_tensor(self.model.get_layer('course_embedding').embeddings)
+        dense_1, dense_2, output = (self.model.get_layer(name) for name in ('dense_1', 'dense_2', 'output'))
+        kernel_1 = tf.convert_to_tensor(dense_1.kernel)
+        embedding_size = user_table.shape[1]
+
+        user_part = tf.matmul(tf.gather(user_table, user_index), kernel_1[:embedding_size])     # [B, 128]
+        course_part = tf.matmul(course_table[:self.num_courses], kernel_1[embedding_size:])   # [C, 128]
+        hidden = tf.nn.relu(user_part[:, None, :] + course_part[None, :, :] + dense_1.bias)  # [B, C, 128]
+
+        batch = tf.shape(user_index)[0]
+        hidden = tf.reshape(hidden, [-1, hidden.shape[-1]])                                  # [B*C, 128]
+        hidden = tf.nn.relu(tf.matmul(hidden, dense_2.kernel) + dense_2.bias)                # [B*C, 64]
+        scores = tf.sigmoid(tf.matmul(hidden, output.kernel) + output.bias)                  # [B*C, 1]
+        return {'scores': tf.reshape(scores, [batch, self.num_courses])}
+
+
+# Two-tower version: the course tower outputs are baked in as a constant
+# [num_courses, tower_dim] matrix, so scoring is a single GEMM:
+#   scores = sigmoid(user_tower(user_index) · course_matrix^T)
+# It also exposes 'user_vector' so callers can rank against the exported
+# course_tower_embeddings.npy themselves.
+class TwoTowerSignatures(RecommendationSignatures):
+    def __init__(self, model, num_courses):
+        super().__init__(model, num_courses)
+        self.user_tower = tower_model(model, 'user')
+        self.course_matrix = tf.constant(compute_course_matrix(model, num_courses))
+
+    @tf.function(input_signature=[tf.TensorSpec([None], tf.int32, name='user_index')])
+    def score_all_courses(self, user_index):
+        user_vec = self.user_tower(tf.cast(user_index[:, None], tf.float32))          # [B, D]
+        return {'scores': tf.sigmoid(tf.matmul(user_vec, self.course_matrix, transpose_b=True))}
+
+    @tf.function(input_signature=[tf.TensorSpec([None], tf.int32, name='user_index')])
+    def user_vector(self, user_index):
+        return {'user_vector': self.user_tower(tf.cast(user_index[:, None], tf.float32))}
+
+
+ALL_COURSES_SIGNATURE = 'user_course_scores'
+USER_VECTOR_SIGNATURE = 'user_vector'
+
+
+def save_signatures(model, num_courses, export_dir):
+    if is_two_tower(model):
+        module = TwoTowerSignatures(model, num_courses)
+        extra = {USER_VECTOR_SIGNATURE: module.user_vector.get_concrete_function()}
+    else:
+        module = RecommendationSignatures(model, num_courses)
+        extra = {}
+    tf.saved_model.save(module, export_dir, signatures={
+        'serving_default': module.score_pairs.get_concrete_function(),
+        ALL_COURSES_SIGNATURE: module.score_all_courses.get_concrete_function(),
+        **extra
+    })
+    return ['serving_default', ALL_COURSES_SIGNATURE, *extra]
+
+
+def convert_to_tflite(model, num_courses, optimizations=None):
+    with tempfile.TemporaryDirectory() as export_dir:
+        signature_keys = save_signatures(model, num_courses, export_dir)
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir, signature_keys=signature_keys)
+        converter.optimizations = optimizations or []
+        return converter.convert()
+
+
+# -----------------------------------------------------------------------------
+# Latency check: N single-pair invokes vs. one batched invoke (Python side)
+# -----------------------------------------------------------------------------
+def compare_scoring_latency(tflite_model, num_courses, user_index=0, repeats=20):
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    pairs = interpreter.get_signature_runner('serving_default')
+    score_all = interpreter.get_signature_runner(ALL_COURSES_SIGNATURE)
+
+    def per_course():
+        return np.array([
+            pairs(user_input=np.array([[user_index]], dtype=np.float32),
+                  course_input=np.array([[c]], dtype=np.float32))['score'][0, 0]
+            for c in range(num_courses)
+        ])
+
+    def batched_pairs():
+        return pairs(user_input=np.full((num_courses, 1), user_index, dtype=np.float32),
+                     course_input=np.arange(num_courses, dtype=np.float32)[:, None])['score'][:, 0]
+
+    def all_courses():
+        return score_all(user_index=np.array([user_index], dtype=np.int32))['scores'][0]
+
+    results = {}
+    for name, fn in (('per-course invokes', per_course), ('batched pairs', batched_pairs),
+                     (ALL_COURSES_SIGNATURE, all_courses)):
+        scores = fn()  # Warm-up (and allocate tensors for this input shape)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        results[name] = ((time.perf_counter() - start) / repeats * 1000, scores)
+
+    reference = results['per-course invokes'][1]
+    print(f"Ranking {num_courses} courses for one user ({repeats} runs):")
+    for name, (ms, scores) in results.items():
+        print(f"   - {name:<20} {ms:8.3f} ms   max |diff| {np.max(np.abs(scores - reference)):.2e}")
+    return {name: ms for name, (ms, _) in results.items()}
 
-print("Converting to TFLite...")
-converter = tf.lite.TFLiteConverter.from_keras_model(model)
-tflite_model = converter.convert()
 
 # =============================================================================
-# STEP 10: Save the Model
+# STEP 9b: Post-Training Quantization Variants (--quantize)
 # =============================================================================
-with open('assets/model/recommendation_model.tflite', 'wb') as f:
-    f.write(tflite_model)
+# The default export is float32. Three smaller variants are written next to it:
+#
+#   dynamic  - weights stored as int8, activations stay float  (~4x smaller)
+#   float16  - weights stored as float16                       (~2x smaller)
+#   int8     - weights AND activations int8, calibrated on a
+#              representative sample of real interactions      (~4x smaller,
+#              integer-only kernels)
+#
+# Every variant (and the float32 baseline) is then scored on held-out
+# interactions with the Python tf.lite.Interpreter, and the report lists
+# size, latency, accuracy and AUC (+ the change vs. float32). The
+# recommended variant is the smallest one whose AUC drop is within tolerance.
+#
+# NOTE: IDs enter the model as float32 but are Cast to int32 before the
+# embedding lookup; the converter keeps that Cast in int32, so the int8
+# variant never quantizes the IDs themselves.
+QUANTIZATION_VARIANTS = ['dynamic', 'float16', 'int8']
+
+
+def representative_dataset(model, user, course, num_batches=100, batch_size=32, seed=0):
+    # Calibration samples for every signature in the exported file
+    rng = np.random.default_rng(seed)
+    signature_keys = ['serving_default', ALL_COURSES_SIGNATURE]
+    if is_two_tower(model):
+        signature_keys.append(USER_VECTOR_SIGNATURE)
+
+    def generator():
+        for _ in range(num_batches):
+            rows = rng.integers(0, len(user), size=batch_size)
+            users = np.asarray(user[rows], dtype=np.float32)[:, None]
+            courses = np.asarray(course[rows], dtype=np.float32)[:, None]
+            for key in signature_keys:
+                if key == 'serving_default':
+                    yield key, {'user_input': users, 'course_input': courses}
+                else:
+                    yield key, {'user_index': users[:, 0].astype(np.int32)}
+    return generator
+
+
+def convert_variant(model, num_courses, variant, calibration=None):
+    with tempfile.TemporaryDirectory() as export_dir:
+        signature_keys = save_signatures(model, num_courses, export_dir)
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir, signature_keys=signature_keys)
+        if variant != 'float32':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int8':
+            converter.representative_dataset = calibration
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        return converter.convert()
+
+
+def evaluate_tflite(tflite_model, num_courses, user, course, labels, repeats=20):
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    pairs = interpreter.get_signature_runner('serving_default')
+    score_all = interpreter.get_signature_runner(ALL_COURSES_SIGNATURE)
+
+    scores = pairs(user_input=np.asarray(user, dtype=np.float32)[:, None],
+                   course_input=np.asarray(course, dtype=np.float32)[:, None])['score'][:, 0]
+    labels = np.asarray(labels)
+
+    one_user = np.array([int(user[0])], dtype=np.int32)
+    score_all(user_index=one_user)  # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        score_all(user_index=one_user)
+    latency_ms = (time.perf_counter() - start) / repeats * 1000
+
+    return {
+        'size_kb': round(len(tflite_model) / 1024, 2),
+        'rank_all_courses_ms': round(latency_ms, 4),
+        'accuracy': float(np.mean((scores >= 0.5) == (labels >= 0.5))),
+        'auc': float(roc_auc_score(labels, scores)) if len(np.unique(labels)) > 1 else None
+    }
+
+
+def quantize_and_report(model, num_courses, float_tflite, calib_user, calib_course,
+                        eval_user, eval_course, eval_labels, auc_tolerance=0.01,
+                        model_path=TFLITE_PATH, report_path=QUANTIZATION_REPORT_PATH):
+    calibration = representative_dataset(model, calib_user, calib_course)
+    variants = {'float32': float_tflite}
+    for variant in QUANTIZATION_VARIANTS:
+        variants[variant] = convert_variant(model, num_courses, variant, calibration)
+        variant_path = model_path.replace('.tflite', f'_{variant}.tflite')
+        with open(variant_path, 'wb') as f:
+            f.write(variants[variant])
+
+    results = {name: evaluate_tflite(blob, num_courses, eval_user, eval_course, eval_labels)
+               for name, blob in variants.items()}
+    baseline = results['float32']
+    for result in results.values():
+        result['accuracy_delta'] = result['accuracy'] - baseline['accuracy']
+        if result['auc'] is not None and baseline['auc'] is not None:
+            result['auc_delta'] = result['auc'] - baseline['auc']
+
+    within = [name for name, r in results.items() if -r.get('auc_delta', 0.0) <= auc_tolerance]
+    recommended = min(within, key=lambda name: results[name]['size_kb'])
+
+    print(f"\nQuantization report ({len(eval_labels):,} held-out interactions):")
+    print(f"   {'variant':<9}{'size KB':>10}{'rank ms':>10}{'accuracy':>10}{'AUC':>8}{'ΔAUC':>9}")
+    for name, r in results.items():
+        auc = f"{r['auc']:.4f}" if r['auc'] is not None else '   n/a'
+        delta = f"{r.get('auc_delta', 0.0):+.4f}"
+        print(f"   {name:<9}{r['size_kb']:>10.1f}{r['rank_all_courses_ms']:>10.3f}{r['accuracy']:>10.4f}{auc:>8}{delta:>9}")
+    print(f"   Recommended (smallest within AUC tolerance {auc_tolerance}): {recommended}")
+
+    with open(report_path, 'w') as f:
+        json.dump({
+            'eval_rows': int(len(eval_labels)),
+            'auc_tolerance': auc_tolerance,
+            'recommended': recommended,
+            'variants': results
+        }, f, indent=2)
+    print(f"   Report saved to {report_path}")
+    return results
+
+
+def collect_rows(dataset, max_rows):
+    # Pull up to max_rows (user, course, label) rows out of a tf.data pipeline
+    users, courses, labels, total = [], [], [], 0
+    for (user, course), label in dataset:
+        users.append(user.numpy()[:, 0])
+        courses.append(course.numpy()[:, 0])
+        labels.append(label.numpy()[:, 0])
+        total += len(labels[-1])
+        if total >= max_rows:
+            break
+    return tuple(np.concatenate(part)[:max_rows] for part in (users, courses, labels))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the user-course recommendation model.')
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH,
+                        help='JSON file, or a columnar dataset / sharded root from generate_data.py')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--vocab-dir', default=VOCAB_DIR,
+                        help='Where the persistent users.vocab / courses.vocab live')
+    parser.add_argument('--pipeline', choices=['arrays', 'tfdata'], default='arrays',
+                        help='arrays = load everything into RAM, tfdata = stream columnar shards from disk')
+    parser.add_argument('--shuffle-buffer', type=int, default=SHUFFLE_BUFFER)
+    parser.add_argument('--architecture', choices=['mlp', 'two_tower'], default='mlp',
+                        help='mlp = concat + Dense layers, two_tower = dot product of user/course towers')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Also export dynamic / float16 / int8 variants and a comparison report')
+    parser.add_argument('--auc-tolerance', type=float, default=0.01,
+                        help='Largest AUC drop allowed for the recommended quantized variant')
+    parser.add_argument('--eval-rows', type=int, default=20000,
+                        help='Held-out rows used to score the quantized variants')
+    parser.add_argument('--from-scratch', action='store_true',
+                        help='ignore the previous run\'s weights (default: warm start, see STEP 6b)')
+    add_metrics_args(parser)  # --metrics-file (see training_metrics.py)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # =========================================================================
+    # STEP 1-3: Load Data and Encode IDs to Numbers
+    # =========================================================================
+    print(f"Loading data from {args.data}...")
+    start = time.perf_counter()
+    user_vocab, course_vocab = load_vocabularies(args.vocab_dir)
+    known_users, known_courses = len(user_vocab), len(course_vocab)
+    if args.pipeline == 'tfdata':
+        # Only the vocabularies are read here; rows stream from disk during fit()
+        if not is_columnar_dataset(args.data):
+            raise SystemExit('--pipeline tfdata needs a columnar dataset (generate_data.py --output-format columnar)')
+        datasets = open_interactions(args.data)
+        user_remap = merge_vocabulary(user_vocab, datasets[0].user_vocab)
+        course_remap = merge_vocabulary(course_vocab, datasets[0].course_vocab)
+        num_rows = sum(len(d) for d in datasets)
+    else:
+        user_encoded, course_encoded, labels = load_interactions(args.data, user_vocab, course_vocab)
+        num_rows = len(labels)
+    print(f"Loaded {num_rows:,} interactions in {time.perf_counter() - start:.2f}s "
+          f"({len(user_vocab) - known_users} new users, {len(course_vocab) - known_courses} new courses)")
+
+    num_users = len(user_vocab)     # How many unique users
+    num_courses = len(course_vocab) # How many unique courses
+
+    print(f"Num Users: {num_users}, Num Courses: {num_courses}")
+
+    # =========================================================================
+    # STEP 4: Save Mappings for Flutter App (+ persistent vocabularies)
+    # =========================================================================
+    save_vocabularies(user_vocab, course_vocab, args.vocab_dir)
+    save_mappings(user_vocab, course_vocab)
+
+    # =========================================================================
+    # STEP 5: Split Data into Train/Test Sets
+    # =========================================================================
+    # 80% for training, 20% for testing
+
+    if args.pipeline == 'tfdata':
+        train_ds = make_interaction_pipeline(args.data, 'train', args.batch_size, user_remap, course_remap,
+                                             shuffle_buffer=args.shuffle_buffer)
+        val_ds = make_interaction_pipeline(args.data, 'validation', args.batch_size, user_remap, course_remap)
+    else:
+        X_user = user_encoded
+        X_course = course_encoded
+        y = np.asarray(labels).astype('float32')
+
+        X_train_user, X_test_user, X_train_course, X_test_course, y_train, y_test = train_test_split(
+            X_user, X_course, y, test_size=0.2, random_state=42
+        )
+
+    # =========================================================================
+    # STEP 6: Define the Neural Network Model
+    # =========================================================================
+    if args.architecture == 'two_tower':
+        model = build_two_tower_model(num_users, num_courses)
+    else:
+        model = build_model(num_users, num_courses)
+
+    # =========================================================================
+    # STEP 7: Compile the Model
+    # =========================================================================
+    # - Optimizer: Adam (adjusts weights during training)
+    # - Loss: Binary crossentropy (for yes/no classification)
+    # - Metrics: Accuracy (how often is it correct?)
+
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+
+    warm_start_path = os.path.join(args.vocab_dir, WARM_START_NAME.format(architecture=args.architecture))
+    if not args.from_scratch:
+        restored = warm_start(model, warm_start_path)
+        if restored:
+            print(f"Warm start from {warm_start_path}: {', '.join(restored)} "
+                  f"({known_users} users, {known_courses} courses keep their learned rows)")
+
+    # =========================================================================
+    # STEP 8: Train the Model
+    # =========================================================================
+    print("Training model...")
+    callbacks = []
+    if args.metrics_file:
+        metrics = TrainingMetrics(args.metrics_file, batch_size=args.batch_size,
+                                  run={'script': 'train_model.py', **vars(args)})
+        callbacks.append(metrics)
+        if args.pipeline == 'tfdata':
+            train_ds = metrics.instrument(train_ds)
+    if args.pipeline == 'tfdata':
+        model.fit(train_ds, epochs=args.epochs, validation_data=val_ds, callbacks=callbacks)
+    else:
+        model.fit(
+            [X_train_user, X_train_course],  # Inputs: user IDs and course IDs
+            y_train,                          # Labels: 1 = purchased, 0 = not
+            epochs=args.epochs,               # Passes through the data (default 10)
+            batch_size=args.batch_size,       # Samples per step (default 64)
+            validation_data=([X_test_user, X_test_course], y_test),  # Test on held-out data
+            callbacks=callbacks
+        )
+
+    save_warm_start(model, warm_start_path)
+
+    # =========================================================================
+    # STEP 9: Convert to TFLite for Mobile
+    # =========================================================================
+    # TFLite = TensorFlow Lite (optimized for mobile devices)
+    # Flutter can run TFLite models on Android/iOS
+
+    print("Converting to TFLite...")
+    tflite_model = convert_to_tflite(model, num_courses)
+    compare_scoring_latency(tflite_model, num_courses)
+
+    if args.quantize:
+        if args.pipeline == 'tfdata':
+            calib_user, calib_course, _ = collect_rows(train_ds, 5000)
+            eval_user, eval_course, eval_labels = collect_rows(val_ds, args.eval_rows)
+        else:
+            calib_user, calib_course = X_train_user, X_train_course
+            eval_user, eval_course, eval_labels = (
+                X_test_user[:args.eval_rows], X_test_course[:args.eval_rows], y_test[:args.eval_rows])
+        quantize_and_report(model, num_courses, tflite_model, calib_user, calib_course,
+                            eval_user, eval_course, eval_labels, auc_tolerance=args.auc_tolerance)
+
+    if is_two_tower(model):
+        course_matrix = compute_course_matrix(model, num_courses)
+        np.save(COURSE_TOWER_PATH, course_matrix)
+        print(f"Course tower embeddings {course_matrix.shape} saved to {COURSE_TOWER_PATH}")
+
+    # =========================================================================
+    # STEP 10: Save the Model
+    # =========================================================================
+    with open(TFLITE_PATH, 'wb') as f:
+        f.write(tflite_model)
+
+    print(f"Model saved to {TFLITE_PATH}")
+
 
-print("Model saved to assets/model/recommendation_model.tflite")
+# Run the script when executed directly
+if __name__ == '__main__':
+    main()
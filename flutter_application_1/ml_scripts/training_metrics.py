@@ -0,0 +1,195 @@
+# =============================================================================
+# TRAINING_METRICS.PY - Where Does CPU Training Time Go?
+# =============================================================================
+# WHAT IS THIS FILE?
+# A Keras callback shared by train_model.py, train_course_similarity.py and
+# train_deep_learning_model.py (all take --metrics-file PATH). Per epoch it
+# records:
+#   - samples/sec over the training steps (validation time is kept apart)
+#   - step time percentiles (p50/p90/p95/p99/max), first step separately
+#     because it includes graph tracing
+#   - input wait vs compute: how long each step waited for its batch
+#   - peak RSS of the process
+#   - the intra/inter-op thread settings TensorFlow is using
+# and rewrites PATH as JSON after every epoch, so a killed run keeps its data.
+#
+# HOW INPUT WAIT IS MEASURED:
+# Keras fetches the next batch INSIDE the compiled train step, so callbacks
+# alone only see (wait + compute). instrument(dataset) appends a tiny map to
+# the END of a tf.data pipeline that stamps the moment each batch comes out:
+#
+#   on_train_batch_begin ──── waiting for input ────► batch ready ── compute ──► on_train_batch_end
+#          t_begin                                      t_ready                      t_end
+#
+#   input wait = t_ready - t_begin,   compute = t_end - t_ready
+#
+# input_wait_seconds + compute_seconds cover every step except the very
+# first one, which is reported alone as first_step_ms.
+#
+# Array inputs (model.fit(X, y)) cannot be stamped: their input wait is
+# reported as null and the whole step counts as compute.
+# =============================================================================
+
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import tensorflow as tf
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+STEP_PERCENTILES = (50, 90, 95, 99)
+
+
+def add_metrics_args(parser):
+    parser.add_argument('--metrics-file', default=None,
+                        help='write per-epoch throughput / step-time / memory metrics to this JSON file')
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def thread_settings():
+    """TensorFlow's thread pool settings (0 = let TensorFlow pick, usually one per core)."""
+    return {
+        'intra_op_threads': tf.config.threading.get_intra_op_parallelism_threads(),
+        'inter_op_threads': tf.config.threading.get_inter_op_parallelism_threads(),
+        'cpu_count': os.cpu_count(),
+        'omp_num_threads': os.environ.get('OMP_NUM_THREADS'),
+    }
+
+
+class TrainingMetrics(tf.keras.callbacks.Callback):
+    """
+    Records throughput, step times, input wait and memory per epoch.
+
+    Usage:
+        metrics = TrainingMetrics(args.metrics_file, batch_size=128, run=vars(args))
+        train_ds = metrics.instrument(train_ds)    # tf.data inputs only
+        model.fit(train_ds, ..., callbacks=[..., metrics])
+
+    batch_size is only used for array inputs (the last partial batch then
+    counts as full); instrumented datasets count their real batch sizes.
+    """
+    def __init__(self, path, batch_size=None, run=None):
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        self.run = run or {}
+        self.epochs = []
+        self.instrumented = False
+        self._ready = deque()  # (t_ready, batch_size) per batch, in order
+        self._first_step = True
+
+    def instrument(self, dataset):
+        """Append a timestamp map to a tf.data pipeline (after its prefetch)."""
+        def stamp(*element):
+            batch = tf.shape(tf.nest.flatten(element)[0])[0]
+            ready = tf.py_function(self._batch_ready, [batch], tf.int32)
+            with tf.control_dependencies([ready]):
+                element = tf.nest.map_structure(tf.identity, element)
+            return element if len(element) > 1 else element[0]
+
+        self.instrumented = True
+        return dataset.map(stamp)
+
+    def _batch_ready(self, batch):
+        self._ready.append((time.perf_counter(), int(batch)))
+        return 0
+
+    # -------------------------------------------------------------------------
+    # Keras hooks
+    # -------------------------------------------------------------------------
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._step_times, self._waits, self._samples = [], [], 0
+        self._first_step_time = None
+        self._train_end = None
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_begin = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        now = time.perf_counter()
+        self._train_end = now
+        step_time = now - self._step_begin
+        wait = None
+        if self._ready:
+            ready, size = self._ready.popleft()
+            wait = min(max(ready - self._step_begin, 0.0), step_time)
+            self._samples += size
+        else:
+            self._samples += self.batch_size or 0
+        if self._first_step:
+            # Graph tracing happens before the first batch is fetched: keep it out of the stats
+            self._first_step, self._first_step_time = False, step_time
+        else:
+            self._step_times.append(step_time)
+            if wait is not None:
+                self._waits.append(wait)
+
+    def on_epoch_end(self, epoch, logs=None):
+        now = time.perf_counter()
+        train_end = self._train_end or now
+        train_seconds = train_end - self._epoch_start
+        steps = np.array(self._step_times) * 1000
+        all_steps = len(self._step_times) + (self._first_step_time is not None)
+        step_seconds = float(np.sum(self._step_times))  # without the first step
+
+        record = {
+            'epoch': epoch + 1,
+            'steps': all_steps,
+            'samples': self._samples,
+            'train_seconds': round(train_seconds, 3),
+            'validation_seconds': round(now - train_end, 3),
+            'samples_per_sec': round(self._samples / train_seconds, 1) if train_seconds > 0 else None,
+            'step_ms': {
+                'mean': round(float(steps.mean()), 3) if len(steps) else None,
+                **{f'p{p}': round(float(np.percentile(steps, p)), 3) if len(steps) else None
+                   for p in STEP_PERCENTILES},
+                'max': round(float(steps.max()), 3) if len(steps) else None,
+            },
+            'peak_rss_mb': peak_rss_mb(),
+            'logs': {key: float(value) for key, value in (logs or {}).items()},
+        }
+        if self._first_step_time is not None:
+            record['first_step_ms'] = round(self._first_step_time * 1000, 3)  # includes graph tracing
+        if self.instrumented and self._waits:
+            wait = float(np.sum(self._waits))
+            record['input_wait_seconds'] = round(wait, 3)
+            record['compute_seconds'] = round(step_seconds - wait, 3)
+            record['input_wait_fraction'] = round(wait / step_seconds, 4) if step_seconds > 0 else None
+        else:
+            record['input_wait_seconds'] = None
+            record['compute_seconds'] = round(step_seconds, 3)
+            record['input_wait_fraction'] = None
+        self.epochs.append(record)
+        self._ready.clear()
+
+        wait_text = (f"input wait {record['input_wait_fraction'] * 100:.1f}%"
+                     if record['input_wait_fraction'] is not None else "input wait n/a")
+        print(f"   [metrics] epoch {epoch + 1}: {record['samples_per_sec'] or 0:,.0f} samples/s | "
+              f"step p50 {record['step_ms']['p50'] or 0:.2f} ms, p99 {record['step_ms']['p99'] or 0:.2f} ms | "
+              f"{wait_text} | peak RSS {record['peak_rss_mb']} MB")
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {'run': self.run, 'threads': thread_settings(), 'epochs': self.epochs}
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,284 @@
+# =============================================================================
+# TRAINING_STATE.PY - Checkpoint & Resume for Long Training Runs
+# =============================================================================
+# WHAT IS THIS FILE?
+# Lets train_deep_learning_model.py survive being killed (preemptible CPU
+# nodes, laptop going to sleep, Ctrl+C) and carry on where it stopped.
+#
+# WHY NOT JUST ModelCheckpoint?
+# ModelCheckpoint only saves the model. Restarting from it still resets:
+# - Adam's moment estimates and step counter   → a loss spike on resume
+# - the learning rate ReduceLROnPlateau lowered → back to 0.001
+# - EarlyStopping/ReduceLROnPlateau patience counters and best val_loss
+# - the shuffle order and noise                 → a different run
+#
+# WHAT IS SAVED (after every epoch, in its own directory):
+#   <checkpoint_dir>/
+#     config.json          run settings + seed (a resume must match them)
+#     samples.npz          the shuffled sample definitions and split
+#     latest               name of the newest complete epoch directory
+#     epoch-0007/
+#       model.weights.h5   model weights
+#       optimizer.npz      every optimizer variable (step, lr, moments)
+#       rng_state.npz      dropout seed-generator states (not part of the weights)
+#       best_weights.npz   EarlyStopping's best weights (restore_best_weights)
+#       state.json         epoch, history, callback counters, learning rate
+#
+# An epoch directory is written completely BEFORE 'latest' is switched to it
+# (os.replace is atomic), so a kill mid-save just resumes from the previous
+# epoch.
+#
+# DATASET POSITION:
+# epoch_index_dataset() derives each epoch's shuffle order from (seed, epoch)
+# with a stateless RNG, so epoch 8 is the same whether the run was resumed or
+# not - resuming at epoch 8 just starts the stream at epoch 8.
+# =============================================================================
+
+import json
+import os
+import shutil
+
+import numpy as np
+import tensorflow as tf
+
+# Callback attributes that Keras resets in on_train_begin and we put back
+TRACKED_ATTRIBUTES = {
+    'EarlyStopping': ('wait', 'stopped_epoch', 'best', 'best_epoch'),
+    'ReduceLROnPlateau': ('wait', 'best', 'cooldown_counter'),
+    'ModelCheckpoint': ('best',),
+}
+
+
+def load_or_create_config(checkpoint_dir, config):
+    """
+    Return the run config stored in checkpoint_dir, creating it on the first run.
+
+    A resumed run must use the same settings: a different input mode, sample
+    count or seed would silently train on a different dataset.
+    config['seed'] = None means "pick one now and remember it".
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = os.path.join(checkpoint_dir, 'config.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        for key, value in config.items():
+            if value is not None and saved.get(key) != value:
+                raise ValueError(f"{checkpoint_dir} was created with {key}={saved.get(key)!r}, "
+                                 f"not {value!r} - use a new --checkpoint-dir")
+        return saved
+
+    config = dict(config)
+    if config.get('seed') is None:
+        config['seed'] = int(np.random.SeedSequence().entropy % (2 ** 31))
+    _write_json(path, config)
+    return config
+
+
+def save_arrays(checkpoint_dir, name, **arrays):
+    """Atomically write arrays to <checkpoint_dir>/<name>.npz."""
+    path = os.path.join(checkpoint_dir, name + '.npz')
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_arrays(checkpoint_dir, name):
+    """Dict of arrays from <checkpoint_dir>/<name>.npz, or None if it was never saved."""
+    path = os.path.join(checkpoint_dir, name + '.npz')
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def epoch_index_dataset(num_samples, batch_size, seed, initial_epoch, epochs):
+    """
+    Batches of (epoch, batch_number, sample_indices) for epochs [initial_epoch, epochs).
+
+    Epoch e is shuffled by a stateless RNG seeded with (seed, e), so the stream
+    is identical with or without a resume. Use it with
+    fit(..., initial_epoch=initial_epoch, steps_per_epoch=steps_per_epoch(...)),
+    which keeps one iterator across epochs.
+    """
+    def one_epoch(epoch):
+        order = tf.random.experimental.stateless_shuffle(
+            tf.range(num_samples, dtype=tf.int32), seed=tf.stack([tf.constant(seed, tf.int64), epoch])
+        )
+        batches = tf.data.Dataset.from_tensor_slices(order).batch(batch_size).enumerate()
+        return batches.map(lambda batch_number, batch: (epoch, batch_number, batch))
+
+    return tf.data.Dataset.range(initial_epoch, epochs).flat_map(one_epoch)
+
+
+def steps_per_epoch(num_samples, batch_size):
+    return -(-num_samples // batch_size)
+
+
+class ResumableCheckpoint(tf.keras.callbacks.Callback):
+    """
+    Saves the full training state after every epoch and restores it on resume.
+
+    Usage (this callback must be LAST so it runs after the others reset):
+        checkpoint = ResumableCheckpoint(checkpoint_dir, callbacks)
+        initial_epoch = checkpoint.restore(model)       # 0 on a fresh run
+        if not checkpoint.stopped_early:                # EarlyStopping already ended it
+            model.fit(..., initial_epoch=initial_epoch, callbacks=callbacks + [checkpoint])
+        history = checkpoint.history                    # all epochs, old and new
+    """
+    def __init__(self, checkpoint_dir, callbacks=(), keep=2):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.tracked = [cb for cb in callbacks if type(cb).__name__ in TRACKED_ATTRIBUTES]
+        self.keep = keep
+        self.history = {}
+        self.finished = False
+        self.stopped_early = False
+        self._pending = None
+
+    def latest(self):
+        """Path of the newest complete epoch directory, or None."""
+        pointer = os.path.join(self.checkpoint_dir, 'latest')
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            return os.path.join(self.checkpoint_dir, f.read().strip())
+
+    def restore(self, model):
+        """Load weights, optimizer and history; return the epoch to continue from."""
+        path = self.latest()
+        if path is None:
+            return 0
+
+        with open(os.path.join(path, 'state.json')) as f:
+            state = json.load(f)
+        model.load_weights(os.path.join(path, 'model.weights.h5'))
+
+        optimizer = model.optimizer
+        optimizer.build(model.trainable_variables)
+        with np.load(os.path.join(path, 'optimizer.npz')) as data:
+            values = [data[f'var_{i}'] for i in range(len(data.files))]
+        if len(values) != len(optimizer.variables):
+            raise ValueError(f"{path} has {len(values)} optimizer variables, "
+                             f"the model needs {len(optimizer.variables)}")
+        for variable, value in zip(optimizer.variables, values):
+            variable.assign(value)
+        rng_path = os.path.join(path, 'rng_state.npz')
+        if os.path.exists(rng_path):
+            with np.load(rng_path) as data:
+                for i, variable in enumerate(_rng_variables(model)):
+                    variable.assign(data[f'var_{i}'])
+
+        self.history = state['history']
+        self.stopped_early = any(saved.get('stopped_epoch') for saved in state['callbacks'])
+        self._pending = (path, state)
+        if self.stopped_early and not state['finished']:
+            # Killed between EarlyStopping's stop and the end of fit()
+            self._restore_best_weights(model, path)
+        print(f"   Resuming from {path} (epoch {state['epoch'] + 1}, "
+              f"learning rate {state['learning_rate']:.2e})")
+        return state['epoch'] + 1
+
+    # -------------------------------------------------------------------------
+    # Keras hooks
+    # -------------------------------------------------------------------------
+    def on_train_begin(self, logs=None):
+        # The tracked callbacks have just reset themselves - put the counters back
+        self.finished = False
+        if self._pending is None:
+            return
+        path, state = self._pending
+        for callback, saved in zip(self.tracked, state['callbacks']):
+            for key, value in saved.items():
+                setattr(callback, key, value)
+            if getattr(callback, 'restore_best_weights', False):
+                callback.best_weights = _load_best_weights(path)
+        self._pending = None
+
+    def _restore_best_weights(self, model, path):
+        best_weights = _load_best_weights(path)
+        if best_weights is not None:
+            model.set_weights(best_weights)
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        self._save(epoch)
+
+    def on_train_end(self, logs=None):
+        # Runs after EarlyStopping restored the best weights: save those as final
+        if self.history:
+            self.finished = True
+            self._save(len(self.history['loss']) - 1)
+
+    # -------------------------------------------------------------------------
+    # Saving
+    # -------------------------------------------------------------------------
+    def _save(self, epoch):
+        name = f'epoch-{epoch:04d}' + ('-final' if self.finished else '')
+        path = os.path.join(self.checkpoint_dir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+        self.model.save_weights(os.path.join(path, 'model.weights.h5'))
+        optimizer = self.model.optimizer
+        np.savez(os.path.join(path, 'optimizer.npz'),
+                 **{f'var_{i}': v.numpy() for i, v in enumerate(optimizer.variables)})
+        np.savez(os.path.join(path, 'rng_state.npz'),
+                 **{f'var_{i}': v.numpy() for i, v in enumerate(_rng_variables(self.model))})
+
+        callbacks = []
+        for callback in self.tracked:
+            names = TRACKED_ATTRIBUTES[type(callback).__name__]
+            callbacks.append({key: _to_json(getattr(callback, key)) for key in names if hasattr(callback, key)})
+            if getattr(callback, 'best_weights', None) is not None:
+                np.savez(os.path.join(path, 'best_weights.npz'),
+                         **{f'w_{i}': w for i, w in enumerate(callback.best_weights)})
+
+        _write_json(os.path.join(path, 'state.json'), {
+            'epoch': epoch,
+            'finished': self.finished,
+            'learning_rate': float(optimizer.learning_rate.numpy()),
+            'history': self.history,
+            'callbacks': callbacks,
+        })
+
+        # Switch 'latest' only once the directory is complete
+        pointer = os.path.join(self.checkpoint_dir, 'latest')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(name)
+        os.replace(pointer + '.tmp', pointer)
+        self._prune(keep_name=name)
+
+    def _prune(self, keep_name):
+        epochs = sorted(d for d in os.listdir(self.checkpoint_dir) if d.startswith('epoch-'))
+        old = [d for d in epochs if d != keep_name][:max(0, len(epochs) - self.keep)]
+        for name in old:
+            shutil.rmtree(os.path.join(self.checkpoint_dir, name), ignore_errors=True)
+
+
+def _rng_variables(model):
+    # Dropout's random state lives in variables that save_weights() skips
+    weights = {id(w) for w in model.weights}
+    return [v for v in model.variables if id(v) not in weights]
+
+
+def _load_best_weights(path):
+    best_path = os.path.join(path, 'best_weights.npz')
+    if not os.path.exists(best_path):
+        return None
+    with np.load(best_path) as data:
+        return [data[f'w_{i}'] for i in range(len(data.files))]
+
+
+def _to_json(value):
+    # Callback counters are ints, numpy floats, +-inf or None (not set yet)
+    if value is None or isinstance(value, (bool, int, np.integer)):
+        return None if value is None else int(value)
+    return float(value)
+
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + '.tmp', path)